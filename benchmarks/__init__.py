@@ -0,0 +1,9 @@
+import os
+import sys
+
+def requireDisplay():
+    ''' Exit with a message if there is no X display for Qt4 to connect to
+        (Qt4 has no offscreen platform, QT_QPA_PLATFORM is ignored)
+    '''
+    if sys.platform.startswith('linux') and not os.environ.get('DISPLAY'):
+        sys.exit('No display (DISPLAY is not set), run the benchmark with xvfb-run')
@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+''' Startup time and memory of the headless daemon compared to the GUI
+
+    Every round starts a fresh interpreter per target that does what
+    steam_idle_daemon.py (daemon) or steam_idle_gui.py (gui) does and reports
+    once all workers are set up: after IdleDaemon.start() for the daemon,
+    after MainWindow.slowInit() for the GUI (both with the event loop
+    running). Startup is the time from the first import to that point, RSS
+    and peak RSS (VmHWM) are read from /proc (Linux only).
+
+    Settings live in a temporary directory and all requests go to a proxy
+    that refuses connections, so no Steam account (or network) is needed.
+    The child exits right after reporting, without a clean shutdown.
+
+    Exits with 1 if the daemon imports QtGui or if its median startup time or
+    RSS is not below the one of the GUI.
+
+        python -m benchmarks.bench_daemon --rounds 5 --json daemon.json
+        python -m benchmarks.bench_daemon --targets daemon
+
+    The GUI needs a display, run it with xvfb-run on machines without one.
+'''
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+from benchmarks import requireDisplay
+
+TARGETS = ('daemon', 'gui')
+
+def peakRss():
+    ''' VmHWM of this process in KiB or None '''
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except (IOError, OSError):
+        pass
+    return None
+
+def child(target, settingsDir):
+    ''' Runs in the fresh interpreter, prints the results as JSON '''
+    start = time.time()
+    if sys.version_info.major < 3: # Python 2
+        import sip
+        for name in ['QDate', 'QDateTime', 'QString', 'QTextStream', 'QTime', 'QUrl', 'QVariant']:
+            sip.setapi(name, 2)
+    from PyQt4.QtCore import QSettings, QTimer
+    if target == 'daemon':
+        from PyQt4.QtCore import QCoreApplication
+        from steam_idle_qt.IdleDaemon import IdleDaemon
+    else:
+        from PyQt4.QtGui import QApplication
+        from steam_idle_qt.ui.mainwindow import MainWindow
+    from steam_idle_qt import ProcessMemory
+    imported = time.time()
+
+    QSettings.setPath(QSettings.IniFormat, QSettings.UserScope, settingsDir)
+    settings = QSettings(QSettings.IniFormat, QSettings.UserScope, 'jayme-github', 'SteamIdle')
+    settings.setValue('steam/username', 'bench')
+    settings.setValue('steam/password', 'bench')
+    settings.sync()
+
+    def report():
+        rss, pss = ProcessMemory.processMemory(os.getpid())
+        print(json.dumps({
+            'import_ms': 1000 * (imported - start),
+            'startup_ms': 1000 * (time.time() - start),
+            'rss_kib': rss,
+            'pss_kib': pss,
+            'peak_rss_kib': peakRss(),
+            'modules': len(sys.modules),
+            'qtgui_loaded': 'PyQt4.QtGui' in sys.modules,
+        }))
+        sys.stdout.flush()
+        # Idle workers and threads are not shut down, nothing of them is measured
+        os._exit(0)
+
+    if target == 'daemon':
+        app = QCoreApplication(sys.argv)
+        daemon = IdleDaemon()
+        # No refresh while measuring
+        daemon.start(refreshDelay=60 * 60 * 1000)
+        QTimer.singleShot(0, report)
+    else:
+        app = QApplication(sys.argv)
+        slowInit = MainWindow.slowInit
+        def reportAfterSlowInit(self):
+            slowInit(self)
+            QTimer.singleShot(0, report)
+        MainWindow.slowInit = reportAfterSlowInit
+        ui = MainWindow()
+        ui.show()
+    app.exec_()
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+def run(target, rounds):
+    import tempfile
+    import shutil
+    env = dict(os.environ)
+    # Requests fail right away instead of reaching Steam
+    for name in ('http_proxy', 'https_proxy', 'HTTP_PROXY', 'HTTPS_PROXY'):
+        env[name] = 'http://127.0.0.1:9'
+    env.pop('no_proxy', None)
+    env.pop('NO_PROXY', None)
+    results = []
+    for i in range(rounds):
+        tmpdir = tempfile.mkdtemp(prefix='steam_idle_daemon_')
+        try:
+            out = subprocess.check_output(
+                [sys.executable, '-m', 'benchmarks.bench_daemon', '--child', target, tmpdir],
+                env=env,
+            )
+        finally:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+        result = json.loads(out.decode('utf-8').strip().splitlines()[-1])
+        result['round'] = i + 1
+        results.append(result)
+    return results
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    argparser.add_argument('--rounds', type=int, default=5, help='Number of fresh interpreters per target')
+    argparser.add_argument('--targets', nargs='+', choices=TARGETS, default=list(TARGETS))
+    argparser.add_argument('--json', help='Write results to this file')
+    argparser.add_argument('--child', nargs=2, metavar=('TARGET', 'SETTINGS_DIR'), help=argparse.SUPPRESS)
+    args = argparser.parse_args()
+    if args.child:
+        child(*args.child)
+        return 0
+
+    if 'gui' in args.targets:
+        requireDisplay()
+    results = dict((target, run(target, args.rounds)) for target in args.targets)
+    print('target  import ms  startup ms  rss KiB  peak rss KiB  modules')
+    medians = {}
+    for target in args.targets:
+        m = medians[target] = dict(
+            (key, median(r[key] or 0 for r in results[target]))
+            for key in ('import_ms', 'startup_ms', 'rss_kib', 'peak_rss_kib', 'modules')
+        )
+        print('{:6s}  {import_ms:9.1f}  {startup_ms:10.1f}  {rss_kib:7d}  {peak_rss_kib:12d}  {modules:7d}'.format(
+            target, **m))
+
+    failures = []
+    if any(r['qtgui_loaded'] for r in results.get('daemon', [])):
+        failures.append('the daemon imported PyQt4.QtGui')
+    if 'daemon' in medians and 'gui' in medians:
+        daemon, gui = medians['daemon'], medians['gui']
+        if daemon['startup_ms'] >= gui['startup_ms']:
+            failures.append('daemon startup {:.1f}ms is not below the GUI ({:.1f}ms)'.format(
+                daemon['startup_ms'], gui['startup_ms']))
+        if daemon['rss_kib'] >= gui['rss_kib']:
+            failures.append('daemon RSS {}KiB is not below the GUI ({}KiB)'.format(
+                daemon['rss_kib'], gui['rss_kib']))
+        print('daemon/gui: startup {:.0%}, rss {:.0%}'.format(
+            daemon['startup_ms'] / gui['startup_ms'], float(daemon['rss_kib']) / max(1, gui['rss_kib'])))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'args': vars(args), 'results': results, 'medians': medians, 'failures': failures}, f, indent=2)
+    for failure in failures:
+        print('FAIL: ' + failure)
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,219 @@
+#!/usr/bin/env python
+''' Scaling of the games table code of MainWindow with the library size
+
+    Fills a MainWindow with synthetic apps (10% with drops, half of those in
+    the refund period) and times the table related code paths. Every timing
+    includes processing the events it caused (view updates, sorting), the
+    median of --repeat runs is reported. Settings live in a temporary
+    directory and slowInit is not run, so no Steam account (or network) is
+    needed.
+
+        python -m benchmarks.bench_gui --sizes 100 1000 10000 50000 --json gui.json
+
+    With --baseline the results are compared to an earlier --json file, the
+    exit code is 1 if any timing got slower than --tolerance times the baseline.
+    The memory per app is measured with tracemalloc, it is skipped on Python 2.
+    Qt4 has no offscreen platform, run it with xvfb-run on machines without a display.
+'''
+import sys
+import json
+import time
+import random
+import shutil
+import logging
+import argparse
+import tempfile
+try:
+    import tracemalloc
+except ImportError: # Python 2
+    tracemalloc = None
+
+from PyQt4.QtCore import Qt, QSettings
+from PyQt4.QtGui import QApplication
+
+from steam_idle.page_parser import App
+from steam_idle_qt.AppSnapshot import AppSnapshot
+from steam_idle_qt.SteamDataDelta import SteamDataDelta
+from steam_idle_qt.ui.mainwindow import MainWindow
+from benchmarks import requireDisplay
+
+def syntheticApps(count, image_path, seed=0):
+    rnd = random.Random(seed)
+    apps = {}
+    for i in range(count):
+        app = App(image_path)
+        app.appid = 10 + i * 10
+        app.name = 'Synthetic game %d' % i
+        withDrops = rnd.random() < 0.1
+        app.remainingDrops = rnd.randint(1, 4) if withDrops else 0
+        app.playTime = round(rnd.uniform(0, 4.0) if withDrops else rnd.uniform(0, 200.0), 1)
+        apps[app.appid] = app
+    return apps
+
+def changedApps(apps, fraction, image_path, seed=1):
+    ''' Copies of a fraction of apps with one drop less (if any) and more playtime '''
+    rnd = random.Random(seed)
+    changed = {}
+    for old in rnd.sample(list(apps.values()), max(1, int(len(apps) * fraction))):
+        app = App(image_path)
+        app.appid = old.appid
+        app.name = old.name
+        app.remainingDrops = max(0, old.remainingDrops - 1)
+        app.playTime = old.playTime + 0.1
+        changed[app.appid] = app
+    return changed
+
+def bytesPerApp(build, count):
+    ''' Memory allocated by build() (and kept by its result) per app
+        None without tracemalloc (Python 2)
+    '''
+    if tracemalloc is None:
+        return None
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        result = build()
+        allocated = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+    del result
+    return allocated / float(count)
+
+class Timer(object):
+    def __init__(self, qapp, repeat):
+        self.qapp = qapp
+        self.repeat = repeat
+
+    def __call__(self, func, calls=1):
+        ''' Median msec of func() (divided by calls), including the events it caused '''
+        samples = []
+        for _ in range(self.repeat):
+            start = time.time()
+            func()
+            self.qapp.processEvents()
+            samples.append(1000 * (time.time() - start) / calls)
+        samples.sort()
+        return samples[len(samples) // 2]
+
+def bench(qapp, size, repeat, image_path):
+    apps = syntheticApps(size, image_path)
+    timer = Timer(qapp, repeat)
+    ui = MainWindow()
+    ui.show()
+    qapp.processEvents()
+    result = {
+        'apps': size,
+        # Memory of the data as sent to the receivers, old dict of App instances vs. snapshot
+        'dict_bytes_per_app': bytesPerApp(lambda: syntheticApps(size, image_path), size),
+        'snapshot_bytes_per_app': bytesPerApp(lambda: AppSnapshot.fromApps(0, apps, image_path), size),
+    }
+    try:
+        start = time.time()
+        ui.updateSteamData(AppSnapshot.fromApps(0, apps, image_path))
+        qapp.processEvents()
+        result['updateSteamData_first_ms'] = 1000 * (time.time() - start)
+        result['updateSteamData_ms'] = timer(
+            lambda: ui.updateSteamData(AppSnapshot.fromApps(0, apps, image_path))
+        )
+
+        version = [0]
+        def delta():
+            version[0] += 1
+            changed = changedApps(apps, 0.01, image_path, seed=version[0])
+            apps.update(changed)
+            ui.on_steamDataDelta(SteamDataDelta(version[0] - 1, version[0], changed=changed,
+                snapshot=ui.apps.replace(version[0], changed)))
+        result['on_steamDataDelta_1pct_ms'] = timer(delta)
+
+        lookups = random.Random(2).sample(list(apps), min(1000, size))
+        result['rowIdForAppId_ms'] = timer(
+            lambda: [ui.rowIdForAppId(appid) for appid in lookups], calls=len(lookups)
+        )
+
+        def toggleShowAll():
+            ui.on_actionShowAll_triggered(True)
+            qapp.processEvents()
+            ui.on_actionShowAll_triggered(False)
+        result['on_actionShowAll_triggered_ms'] = timer(toggleShowAll, calls=2)
+
+        rows = ui.gamesProxyModel.rowCount()
+        result['nextAppWithDrops_ms'] = timer(lambda: ui.nextAppWithDrops(startAt=rows // 2))
+
+        ui.on_actionShowAll_triggered(True)
+        qapp.processEvents()
+        header = ui.tableViewGames.horizontalHeader()
+        for column, name in ((1, 'name'), (2, 'drops'), (3, 'playtime')):
+            order = [Qt.AscendingOrder]
+            def sort():
+                ui.tableViewGames.sortByColumn(column, order[0])
+                order[0] = Qt.DescendingOrder if order[0] == Qt.AscendingOrder else Qt.AscendingOrder
+            result['sort_%s_ms' % name] = timer(sort)
+        header.setSortIndicator(-1, Qt.AscendingOrder)
+    finally:
+        ui.close()
+        ui.deleteLater()
+        qapp.processEvents()
+    return result
+
+def compare(results, baselinePath, tolerance):
+    ''' Returns a list of timings slower than tolerance times the baseline '''
+    with open(baselinePath) as f:
+        baseline = dict((r['apps'], r) for r in json.load(f)['results'])
+    regressions = []
+    for r in results:
+        base = baseline.get(r['apps'])
+        if base is None:
+            continue
+        for key, value in sorted(r.items()):
+            if key.endswith('_ms') and base.get(key) and value > base[key] * tolerance:
+                regressions.append('{} apps: {} {:.2f}ms (baseline {:.2f}ms)'.format(
+                    r['apps'], key, value, base[key]))
+    return regressions
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    argparser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000, 50000],
+                           help='Number of apps per run')
+    argparser.add_argument('--repeat', type=int, default=5, help='Runs per timing, the median is reported')
+    argparser.add_argument('--json', help='Write results to this file')
+    argparser.add_argument('--baseline', help='Compare to the results of an earlier --json run')
+    argparser.add_argument('--tolerance', type=float, default=1.5,
+                           help='Timings slower than tolerance * baseline are regressions')
+    args = argparser.parse_args()
+    requireDisplay()
+    logging.basicConfig(level=logging.WARNING)
+
+    tmpdir = tempfile.mkdtemp(prefix='steam_idle_gui_bench_')
+    try:
+        QSettings.setPath(QSettings.IniFormat, QSettings.UserScope, tmpdir)
+        settings = QSettings(QSettings.IniFormat, QSettings.UserScope, 'jayme-github', 'SteamIdle')
+        settings.setValue('steam/username', 'bench')
+        settings.setValue('steam/password', 'bench')
+        settings.sync()
+        # Only the table code is measured, no parser and no idle workers
+        MainWindow.slowInit = lambda self: None
+
+        qapp = QApplication(sys.argv)
+        results = [bench(qapp, size, args.repeat, tmpdir) for size in args.sizes]
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+    keys = [k for k in results[0] if k.endswith('_ms')]
+    print('{:>32s}  '.format('ms') + '  '.join('{:>10d}'.format(r['apps']) for r in results))
+    for key in sorted(keys):
+        print('{:>32s}  '.format(key[:-3]) + '  '.join('{:10.3f}'.format(r[key]) for r in results))
+    for key in ('dict_bytes_per_app', 'snapshot_bytes_per_app'):
+        if results[0][key] is None:
+            continue
+        print('{:>32s}  '.format(key) + '  '.join('{:10.1f}'.format(r[key]) for r in results))
+
+    regressions = compare(results, args.baseline, args.tolerance) if args.baseline else []
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'args': vars(args), 'results': results, 'regressions': regressions}, f, indent=2)
+    for regression in regressions:
+        print('REGRESSION: ' + regression)
+    return 1 if regressions else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+''' Compare the IdleChild launchers: plain fork from the (GUI) process and the fork server
+
+    Measures the time from start() until the child is running and the memory
+    (RSS and PSS from /proc) of each child once all are up. The parent imports
+    the GUI modules first (if available) to carry the weight the real GUI has.
+
+        python -m benchmarks.bench_launcher --childs 20 --json launcher.json
+'''
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import importlib
+import multiprocessing
+
+from steam_idle import steam_api
+from steam_idle.page_parser import App
+from steam_idle.idle import IdleChild
+from steam_idle_qt.IdleLauncher import ForkServerIdleChild, forkserverAvailable, warmUp
+from steam_idle_qt.ProcessMemory import processMemory
+
+class BenchIdleChild(IdleChild):
+    ''' IdleChild that reports when it is running
+
+        Without a Steam client IdleChild.run would exit right away, so it
+        just sleeps (with steam_api loaded) in that case.
+    '''
+    def __init__(self, app, ready, steam):
+        super(BenchIdleChild, self).__init__(app)
+        self.ready = ready
+        self.steam = steam
+
+    def run(self):
+        self.ready.send(os.getpid())
+        if self.steam:
+            super(BenchIdleChild, self).run()
+        else:
+            while True:
+                time.sleep(1)
+
+class BenchForkServerIdleChild(BenchIdleChild):
+    _Popen = staticmethod(ForkServerIdleChild._Popen)
+
+def bench(childClass, count, steam):
+    latencies = []
+    childs = []
+    try:
+        for i in range(count):
+            app = App()
+            app.appid = 100000 + i
+            app.name = 'Bench app %d' % i
+            app.remainingDrops = 1
+            app.playTime = 0.0
+            recv, send = multiprocessing.Pipe(duplex=False)
+            start = time.time()
+            p = childClass(app, send, steam)
+            p.start()
+            if not recv.poll(30):
+                raise RuntimeError('{} did not start'.format(p))
+            recv.recv()
+            latencies.append(time.time() - start)
+            childs.append(p)
+        time.sleep(0.5) # Let the childs settle
+        mem = [processMemory(p.pid) for p in childs]
+    finally:
+        for p in childs:
+            p.terminate()
+            p.join()
+    rss = [m[0] for m in mem]
+    pss = [m[1] for m in mem if m[1] is not None]
+    latencies.sort()
+    return {
+        'launcher': childClass.__name__,
+        'childs': count,
+        'latency_mean_ms': 1000 * sum(latencies) / len(latencies),
+        'latency_median_ms': 1000 * latencies[len(latencies) // 2],
+        'latency_max_ms': 1000 * latencies[-1],
+        'rss_mean_kib': sum(rss) / len(rss),
+        'pss_mean_kib': sum(pss) / len(pss) if pss else None,
+        'pss_total_kib': sum(pss) if pss else None,
+    }
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    argparser.add_argument('--childs', type=int, default=20, help='Number of childs per launcher')
+    argparser.add_argument('--parent-import', action='append',
+                           default=['PyQt4.QtGui', 'steam_idle_qt.QSteamParser'],
+                           help='Modules the parent imports before spawning (like the GUI does)')
+    argparser.add_argument('--json', help='Write results to this file')
+    args = argparser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    for module in args.parent_import:
+        try:
+            importlib.import_module(module)
+        except ImportError as e:
+            print('Not importing {}: {}'.format(module, e))
+
+    steam = steam_api.IsSteamRunning()
+    if not steam:
+        print('Steam client is not running, childs will not initialize the Steam API')
+
+    launchers = [BenchIdleChild]
+    if forkserverAvailable():
+        start = time.time()
+        warmUp()
+        print('Fork server started in {:.1f}ms'.format(1000 * (time.time() - start)))
+        launchers.append(BenchForkServerIdleChild)
+
+    results = [bench(launcher, args.childs, steam) for launcher in launchers]
+    print('launcher                   childs  mean ms  median ms  max ms  RSS KiB  PSS KiB  PSS total KiB')
+    for r in results:
+        print('{launcher:25s}  {childs:6d}  {latency_mean_ms:7.1f}  {latency_median_ms:9.1f}  {latency_max_ms:6.1f}  {rss_mean_kib:7.0f}  {pss:>7s}  {pss_total:>13s}'.format(
+            pss='{:.0f}'.format(r['pss_mean_kib']) if r['pss_mean_kib'] is not None else '-',
+            pss_total='{:.0f}'.format(r['pss_total_kib']) if r['pss_total_kib'] is not None else '-',
+            **r
+        ))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'args': vars(args), 'results': results}, f, indent=2)
+
+if __name__ == '__main__':
+    # Fork server childs don't import __main__, the child classes have to be
+    # pickled as benchmarks.bench_launcher.*
+    from benchmarks.bench_launcher import main
+    main()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+''' Startup time of the GUI: imports, MainWindow construction and first paint
+
+    Every round starts a fresh interpreter (so no module is cached) that does
+    what steam_idle_gui.py does and reports once the main window got its first
+    paint event. Settings live in a temporary directory and slowInit is not
+    run, so no Steam account (or network) is needed.
+
+    Exits with 1 if the median of a measurement is over its budget or if a
+    module that should be loaded on first use only has been imported before
+    the first paint.
+
+        python -m benchmarks.bench_startup --rounds 5 --paint-budget 1500 --json startup.json
+
+    Qt4 has no offscreen platform, run it with xvfb-run on machines without a display.
+'''
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+from benchmarks import requireDisplay
+
+# Modules that must not be imported before the first paint
+DEFERRED_MODULES = [
+    'steamweb',
+    'bs4',
+    'steam_idle.page_parser',
+    'steam_idle.steam_api', # By SteamWatcher, its thread is started by slowInit
+    'steam_idle_qt.QSteamParser',
+    'steam_idle_qt.QSteamWebBrowser',
+    'steam_idle_qt.QIdle',
+    'steam_idle_qt.RequestGuard',
+    'steam_idle_qt.ui.settingsdialog',
+    'steam_idle_qt.ui.captchadialog',
+]
+
+def child(settingsDir):
+    ''' Runs in the fresh interpreter, prints the results as JSON '''
+    start = time.time()
+    if sys.version_info.major < 3: # Python 2
+        import sip
+        for name in ['QDate', 'QDateTime', 'QString', 'QTextStream', 'QTime', 'QUrl', 'QVariant']:
+            sip.setapi(name, 2)
+    from PyQt4.QtCore import QObject, QEvent, QSettings, QTimer
+    from PyQt4.QtGui import QApplication
+    from steam_idle_qt.ui.mainwindow import MainWindow
+    imported = time.time()
+
+    QSettings.setPath(QSettings.IniFormat, QSettings.UserScope, settingsDir)
+    settings = QSettings(QSettings.IniFormat, QSettings.UserScope, 'jayme-github', 'SteamIdle')
+    settings.setValue('steam/username', 'bench')
+    settings.setValue('steam/password', 'bench')
+    settings.sync()
+    # Everything after the first paint is not measured here
+    MainWindow.slowInit = lambda self: None
+
+    result = {}
+    class PaintFilter(QObject):
+        def eventFilter(self, obj, event):
+            if event.type() == QEvent.Paint and 'paint_ms' not in result:
+                result['paint_ms'] = 1000 * (time.time() - start)
+                result['deferred_loaded'] = [m for m in DEFERRED_MODULES if m in sys.modules]
+                QTimer.singleShot(0, app.quit)
+            return False
+
+    app = QApplication(sys.argv)
+    constructStart = time.time()
+    ui = MainWindow()
+    constructed = time.time()
+    paintFilter = PaintFilter()
+    ui.installEventFilter(paintFilter)
+    ui.show()
+    app.exec_()
+    result.update({
+        'import_ms': 1000 * (imported - start),
+        'construct_ms': 1000 * (constructed - constructStart),
+        'modules': len(sys.modules),
+    })
+    print(json.dumps(result))
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+def run(args):
+    import tempfile
+    import shutil
+    results = []
+    for i in range(args.rounds):
+        tmpdir = tempfile.mkdtemp(prefix='steam_idle_startup_')
+        try:
+            out = subprocess.check_output(
+                [sys.executable, '-m', 'benchmarks.bench_startup', '--child', tmpdir],
+            )
+        finally:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+        result = json.loads(out.decode('utf-8').strip().splitlines()[-1])
+        result['round'] = i + 1
+        results.append(result)
+    return results
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    argparser.add_argument('--rounds', type=int, default=5, help='Number of fresh interpreters to measure')
+    argparser.add_argument('--import-budget', type=float, default=800, help='Max. median import time in ms')
+    argparser.add_argument('--paint-budget', type=float, default=1500, help='Max. median time to first paint in ms')
+    argparser.add_argument('--json', help='Write results to this file')
+    argparser.add_argument('--child', metavar='SETTINGS_DIR', help=argparse.SUPPRESS)
+    args = argparser.parse_args()
+    if args.child:
+        child(args.child)
+        return 0
+
+    requireDisplay()
+    results = run(args)
+    print('round  import ms  construct ms  paint ms  modules')
+    for r in results:
+        print('{round:5d}  {import_ms:9.1f}  {construct_ms:12.1f}  {paint_ms:8.1f}  {modules:7d}'.format(**r))
+
+    failures = []
+    importMs = median(r['import_ms'] for r in results)
+    paintMs = median(r['paint_ms'] for r in results)
+    if importMs > args.import_budget:
+        failures.append('import time {:.1f}ms is over budget ({:.0f}ms)'.format(importMs, args.import_budget))
+    if paintMs > args.paint_budget:
+        failures.append('first paint after {:.1f}ms is over budget ({:.0f}ms)'.format(paintMs, args.paint_budget))
+    loaded = sorted(set(m for r in results for m in r['deferred_loaded']))
+    if loaded:
+        failures.append('imported before first paint: {}'.format(', '.join(loaded)))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'args': vars(args), 'results': results, 'failures': failures}, f, indent=2)
+    for failure in failures:
+        print('FAIL: ' + failure)
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+''' Replay recorded drops to compare DropPredictor with calc_delay
+
+    For every interval between two drops of an app (that it was idled
+    through) the refreshes of Idle are simulated with both policies: starting
+    at the first drop, refreshes are done after the delay of the policy until
+    one is at or after the second drop. Refreshes before it are wasted, the
+    time from the drop to the refresh noticing it is the lag. After the last
+    drop of an app the lag is dead idle time, the app is idled without any
+    drops left. The predictor is trained on the drops before the interval only.
+
+        python -m benchmarks.eval_predictor ~/.config/jayme-github/SteamIdle/history.sqlite
+        python -m benchmarks.eval_predictor --synthetic 200 --json predictor.json
+        python -m benchmarks.eval_predictor --synthetic 200 --cv 0.1 --stalls 0
+
+    The recorded drop times are the refreshes that noticed them, so they
+    are only as precise as the refreshes of the recording run.
+'''
+import sys
+import json
+import bisect
+import random
+import sqlite3
+import logging
+import argparse
+
+from steam_idle.idle import calc_delay
+from steam_idle_qt.DropPredictor import DropPredictor
+
+def loadDrops(path):
+    db = sqlite3.connect(path)
+    try:
+        return db.execute('SELECT * FROM drops ORDER BY ts').fetchall()
+    finally:
+        db.close()
+
+def syntheticDrops(apps, seed=0, cv=0.5, stalls=0.1):
+    ''' Drops of apps idled one after the other, seen the moment they happen
+        Every app has its own mean interval (20-60 minutes). The intervals are
+        gamma distributed (coefficient of variation cv), not log-normal like
+        DropPredictor assumes, and the share stalls of them takes three times
+        as long.
+    '''
+    rnd = random.Random(seed)
+    drops = []
+    now = 0.0
+    for appid in range(10, 10 + apps * 10, 10):
+        mean = rnd.uniform(20, 60) * 60
+        remainingDrops = rnd.randint(2, 6)
+        playTime = rnd.uniform(0, 2)
+        now += 60 # Switching to the next app
+        drops.append((appid, now, 1, remainingDrops, playTime)) # Idle starts, like a drop
+        while remainingDrops > 0:
+            shape = 1.0 / (cv * cv)
+            interval = rnd.gammavariate(shape, mean / shape)
+            if rnd.random() < stalls:
+                interval *= 3
+            now += interval
+            playTime += interval / 3600.0
+            remainingDrops -= 1
+            drops.append((appid, now, 1, remainingDrops, playTime))
+    return drops
+
+def segments(drops, predictor):
+    ''' Splits the drops of every app into runs it was idled through
+        Yields (<index of the first drop>, <appid>, [(<timestamp>, <remaining drops>), ...]),
+        the first entry is the start (the drop before the run or the start of idle).
+    '''
+    runs = {} # {<appid>: (<index>, [(<timestamp>, <remaining drops>), ...], <last play time>), ...}
+    for index, (appid, ts, count, remainingDrops, playTime) in enumerate(drops):
+        run = runs.get(appid)
+        if run is not None and ts > run[1][-1][0] and \
+                (playTime - run[2]) * 3600 >= predictor.continuousIdle * (ts - run[1][-1][0]):
+            run[1].append((ts, remainingDrops))
+            runs[appid] = (run[0], run[1], playTime)
+            continue
+        if run is not None and len(run[1]) > 1:
+            yield run[0], appid, run[1]
+        runs[appid] = (index, [(ts, remainingDrops)], playTime)
+    for appid, (index, run, _) in runs.items():
+        if len(run) > 1:
+            yield index, appid, run
+
+def simulate(delay, appid, run, train):
+    ''' Refreshes of Idle through run with the policy delay(appid, remainingDrops, since, now)
+
+        Every refresh sees the drops up to its time, like Idle the policy is
+        asked again after every refresh and since is the refresh that noticed
+        the last drop. train(now) is called whenever a drop was noticed.
+        Returns (<refreshes>, <wasted refreshes>, <lag of all drops>, <dead idle time or None>)
+    '''
+    since, remainingDrops = run[0]
+    drops = run[1:]
+    # calc_delay counts down the delay before the last drop in module state,
+    # a call with more drops left resets it (like Idle does on every drop)
+    calc_delay(remainingDrops + 1)
+    now = since
+    refreshes = wasted = 0
+    lag = 0.0
+    noticed = 0 # Drops of run noticed so far
+    while noticed < len(drops) and remainingDrops > 0:
+        previous = now
+        now += max(1, delay(appid, remainingDrops, since, now))
+        refreshes += 1
+        seen = noticed
+        while seen < len(drops) and drops[seen][0] <= now:
+            lag += now - drops[seen][0]
+            seen += 1
+        if seen == noticed:
+            wasted += 1
+            continue
+        noticed = seen
+        remainingDrops = drops[noticed - 1][1]
+        # Like Idle, the next drop is counted from the last refresh that did not see this one
+        since = previous
+        train(now)
+    dead = now - drops[-1][0] if drops[-1][1] == 0 else None
+    return refreshes, wasted, lag, dead
+
+def evaluate(drops):
+    predictor = DropPredictor()
+    timestamps = [d[1] for d in drops]
+    # The predictor only knows the drops recorded up to now
+    train = lambda now: predictor.train(drops[:bisect.bisect_right(timestamps, now)])
+    policies = (
+        ('calc_delay', lambda appid, remainingDrops, since, now: calc_delay(remainingDrops), lambda now: None),
+        ('predictor', predictor.refreshDelay, train),
+    )
+    results = dict((name, {'drops': 0, 'refreshes': 0, 'wasted': 0, 'lag': 0.0, 'last_drops': 0, 'dead': 0.0})
+                   for name, _, _ in policies)
+    for index, appid, run in segments(drops, predictor):
+        for name, delay, onDrop in policies:
+            onDrop(run[0][0])
+            refreshes, wasted, lag, dead = simulate(delay, appid, run, onDrop)
+            r = results[name]
+            r['drops'] += len(run) - 1
+            r['refreshes'] += refreshes
+            r['wasted'] += wasted
+            r['lag'] += lag
+            if dead is not None:
+                r['last_drops'] += 1
+                r['dead'] += dead
+    for r in results.values():
+        n = float(max(1, r['drops']))
+        r['wasted_per_drop'] = r['wasted'] / n
+        r['mean_lag_sec'] = r['lag'] / n
+        r['dead_idle_sec'] = r['dead']
+        r['mean_dead_idle_sec'] = r['dead'] / max(1, r['last_drops'])
+    return results
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    argparser.add_argument('history', nargs='?', help='history.sqlite of a recording run')
+    argparser.add_argument('--synthetic', type=int, metavar='APPS',
+                           help='Replay synthetic drops of APPS apps instead')
+    argparser.add_argument('--cv', type=float, default=0.5,
+                           help='Coefficient of variation of the synthetic intervals')
+    argparser.add_argument('--stalls', type=float, default=0.1,
+                           help='Share of synthetic intervals taking three times as long')
+    argparser.add_argument('--seed', type=int, default=0, help='Seed of the synthetic drops')
+    argparser.add_argument('--json', help='Write results to this file')
+    args = argparser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+    if args.history:
+        drops = loadDrops(args.history)
+    elif args.synthetic:
+        drops = syntheticDrops(args.synthetic, args.seed, args.cv, args.stalls)
+    else:
+        argparser.error('history or --synthetic is required')
+
+    results = evaluate(drops)
+    print('{:>12s}  {:>9s}  {:>15s}  {:>12s}  {:>10s}  {:>14s}'.format(
+        'policy', 'drops', 'wasted/drop', 'mean lag s', 'last drops', 'dead idle s'))
+    for name in sorted(results):
+        r = results[name]
+        print('{:>12s}  {:9d}  {:15.2f}  {:12.1f}  {:10d}  {:14.1f}'.format(
+            name, r['drops'], r['wasted_per_drop'], r['mean_lag_sec'], r['last_drops'], r['dead_idle_sec']))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'args': vars(args), 'drops': len(drops), 'results': results}, f, indent=2)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
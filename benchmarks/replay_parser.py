@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+''' Drive QSteamParser.updateApps against the local Steam stand-in
+
+    All requests of the browser session are redirected to a StandInServer, so
+    no Steam account (or network) is needed. Reports pages/sec, apps/sec and
+    the time spent parsing HTML.
+
+        python -m benchmarks.replay_parser --apps 5000 --latency 0.05 --concurrency 8
+'''
+import os
+import sys
+import json
+import time
+import shelve
+import shutil
+import logging
+import argparse
+import tempfile
+import threading
+try:
+    from urllib.parse import urlsplit
+except ImportError: # Python 2
+    from urlparse import urlsplit
+
+from PyQt4.QtCore import QCoreApplication, QSettings
+
+from steam_idle_qt import QSteamBadges as QSteamBadgesModule
+from steam_idle_qt.QSteamWebBrowser import QSteamWebBrowser
+from steam_idle_qt.QSteamParser import QSteamParser
+from steam_idle_qt.RequestGuard import GuardedHTTPAdapter
+from benchmarks.steam_standin import StandInServer, SyntheticLibrary
+
+class StandInAdapter(GuardedHTTPAdapter):
+    ''' Sends all requests to the stand-in server at target instead '''
+    target = None
+
+    def send(self, request, **kwargs):
+        url = urlsplit(request.url)
+        request.url = self.target + url.path + ('?' + url.query if url.query else '')
+        return super(StandInAdapter, self).send(request, **kwargs)
+
+class ParseTimer(object):
+    ''' Accumulates the time spent in the wrapped callable (thread safe) '''
+    def __init__(self, func):
+        self.func = func
+        self.seconds = 0.0
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, *args, **kwargs):
+        start = time.time()
+        try:
+            return self.func(*args, **kwargs)
+        finally:
+            elapsed = time.time() - start
+            with self._lock:
+                self.seconds += elapsed
+                self.calls += 1
+
+def run(args):
+    library = SyntheticLibrary(args.apps, args.per_page)
+    server = StandInServer(library, latency=args.latency, errorRate=args.error_rate).start()
+    tmpdir = tempfile.mkdtemp(prefix='steam_idle_replay_')
+    try:
+        # Keep settings, cookies and caches away from the real ones
+        QSettings.setPath(QSettings.IniFormat, QSettings.UserScope, tmpdir)
+        settings = QSettings(QSettings.IniFormat, QSettings.UserScope, 'jayme-github', 'SteamIdle')
+        settings.setValue('badgeconcurrency', args.concurrency)
+        settings.sync()
+        data_path = os.path.join(os.path.dirname(settings.fileName()), 'SteamIdle')
+
+        StandInAdapter.target = server.url
+        QSteamWebBrowser.adapterClass = StandInAdapter
+        parser = QSteamParser(username='standin', password='standin', data_path=data_path)
+        parser.sbb.swb.login()
+
+        # Known app names, so get_apps does not request app info or images
+        appshelve = shelve.open(parser.sbb.shelve_path)
+        for app in library.apps:
+            appshelve[str(app['appid'])] = {'name': app['name']}
+        appshelve.close()
+
+        # BeautifulSoup is looked up in the QSteamBadges module by every page fetch
+        parseTimer = ParseTimer(QSteamBadgesModule.BeautifulSoup)
+        QSteamBadgesModule.BeautifulSoup = parseTimer
+
+        results = []
+        for i in range(args.rounds):
+            server.counters.clear()
+            parseTimer.seconds = 0.0
+            start = time.time()
+            parser.updateApps()
+            elapsed = time.time() - start
+            pages = server.counters['badges']
+            results.append({
+                'round': i + 1,
+                'seconds': elapsed,
+                'pages': pages,
+                'apps': len(parser.apps or {}),
+                'pages_per_sec': pages / elapsed,
+                'apps_per_sec': len(parser.apps or {}) / elapsed,
+                'parse_seconds': parseTimer.seconds,
+                'errors': server.counters['error'],
+            })
+        return results
+    finally:
+        server.shutdown()
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    argparser.add_argument('--apps', type=int, default=1000, help='Number of apps in the library')
+    argparser.add_argument('--per-page', type=int, default=150, help='Badges per badges page')
+    argparser.add_argument('--latency', type=float, default=0.05, help='Mean latency per request in seconds')
+    argparser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests answered with 503')
+    argparser.add_argument('--concurrency', type=int, default=4, help='Badges pages fetched in parallel')
+    argparser.add_argument('--rounds', type=int, default=3, help='Number of updateApps calls')
+    argparser.add_argument('--json', help='Write results to this file')
+    args = argparser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    app = QCoreApplication(sys.argv) # pylint:disable=unused-variable
+    results = run(args)
+    print('round  seconds  pages  apps  pages/sec  apps/sec  parse sec  errors')
+    for r in results:
+        print('{round:5d}  {seconds:7.2f}  {pages:5d}  {apps:4d}  {pages_per_sec:9.1f}  {apps_per_sec:8.1f}  {parse_seconds:9.2f}  {errors:6d}'.format(**r))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'args': vars(args), 'results': results}, f, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,204 @@
+#!/usr/bin/env python
+''' Local stand-in for the parts of steamcommunity.com used by steam_idle_qt
+
+    Serves synthetic badges and gamecards pages for a library of configurable
+    size, a stubbed mobile login and GetAppInfo. Latency and errors can be
+    injected to exercise the RequestGuard.
+
+    Run standalone:
+        python -m benchmarks.steam_standin --apps 5000 --port 8080
+'''
+import re
+import json
+import random
+import logging
+import argparse
+import threading
+from time import sleep
+from collections import Counter
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import urlsplit, parse_qs
+except ImportError: # Python 2
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import urlsplit, parse_qs
+
+logger = logging.getLogger(__name__)
+
+BADGE_TEMPLATE = '''<div class="badge_row">
+ <div class="badge_title">{name}</div>
+ <div class="badge_title_stats">
+  <div class="badge_title_stats_playtime">&nbsp;{playTime:.1f} hrs on record</div>
+  <div class="badge_title_stats_drops">
+   <span class="progress_info_bold">{drops}</span>
+   <div class="card_drop_info_dialog" id="card_drop_info_gamebadge_{appid}_1_0"></div>
+  </div>
+ </div>
+</div>
+'''
+
+class SyntheticLibrary(object):
+    ''' A library of apps with random remaining drops and playtime '''
+    def __init__(self, apps=1000, perPage=150, seed=0, firstAppId=10000):
+        rnd = random.Random(seed)
+        self.perPage = perPage
+        self.apps = []
+        for i in range(apps):
+            self.apps.append({
+                'appid': firstAppId + i * 10,
+                'name': 'Synthetic Game %d' % i,
+                'remainingDrops': rnd.choice((0, 0, 1, 2, 3, 4)),
+                'playTime': round(rnd.uniform(0.0, 10.0), 1),
+            })
+        self.byAppId = dict((a['appid'], a) for a in self.apps)
+
+    @property
+    def pages(self):
+        return max(1, (len(self.apps) + self.perPage - 1) // self.perPage)
+
+    @staticmethod
+    def badge(app):
+        if app['remainingDrops']:
+            drops = '%d card drop%s remaining' % (app['remainingDrops'], 's' if app['remainingDrops'] > 1 else '')
+        else:
+            drops = 'No card drops remaining'
+        return BADGE_TEMPLATE.format(drops=drops, **app)
+
+    def badgesPage(self, page):
+        apps = self.apps[(page - 1) * self.perPage:page * self.perPage]
+        pagelinks = ''.join('<a class="pagelink" href="?p=%d">%d</a>' % (p, p) for p in range(1, self.pages + 1))
+        return '<html><body><div class="pageLinks">{}</div>{}</body></html>'.format(
+            pagelinks,
+            ''.join(self.badge(a) for a in apps),
+        )
+
+    def gamecardsPage(self, appid):
+        app = self.byAppId.get(appid)
+        return '<html><body>{}</body></html>'.format(self.badge(app) if app else '')
+
+class StandInHandler(BaseHTTPRequestHandler):
+    re_gamecards = re.compile(r'^/my/gamecards/(\d+)/?$')
+
+    def log_message(self, fmt, *args):
+        logger.debug(fmt, *args)
+
+    def _send(self, body, status=200, contentType='text/html; charset=utf-8'):
+        data = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', contentType)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _sendJson(self, data):
+        self._send(json.dumps(data), contentType='application/json')
+
+    def _inject(self):
+        ''' Apply latency and errors, returns True if an error was sent '''
+        server = self.server
+        if server.latency:
+            sleep(server.latency * random.uniform(0.5, 1.5))
+        if server.errorRate and random.random() < server.errorRate:
+            server.count('error')
+            self._send('Service Unavailable', status=503)
+            return True
+        return False
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        if self._inject():
+            return
+        library = self.server.library
+        if url.path == '/my/badges':
+            self.server.count('badges')
+            self._send(library.badgesPage(int(query.get('p', ['1'])[0])))
+        elif self.re_gamecards.match(url.path):
+            self.server.count('gamecards')
+            self._send(library.gamecardsPage(int(self.re_gamecards.match(url.path).group(1))))
+        elif url.path == '/ISteamGameOAuth/GetAppInfo/v1/':
+            self.server.count('appinfo')
+            appids = [int(a) for a in query.get('appids', [''])[0].split(',') if a]
+            self._sendJson({'apps': [
+                {'appid': a, 'name': library.byAppId[a]['name']} for a in appids if a in library.byAppId
+            ]})
+        elif url.path in ('/my', '/my/'):
+            self.server.count('profile')
+            self._send('<html><body>Stand-in profile</body></html>')
+        else:
+            self._send('Not found', status=404)
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        length = int(self.headers.get('Content-Length', 0))
+        self.rfile.read(length)
+        if self._inject():
+            return
+        if url.path == '/mobilelogin/getrsakey/':
+            self.server.count('login')
+            self._sendJson({
+                'success': True,
+                'publickey_mod': self.server.publickeyMod,
+                'publickey_exp': '010001',
+                'timestamp': '1',
+            })
+        elif url.path == '/mobilelogin/dologin/':
+            self.server.count('login')
+            self._sendJson({
+                'success': True,
+                'oauth': json.dumps({'steamid': '76561197960287930', 'oauth_token': 'standin'}),
+            })
+        else:
+            self._send('Not found', status=404)
+
+class StandInServer(ThreadingMixIn, HTTPServer):
+    ''' Threaded HTTP server serving a SyntheticLibrary, runs in a daemon thread
+        after start(). url is the base URL to send requests to.
+    '''
+    daemon_threads = True
+
+    def __init__(self, library, port=0, latency=0.0, errorRate=0.0):
+        HTTPServer.__init__(self, ('127.0.0.1', port), StandInHandler)
+        self.library = library
+        self.latency = latency
+        self.errorRate = errorRate
+        self.counters = Counter()
+        self._countersLock = threading.Lock()
+        try:
+            from Crypto.PublicKey import RSA
+            self.publickeyMod = '%x' % RSA.generate(1024).n
+        except ImportError:
+            # Any odd number will do, the password is never decrypted
+            self.publickeyMod = '%x' % ((1 << 1023) | 1)
+
+    @property
+    def url(self):
+        return 'http://%s:%d' % self.server_address
+
+    def count(self, name):
+        with self._countersLock:
+            self.counters[name] += 1
+
+    def start(self):
+        t = threading.Thread(target=self.serve_forever)
+        t.daemon = True
+        t.start()
+        return self
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--apps', type=int, default=1000, help='Number of apps in the library')
+    parser.add_argument('--per-page', type=int, default=150, help='Badges per badges page')
+    parser.add_argument('--latency', type=float, default=0.0, help='Mean latency per request in seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests answered with 503')
+    parser.add_argument('--port', type=int, default=8080)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.DEBUG)
+    server = StandInServer(SyntheticLibrary(args.apps, args.per_page), args.port, args.latency, args.error_rate)
+    print('Serving %d apps on %d pages at %s' % (args.apps, server.library.pages, server.url))
+    server.serve_forever()
+
+if __name__ == '__main__':
+    main()
@@ -32,6 +32,7 @@ setup(
     ],
     scripts = [
         'steam_idle_gui.py',
+        'steam_idle_daemon.py',
     ],
     windows = ['steam_idle_gui.py'],
     options = {
@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+''' Idle without GUI (and without a display), see steam_idle_qt.IdleDaemon
+
+    ./steam_idle_daemon.py [--mode Idle|Multi-Idle] [--all-accounts]
+
+With --all-accounts every account of the settings is idled (see
+steam_idle_qt.MultiAccountEngine).
+'''
+
+import sys
+if sys.version_info.major < 3: # Python 2
+    # Force API version to v2
+    import sip
+    API_NAMES = ['QDate', 'QDateTime', 'QString', 'QTextStream', 'QTime', 'QUrl', 'QVariant']
+    API_VERSION = 2
+    for name in API_NAMES:
+        sip.setapi(name, API_VERSION)
+
+import signal
+import logging
+import argparse
+from PyQt4.QtCore import QCoreApplication, QTimer
+from steam_idle_qt.IdleDaemon import IdleDaemon, HeadlessLoginError
+from steam_idle_qt.MultiAccountEngine import MultiAccountEngine, NoAccountsError
+LOGFMT = '%(asctime)s (%(name)s.%(funcName)s) [%(levelname)s] %(message)s'
+logger = logging.getLogger(__name__)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Idle your Steam library for cards, without GUI')
+    parser.add_argument('--mode', choices=(IdleDaemon.IDLE, IdleDaemon.MULTI_IDLE),
+                        help='Default: the autostart mode of the settings, Idle if there is none')
+    parser.add_argument('--all-accounts', action='store_true',
+                        help='Idle all accounts of the settings in this process')
+    parser.add_argument('--debug', action='store_true')
+    args = parser.parse_args()
+
+    logging.basicConfig(format=LOGFMT,
+        level=logging.DEBUG if args.debug else logging.INFO,
+    )
+    logging.getLogger('requests').setLevel(logging.WARNING)
+
+    app = QCoreApplication(sys.argv)
+    try:
+        if args.all_accounts:
+            daemon = MultiAccountEngine(mode=args.mode)
+        else:
+            daemon = IdleDaemon(mode=args.mode)
+        daemon.start()
+    except (HeadlessLoginError, NoAccountsError) as e:
+        logger.error('%s', e)
+        sys.exit(1)
+    app.aboutToQuit.connect(daemon.stop)
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *args: app.quit())
+    # Python signal handlers only run while the interpreter is active, wake it up now and then
+    wakeUpTimer = QTimer()
+    wakeUpTimer.timeout.connect(lambda: None)
+    wakeUpTimer.start(500)
+    sys.exit(app.exec_())
@@ -0,0 +1,129 @@
+''' Immutable, versioned snapshot of the steam data
+
+    Instead of a dict of App instances the snapshot keeps one column per
+    field: appids, remaining drops and play times in typed arrays and the
+    names in a tuple. That is a few dozen bytes per game instead of an App
+    instance with its own __dict__ (plus the dict entry) per game and receiver.
+
+    A snapshot is never modified after construction, so one instance is
+    shared by all threads: QSteamParser sends the same object to every
+    receiver, an update results in a new snapshot (see replace and without).
+
+    It is a read-only mapping of appid to App. The App instances are
+    created on access, code that only needs a field should use drops(),
+    playTime(), name() or iconPath(). The totals are computed once per
+    snapshot, in the same pass that fills the columns.
+'''
+import os
+from array import array
+try:
+    from collections.abc import Mapping
+except ImportError: # Python 2
+    from collections import Mapping
+# steam_idle.page_parser is imported by __getitem__, the UI imports this module at startup
+
+class AppSnapshot(Mapping):
+    __slots__ = ('version', 'image_path', '_appids', '_names', '_drops', '_playTimes', '_index',
+                 'totalRemainingDrops', 'totalGamesToIdle', 'gamesInRefundPeriod')
+
+    def __init__(self, version=0, rows=(), image_path=''):
+        ''' rows is an iterable of (<appid>, <name>, <remainingDrops>, <playTime>) '''
+        self.version = version
+        self.image_path = image_path
+        appids, names, drops, playTimes = [], [], [], []
+        totalRemainingDrops = totalGamesToIdle = gamesInRefundPeriod = 0
+        for appid, name, remainingDrops, playTime in rows:
+            appids.append(appid)
+            names.append(name)
+            drops.append(remainingDrops)
+            playTimes.append(playTime)
+            if remainingDrops > 0:
+                totalRemainingDrops += remainingDrops
+                totalGamesToIdle += 1
+                if playTime < 2.0:
+                    gamesInRefundPeriod += 1
+        self._appids = array('l', appids)
+        self._names = tuple(names)
+        self._drops = array('l', drops)
+        self._playTimes = array('d', playTimes)
+        self._index = dict((appid, i) for i, appid in enumerate(appids))
+        self.totalRemainingDrops = totalRemainingDrops
+        self.totalGamesToIdle = totalGamesToIdle
+        self.gamesInRefundPeriod = gamesInRefundPeriod
+
+    @classmethod
+    def fromApps(cls, version, apps, image_path=''):
+        ''' Snapshot of the App instances of apps ({<appid>: <App instance>, ...}) '''
+        return cls(version, (
+            (a.appid, a.name, a.remainingDrops, a.playTime) for a in apps.values()
+        ), image_path)
+
+    def __repr__(self):
+        return '<AppSnapshot version {} ({} apps)>'.format(self.version, len(self))
+
+    # Mapping interface
+    def __getitem__(self, appid):
+        from steam_idle.page_parser import App
+        i = self._index[appid]
+        app = App(self.image_path)
+        app.appid = appid
+        app.name = self._names[i]
+        app.remainingDrops = self._drops[i]
+        app.playTime = self._playTimes[i]
+        return app
+
+    def __contains__(self, appid):
+        return appid in self._index
+
+    def __iter__(self):
+        return iter(self._appids)
+
+    def __len__(self):
+        return len(self._appids)
+
+    # Column access, without creating App instances
+    def record(self, appid):
+        ''' Returns (<name>, <remainingDrops>, <playTime>) of appid or None '''
+        i = self._index.get(appid)
+        if i is None:
+            return None
+        return self._names[i], self._drops[i], self._playTimes[i]
+
+    def name(self, appid):
+        return self._names[self._index[appid]]
+
+    def drops(self, appid):
+        return self._drops[self._index[appid]]
+
+    def playTime(self, appid):
+        return self._playTimes[self._index[appid]]
+
+    def iconPath(self, appid):
+        ''' Path of the icon of appid, like App.icon '''
+        return os.path.join(self.image_path, '%d_icon.jpg' % appid)
+
+    def rows(self):
+        ''' Iterates over (<appid>, <name>, <remainingDrops>, <playTime>) '''
+        return zip(self._appids, self._names, self._drops, self._playTimes)
+
+    def appidsWithDrops(self, refundOnly=False):
+        ''' appids of all apps with remaining drops (and less than 2h play time if refundOnly) '''
+        return [appid for appid, _, d, p in self.rows() if d > 0 and (not refundOnly or p < 2.0)]
+
+    # Derived snapshots
+    def replace(self, version, apps):
+        ''' New snapshot with the App instances of apps added or replacing the existing ones '''
+        rows = []
+        for row in self.rows():
+            app = apps.get(row[0])
+            rows.append(row if app is None else (app.appid, app.name, app.remainingDrops, app.playTime))
+        rows.extend(
+            (a.appid, a.name, a.remainingDrops, a.playTime)
+            for appid, a in apps.items() if appid not in self._index
+        )
+        return AppSnapshot(version, rows, self.image_path)
+
+    def without(self, version, appids):
+        ''' New snapshot without appids '''
+        appids = set(appids)
+        return AppSnapshot(version, (r for r in self.rows() if r[0] not in appids), self.image_path)
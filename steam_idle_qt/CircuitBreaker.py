@@ -0,0 +1,100 @@
+''' Rate limit and circuit breaker used by RequestGuard (no Qt involved) '''
+from time import time, sleep
+from threading import Lock
+from requests.exceptions import ConnectionError
+
+class CircuitOpenError(ConnectionError):
+    ''' Raised instead of sending a request while the circuit breaker is open '''
+    pass
+
+class TokenBucket(object):
+    ''' Thread safe token bucket, acquire() blocks until a token is available '''
+    def __init__(self, rate, capacity):
+        self.rate = float(rate) # Tokens per second
+        self.capacity = float(capacity)
+        self._tokens = self.capacity
+        self._last = time()
+        self._lock = Lock()
+
+    def acquire(self):
+        ''' Take one token, returns the number of seconds waited for it '''
+        with self._lock:
+            now = time()
+            self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= 1
+            # A negative balance is the time the caller has to wait for its token
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait > 0:
+            sleep(wait)
+        return wait
+
+class CircuitBreaker(object):
+    ''' Stops requests after failureThreshold consecutive failures for resetTimeout
+        seconds. After that a single trial request is let through (half-open),
+        the circuit closes again if it succeeds. If the trial ends without
+        success() or failure() (cancel()), the next request is the trial.
+
+        onStateChange is called with the new state after the lock is released,
+        so it may use the breaker.
+    '''
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, failureThreshold=5, resetTimeout=120, onStateChange=None):
+        self.failureThreshold = failureThreshold
+        self.resetTimeout = resetTimeout
+        self.onStateChange = onStateChange
+        self.state = self.CLOSED
+        self._failures = 0
+        self._openedAt = 0
+        self._trial = False # The trial request is running
+        self._lock = Lock()
+
+    def _setState(self, state):
+        ''' Set state (holding the lock), returns it if it changed, None otherwise '''
+        if state == self.state:
+            return None
+        self.state = state
+        return state
+
+    def _notify(self, state):
+        if state is not None and self.onStateChange:
+            self.onStateChange(state)
+
+    def before(self):
+        ''' Raises CircuitOpenError if no request should be send now '''
+        changed = None
+        with self._lock:
+            if self.state == self.OPEN:
+                if time() - self._openedAt < self.resetTimeout:
+                    raise CircuitOpenError('Circuit breaker is open, not sending request')
+                changed = self._setState(self.HALF_OPEN)
+            elif self.state == self.HALF_OPEN and self._trial:
+                raise CircuitOpenError('Circuit breaker is half-open, not sending request')
+            if self.state == self.HALF_OPEN:
+                self._trial = True
+        self._notify(changed)
+
+    def success(self):
+        with self._lock:
+            self._trial = False
+            self._failures = 0
+            changed = self._setState(self.CLOSED)
+        self._notify(changed)
+
+    def failure(self):
+        changed = None
+        with self._lock:
+            self._trial = False
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.failureThreshold:
+                self._openedAt = time()
+                changed = self._setState(self.OPEN)
+        self._notify(changed)
+
+    def cancel(self):
+        ''' The request ended without a result (no-op after success() or failure()) '''
+        with self._lock:
+            self._trial = False
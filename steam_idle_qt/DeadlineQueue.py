@@ -0,0 +1,58 @@
+''' Deadlines of the refreshes of RefreshScheduler (no Qt involved) '''
+import heapq
+
+class DeadlineQueue(object):
+    ''' One deadline (timestamp) per appid, the earliest one is found in O(log n)
+
+        Rescheduling or unscheduling an app leaves its old heap entry in place,
+        entries not matching the current deadline are dropped when they reach
+        the top of the heap.
+    '''
+    def __init__(self):
+        self._heap = [] # (<deadline>, <appid>), entries not matching _deadlines are stale
+        self._deadlines = {} # {<appid>: <deadline>, ...}
+
+    def __len__(self):
+        return len(self._deadlines)
+
+    def schedule(self, appid, deadline):
+        ''' Set the deadline of appid (replacing an old one) '''
+        self._deadlines[appid] = deadline
+        heapq.heappush(self._heap, (deadline, appid))
+
+    def unschedule(self, appid):
+        ''' Remove the deadline of appid, returns False if it had none '''
+        return self._deadlines.pop(appid, None) is not None
+
+    def clear(self):
+        self._heap = []
+        self._deadlines = {}
+
+    def upcoming(self):
+        ''' Returns [(<appid>, <deadline>), ...] sorted by deadline '''
+        return sorted(self._deadlines.items(), key=lambda x: x[1])
+
+    def next(self):
+        ''' The earliest deadline or None '''
+        # Drop stale heap entries (unscheduled or rescheduled apps)
+        while self._heap and self._deadlines.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+        return self._heap[0][0] if self._heap else None
+
+    def delay(self, now, maxInterval):
+        ''' Seconds from now until the earliest deadline, at most maxInterval
+            (0 if it has passed), None if there is no deadline
+        '''
+        deadline = self.next()
+        if deadline is None:
+            return None
+        return min(max(deadline - now, 0), maxInterval)
+
+    def popDue(self, limit):
+        ''' Remove and return the appids of all deadlines up to limit, earliest first '''
+        due = []
+        while self.next() is not None and self._heap[0][0] <= limit:
+            _, appid = heapq.heappop(self._heap)
+            del self._deadlines[appid]
+            due.append(appid)
+        return due
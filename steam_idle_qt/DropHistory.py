@@ -0,0 +1,271 @@
+''' History of remaining drops and play time, stored in a SQLite database
+
+    DropHistory is connected to steamDataReady/steamDataDelta of QSteamParser
+    and lives in a thread of its own. Every refresh is written to the
+    refreshes table. A sample (remaining drops and play time) of an app is
+    written when it is seen first and whenever one of the values changed, so
+    the values of all apps at any refresh can be derived from the samples.
+    If the remaining drops of an app went down a drop event is written, with
+    the number of cards dropped and the play time at that moment.
+
+    Rows are collected in memory and written in one transaction every
+    flushInterval seconds (or as soon as batchSize rows are pending). The
+    database is in WAL mode, so the query methods can be called from any
+    thread while a batch is written. They see flushed rows only, through a
+    read-only connection per thread that is closed by stop().
+'''
+import os
+import sqlite3
+import logging
+import threading
+try:
+    from urllib.request import pathname2url
+except ImportError: # Python 2
+    from urllib import pathname2url
+from time import time
+from PyQt4.QtCore import pyqtSlot, QObject, QTimer
+from steam_idle_qt.AppSnapshot import AppSnapshot
+from steam_idle_qt.SteamDataDelta import SteamDataDelta
+from steam_idle_qt.Metrics import metrics
+
+SCHEMA = (
+    '''CREATE TABLE IF NOT EXISTS refreshes (
+        ts REAL NOT NULL,
+        version INTEGER NOT NULL,
+        apps INTEGER NOT NULL,
+        changed INTEGER NOT NULL
+    )''',
+    '''CREATE TABLE IF NOT EXISTS samples (
+        appid INTEGER NOT NULL,
+        ts REAL NOT NULL,
+        remaining_drops INTEGER NOT NULL,
+        play_time REAL NOT NULL
+    )''',
+    '''CREATE TABLE IF NOT EXISTS drops (
+        appid INTEGER NOT NULL,
+        ts REAL NOT NULL,
+        count INTEGER NOT NULL,
+        remaining_drops INTEGER NOT NULL,
+        play_time REAL NOT NULL
+    )''',
+    'CREATE INDEX IF NOT EXISTS refreshes_ts ON refreshes (ts)',
+    'CREATE INDEX IF NOT EXISTS samples_appid_ts ON samples (appid, ts)',
+    'CREATE INDEX IF NOT EXISTS drops_ts ON drops (ts)',
+    'CREATE INDEX IF NOT EXISTS drops_appid_ts ON drops (appid, ts)',
+)
+
+class DropHistory(QObject):
+    flushInterval = 30 # Seconds between two writes
+    batchSize = 500 # Pending rows that trigger a write right away
+
+    def __init__(self, path, flushInterval=None):
+        super(DropHistory, self).__init__()
+        self.logger = logging.getLogger('.'.join((__name__, self.__class__.__name__)))
+        self.path = path
+        if flushInterval is not None:
+            self.flushInterval = flushInterval
+        self._db = None # Connection used for writing, owned by the thread of this object
+        self._readers = threading.local() # Connections used by the query methods, one per thread
+        self._readerConnections = [] # All of them, to close them in stop()
+        self._readersLock = threading.Lock()
+        self._timer = None
+        self._last = {} # {<appid>: (<remainingDrops>, <playTime>), ...} of the last sample
+        self._refreshes = []
+        self._samples = []
+        self._drops = []
+
+    @classmethod
+    def fromSettings(cls, settings, data_path):
+        ''' History configured by the history/* settings, None if disabled '''
+        if not settings.value('history/enabled', True, type=bool):
+            return None
+        return cls(
+            os.path.join(data_path, 'history.sqlite'),
+            settings.value('history/flushinterval', cls.flushInterval, type=int),
+        )
+
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=10)
+        db.execute('PRAGMA journal_mode=WAL')
+        # Durable enough with WAL, a crash may lose the last batch only
+        db.execute('PRAGMA synchronous=NORMAL')
+        with db:
+            for statement in SCHEMA:
+                db.execute(statement)
+        return db
+
+    @pyqtSlot()
+    def start(self):
+        ''' Open the database (call from the thread this object lives in) '''
+        try:
+            self._db = self._connect()
+            # Continue with the values of the last run, so drops in between are noticed
+            self._last = dict(
+                (appid, (remainingDrops, playTime))
+                for appid, remainingDrops, playTime in self._db.execute(
+                    '''SELECT appid, remaining_drops, play_time FROM samples
+                       WHERE rowid IN (SELECT max(rowid) FROM samples GROUP BY appid)'''
+                )
+            )
+        except sqlite3.Error:
+            self.logger.exception('Unable to open drop history "%s", not recording', self.path)
+            self._db = None
+            return
+        self.logger.info('Recording drop history to "%s" (%d apps known)', self.path, len(self._last))
+        self._timer = QTimer(self)
+        self._timer.timeout.connect(self.flush)
+        self._timer.start(max(1, self.flushInterval) * 1000)
+
+    def _connectReader(self):
+        try:
+            db = sqlite3.connect('file:%s?mode=ro' % pathname2url(os.path.abspath(self.path)),
+                                 timeout=10, uri=True, check_same_thread=False)
+        except TypeError: # Python 2, no URI filenames
+            db = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+        with self._readersLock:
+            self._readerConnections.append(db)
+        return db
+
+    @pyqtSlot()
+    def stop(self):
+        ''' Write pending rows and close the database (and all reader connections) '''
+        if self._timer is not None:
+            self._timer.stop()
+        self.flush()
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+        with self._readersLock:
+            readers, self._readerConnections = self._readerConnections, []
+            # Queries after stop() open new connections
+            self._readers = threading.local()
+        for db in readers:
+            db.close()
+
+    @pyqtSlot(AppSnapshot)
+    def on_steamDataReady(self, apps):
+        ''' Record all apps of a full snapshot '''
+        ts = time()
+        changed = self._record(ts, apps.rows())
+        self._addRefresh(ts, apps.version, len(apps), changed)
+
+    @pyqtSlot(SteamDataDelta)
+    def on_steamDataDelta(self, delta):
+        ''' Record the apps that have been added or changed '''
+        ts = time()
+        for appid in delta.removed:
+            self._last.pop(appid, None)
+        snapshot = delta.snapshot
+        changed = 0
+        if snapshot is not None:
+            appids = list(delta.added) + list(delta.changed)
+            changed = self._record(ts, ((appid,) + snapshot.record(appid) for appid in appids))
+        self._addRefresh(ts, delta.version, len(snapshot) if snapshot is not None else 0, changed)
+
+    def _record(self, ts, rows):
+        ''' Queue samples (and drops) of rows ((<appid>, <name>, <remainingDrops>, <playTime>), ...)
+            that differ from the last sample, returns the number of samples
+        '''
+        samples = 0
+        for appid, _, remainingDrops, playTime in rows:
+            last = self._last.get(appid)
+            if last == (remainingDrops, playTime):
+                continue
+            if last is not None and remainingDrops < last[0]:
+                self._drops.append((appid, ts, last[0] - remainingDrops, remainingDrops, playTime))
+            self._samples.append((appid, ts, remainingDrops, playTime))
+            self._last[appid] = (remainingDrops, playTime)
+            samples += 1
+        return samples
+
+    def _addRefresh(self, ts, version, apps, changed):
+        self._refreshes.append((ts, version, apps, changed))
+        if len(self._refreshes) + len(self._samples) + len(self._drops) >= self.batchSize:
+            self.flush()
+
+    @pyqtSlot()
+    def flush(self):
+        ''' Write all pending rows in one transaction '''
+        if self._db is None or not (self._refreshes or self._samples or self._drops):
+            return
+        with metrics().span('history_flush'):
+            try:
+                with self._db:
+                    self._db.executemany('INSERT INTO refreshes VALUES (?, ?, ?, ?)', self._refreshes)
+                    self._db.executemany('INSERT INTO samples VALUES (?, ?, ?, ?)', self._samples)
+                    self._db.executemany('INSERT INTO drops VALUES (?, ?, ?, ?, ?)', self._drops)
+            except sqlite3.Error:
+                # Keep the rows, they are written with the next batch
+                self.logger.exception('Unable to write %d rows to drop history',
+                    len(self._refreshes) + len(self._samples) + len(self._drops))
+                return
+        self.logger.debug('Wrote %d refreshes, %d samples and %d drops to drop history',
+            len(self._refreshes), len(self._samples), len(self._drops))
+        self._refreshes = []
+        self._samples = []
+        self._drops = []
+
+    # Queries, may be called from any thread
+    def _query(self, sql, args=()):
+        db = getattr(self._readers, 'db', None)
+        if db is None:
+            db = self._readers.db = self._connectReader()
+        return db.execute(sql, args).fetchall()
+
+    def refreshTimes(self, since=0):
+        ''' Returns the timestamps of all refreshes since since '''
+        return [ts for ts, in self._query('SELECT ts FROM refreshes WHERE ts >= ? ORDER BY ts', (since,))]
+
+    def samples(self, appid, since=0):
+        ''' Returns [(<timestamp>, <remainingDrops>, <playTime>), ...] of appid '''
+        return self._query(
+            'SELECT ts, remaining_drops, play_time FROM samples WHERE appid = ? AND ts >= ? ORDER BY ts',
+            (appid, since)
+        )
+
+    def drops(self, appid=None, since=0):
+        ''' Returns [(<appid>, <timestamp>, <count>, <remainingDrops>, <playTime>), ...]
+            of appid (all apps if None) since since, ordered by time
+        '''
+        if appid is None:
+            return self._query('SELECT * FROM drops WHERE ts >= ? ORDER BY ts', (since,))
+        return self._query('SELECT * FROM drops WHERE appid = ? AND ts >= ? ORDER BY ts', (appid, since))
+
+    def dropsPerHour(self, since=None, until=None, appid=None):
+        ''' Cards dropped per hour between since and until (default: the first
+            and last recorded refresh), of appid or of all apps
+        '''
+        first, last = self._query('SELECT min(ts), max(ts) FROM refreshes')[0]
+        since = first if since is None else since
+        until = last if until is None else until
+        if since is None or until is None or until <= since:
+            return 0.0
+        sql = 'SELECT coalesce(sum(count), 0) FROM drops WHERE ts >= ? AND ts <= ?'
+        args = (since, until)
+        if appid is not None:
+            sql += ' AND appid = ?'
+            args += (appid,)
+        dropped = self._query(sql, args)[0][0]
+        return dropped * 3600.0 / (until - since)
+
+    def dropIntervals(self, appid):
+        ''' Observed time between the drops of appid
+            Returns [(<seconds>, <play time hours>, <count>), ...], seconds and
+            play time since the previous drop, count is the number of cards
+            dropped (more than one if there was no refresh in between).
+        '''
+        intervals = []
+        previous = None
+        for _, ts, count, _, playTime in self.drops(appid):
+            if previous is not None:
+                intervals.append((ts - previous[0], playTime - previous[1], count))
+            previous = (ts, playTime)
+        return intervals
+
+    def meanDropInterval(self, appid):
+        ''' Mean seconds per card drop of appid or None if less than two drops are recorded '''
+        intervals = self.dropIntervals(appid)
+        cards = sum(count for _, _, count in intervals)
+        if not cards:
+            return None
+        return sum(seconds for seconds, _, _ in intervals) / float(cards)
@@ -0,0 +1,143 @@
+''' Predicts the next card drop of an app from the recorded drop history
+
+    The time between two drops is taken from the drop events of DropHistory.
+    Only intervals the app was idled through are used (its play time went
+    up by at least continuousIdle of the wall clock time), divided by the
+    number of cards dropped in them.
+
+    Intervals are modelled as log-normal. The estimate of an app is shrunk
+    towards the one of all apps by priorWeight pseudo intervals, so apps
+    with few (or no) recorded drops get the pooled estimate. Until at least
+    minSamples intervals are recorded in total there is no prediction and
+    calc_delay of steam_idle is used.
+
+    The predictor only skips refreshes calc_delay would do before the drops
+    can have happened, it refreshes more often than calc_delay only for
+    precise predictions (see refreshDelay and benchmarks.eval_predictor). It
+    is off unless predictor/enabled is set.
+'''
+import math
+import logging
+import sqlite3
+from time import time
+from collections import namedtuple
+from steam_idle.idle import calc_delay
+
+# Seconds after the last drop (or the start of idle) the next drop is expected,
+# low and high are the bounds of the confidence interval
+Prediction = namedtuple('Prediction', ('expected', 'low', 'high'))
+
+class DropPredictor(object):
+    minSamples = 5 # Intervals (of all apps) needed for a prediction
+    priorWeight = 3 # Pseudo intervals of the pooled estimate added to every app
+    z = 1.645 # Confidence interval of 90%
+    continuousIdle = 0.5
+    minDelay = 60 # Seconds, never refresh more often than this
+    lastDropPoll = 120 # Seconds between the refreshes while the last drop is expected
+    preciseSpread = 3.0 # Max. high / low of a prediction precise enough to refresh before calc_delay
+    retrainInterval = 60 * 60 # Seconds between two reads of the history
+
+    def __init__(self, history=None):
+        self.logger = logging.getLogger('.'.join((__name__, self.__class__.__name__)))
+        self.history = history
+        self._trained = None # Timestamp of the last training
+        self._apps = {} # {<appid>: (<n>, <mean log seconds>, <variance>), ...}
+        self._pooled = None # (<n>, <mean log seconds>, <variance>) of all apps
+
+    @classmethod
+    def fromSettings(cls, settings, history):
+        ''' Predictor reading history if predictor/enabled is set, None otherwise
+            (or without a history)
+        '''
+        if history is None or not settings.value('predictor/enabled', False, type=bool):
+            return None
+        return cls(history)
+
+    @staticmethod
+    def _stats(values):
+        n = len(values)
+        mean = sum(values) / n
+        variance = sum((v - mean) ** 2 for v in values) / (n - 1) if n > 1 else 0.0
+        return n, mean, variance
+
+    def train(self, drops=None):
+        ''' Estimate the intervals from drops ([(<appid>, <timestamp>, <count>,
+            <remainingDrops>, <playTime>), ...] ordered by time), by default
+            all drops of the history
+        '''
+        if drops is None:
+            drops = self.history.drops()
+        previous = {} # {<appid>: (<timestamp>, <playTime>), ...}
+        intervals = {} # {<appid>: [<log seconds per card>, ...], ...}
+        for appid, ts, count, _, playTime in drops:
+            last = previous.get(appid)
+            previous[appid] = (ts, playTime)
+            if last is None or count < 1:
+                continue
+            seconds = ts - last[0]
+            if seconds > 0 and (playTime - last[1]) * 3600 >= self.continuousIdle * seconds:
+                intervals.setdefault(appid, []).append(math.log(seconds / count))
+        self._apps = dict((appid, self._stats(values)) for appid, values in intervals.items())
+        pooled = [v for values in intervals.values() for v in values]
+        self._pooled = self._stats(pooled) if len(pooled) >= self.minSamples else None
+        self._trained = time()
+        self.logger.debug('Trained on %d intervals of %d apps', len(pooled), len(self._apps))
+
+    def _retrainIfStale(self):
+        if self.history is None:
+            return
+        if self._trained is None or time() - self._trained > self.retrainInterval:
+            try:
+                self.train()
+            except sqlite3.Error:
+                self.logger.exception('Unable to read the drop history')
+                self._trained = time()
+
+    def predict(self, appid):
+        ''' Returns the Prediction of the time between two drops of appid or None '''
+        self._retrainIfStale()
+        if self._pooled is None:
+            return None
+        _, pooledMean, pooledVariance = self._pooled
+        n, mean, variance = self._apps.get(appid, (0, 0.0, 0.0))
+        k = self.priorWeight
+        mean = (n * mean + k * pooledMean) / (n + k)
+        variance = ((n - 1) * variance + k * pooledVariance) / (n + k - 1) if n > 1 else pooledVariance
+        # Spread of a new interval, including the uncertainty of the mean
+        sd = math.sqrt(variance * (1 + 1.0 / (n + k)))
+        return Prediction(
+            math.exp(mean),
+            math.exp(mean - self.z * sd),
+            math.exp(mean + self.z * sd),
+        )
+
+    def refreshDelay(self, appid, remainingDrops, since, now=None):
+        ''' Seconds until the data of appid should be refreshed
+
+            since is the time after which the last drop happened (or the start
+            of idle). A refresh before a drop is wasted, one after the last
+            drop is late and the app is idled for nothing until then.
+
+            The delay is never shorter than calc_delay, with one exception.
+            While the last drop can not have happened yet (before remainingDrops
+            times the lower bound of one) refreshes are skipped up to that
+            bound, but not after the upper bound of the next drop. If only one
+            drop is left and the prediction is precise (its upper bound is at
+            most preciseSpread times the lower one), the refresh is done every
+            lastDropPoll seconds between the bounds instead.
+        '''
+        fallback = calc_delay(remainingDrops)
+        prediction = self.predict(appid)
+        if prediction is None:
+            return fallback
+        elapsed = (now if now is not None else time()) - since
+        lastLow = remainingDrops * prediction.low
+        if elapsed < lastLow:
+            if remainingDrops > 1:
+                # Not after the upper bound of the next drop
+                lastLow = min(lastLow, max(prediction.high, elapsed + fallback))
+            return max(fallback, int(lastLow - elapsed))
+        if remainingDrops == 1 and elapsed < prediction.high and \
+                prediction.high <= self.preciseSpread * prediction.low:
+            return max(self.minDelay, min(self.lastDropPoll, fallback))
+        return fallback
@@ -0,0 +1,432 @@
+''' Headless runner for Idle/MultiIdle
+
+    Wires QSteamParser, Idle and MultiIdle together like MainWindow does, but
+    on a QCoreApplication and without importing QtGui. Configuration is read
+    from the same QSettings as the GUI. Progress is logged as one
+    "<event> key=value ..." line per step, so it can be grepped or parsed.
+
+    There is nobody to solve a captcha or enter a SteamGuard code, log in
+    with the GUI once (the session cookies are reused) before running headless.
+
+    Several IdleDaemons (one per Account) can run in one process, see
+    MultiAccountEngine.
+'''
+import os
+import logging
+from time import time
+from PyQt4.QtCore import pyqtSlot, pyqtSignal, Qt, QObject, QThread, QDir, QMetaObject, Q_ARG, QTimer
+from steam_idle.page_parser import App
+from steam_idle_qt.QSteamWebBrowser import QSteamWebBrowser
+from steam_idle_qt.QSteamParser import QSteamParser
+from steam_idle_qt.SteamDataDelta import SteamDataDelta
+from steam_idle_qt.AppSnapshot import AppSnapshot
+from steam_idle_qt.QIdle import Idle, MultiIdle
+from steam_idle_qt.RequestGuard import requestGuard
+from steam_idle_qt.SteamWatcher import SteamWatcher
+from steam_idle_qt import ProcessMemory
+from steam_idle_qt.Metrics import MetricsExporter
+from steam_idle_qt.DropHistory import DropHistory
+from steam_idle_qt.DropPredictor import DropPredictor
+from steam_idle_qt.SettingsStore import settingsStore
+
+class HeadlessLoginError(Exception):
+    pass
+
+class HeadlessSteamWebBrowser(QSteamWebBrowser):
+    ''' QSteamWebBrowser that fails instead of asking the user '''
+    def _handle_captcha(self, captcha_data, message=''):
+        raise HeadlessLoginError('Steam requires a captcha, log in with the GUI once')
+
+    def _handle_emailauth(self, maildomain='', message=''):
+        raise HeadlessLoginError('SteamGuard requires an email code, log in with the GUI once')
+
+    def _handle_twofactor(self, message=''):
+        raise HeadlessLoginError('SteamGuard requires a mobile code, log in with the GUI once')
+
+class HeadlessSteamParser(QSteamParser):
+    browserClass = HeadlessSteamWebBrowser
+
+def defaultSettings():
+    return settingsStore()
+
+def dataPath(settings):
+    ''' Directory next to the settings file holding cookies, caches etc. '''
+    return os.path.join(os.path.dirname(QDir.toNativeSeparators(settings.fileName())), 'SteamIdle')
+
+class Account(object):
+    ''' Credentials, data directory and idle mode (None for the default) of a Steam account
+
+        The account of the GUI is stored as steam/username and steam/password,
+        further ones in the accounts group, one subgroup per username:
+
+            [accounts]
+            alice\\password=secret
+            alice\\autostart=Multi-Idle
+
+        Idle childs talk to the local Steam client, which is logged in to one
+        account only. Only that account (idleaccount setting, the one of the
+        GUI by default) idles, all others are monitored (idle is False).
+    '''
+    def __init__(self, username, password, data_path, mode=None, idle=True):
+        self.username = username
+        self.password = password
+        self.data_path = data_path
+        self.mode = mode
+        self.idle = idle
+
+    def __repr__(self):
+        return '<Account {}>'.format(self.username)
+
+    @classmethod
+    def fromSettings(cls, settings):
+        ''' The account of the GUI, raises HeadlessLoginError if there are no credentials '''
+        username = settings.value('steam/username', '')
+        password = settings.value('steam/password', '')
+        if not username or not password:
+            raise HeadlessLoginError('No username/password in "%s", store them with the GUI first' %
+                QDir.toNativeSeparators(settings.fileName()))
+        return cls(username, password, dataPath(settings))
+
+    @classmethod
+    def allFromSettings(cls, settings):
+        ''' The account of the GUI (if there are credentials) and all of the accounts group '''
+        accounts = []
+        try:
+            accounts.append(cls.fromSettings(settings))
+        except HeadlessLoginError:
+            pass
+        idleAccount = settings.value('idleaccount', '') or settings.value('steam/username', '')
+        for account in accounts:
+            account.idle = account.username == idleAccount
+        for username in settings.childGroups('accounts'):
+            if any(a.username == username for a in accounts):
+                continue
+            password = settings.value('accounts/%s/password' % username, '')
+            if not password:
+                raise HeadlessLoginError('No password for account "%s"' % username)
+            accounts.append(cls(
+                username,
+                password,
+                os.path.join(dataPath(settings), 'accounts', username),
+                settings.value('accounts/%s/autostart' % username, None),
+                username == idleAccount,
+            ))
+        return accounts
+
+class IdleDaemon(QObject):
+    ''' Idles (Multi-Idle first if configured) until no drops are left
+
+        mode is one of the autostart modes of the settings ('Idle' or
+        'Multi-Idle'), the mode of the account or the "autostart" setting is
+        used if it is None.
+
+        A standalone daemon (no steamWatcher given) watches the Steam client
+        and exports metrics itself. Otherwise it shares steamWatcher and the
+        refresh spacer with the daemons of other accounts.
+
+        The daemon of an account that does not idle (see Account) only
+        refreshes and records its data, it has no idle workers.
+    '''
+    IDLE = 'Idle'
+    MULTI_IDLE = 'Multi-Idle'
+    statusChanged = pyqtSignal()
+
+    def __init__(self, mode=None, account=None, steamWatcher=None, spacer=None, parent=None):
+        super(IdleDaemon, self).__init__(parent)
+        self.logger = logging.getLogger('.'.join((__name__, self.__class__.__name__)))
+        self.account = account
+        self.mode = mode or (account and account.mode) or self.settings.value('autostart', 'None')
+        if self.mode not in (self.IDLE, self.MULTI_IDLE):
+            self.mode = self.IDLE
+        self.steamWatcher = steamWatcher
+        self.spacer = spacer
+        self.metricsExporter = None
+        self.dropHistory = None
+        self.idle = None
+        self.multiIdle = None
+        self.apps = None # AppSnapshot shared with the parser, replaced by steamDataReady/-Delta
+        self.activeApps = [] # List of app instances currently ideling
+        self.lastRefresh = None # Timestamp of the last data from steam
+        self.lastError = None
+        self._multiIdleDone = False # Don't start MultiIdle again after it has completed
+        self._threads = []
+
+    @property
+    def settings(self):
+        return defaultSettings()
+
+    def logEvent(self, event, **fields):
+        if self.account is not None:
+            fields['account'] = self.account.username
+        self.logger.info('%s %s', event, ' '.join(
+            '{}={}'.format(k, fields[k]) for k in sorted(fields)
+        ))
+
+    def status(self):
+        ''' Returns a dict summing up the state of this daemon '''
+        apps = self.apps if self.apps is not None else AppSnapshot()
+        return {
+            'account': self.account.username if self.account else None,
+            'monitor_only': self.idle is None,
+            'mode': self.mode,
+            'apps': len(apps),
+            'drops': apps.totalRemainingDrops,
+            'refund': apps.gamesInRefundPeriod,
+            'idling': [a.appid for a in self.activeApps],
+            'last_refresh': self.lastRefresh,
+            'last_error': self.lastError,
+        }
+
+    def _thread(self, worker):
+        thread = QThread(self)
+        worker.moveToThread(thread)
+        self._threads.append(thread)
+        return thread
+
+    def start(self, refreshDelay=0):
+        ''' Set up all workers and threads, raises if there are no credentials
+            The first refresh is done after refreshDelay msec.
+        '''
+        if self.account is None:
+            self.account = Account.fromSettings(self.settings)
+        account = self.account
+        self.logEvent('start', mode=self.mode, data_path=account.data_path)
+        standalone = self.steamWatcher is None
+        if standalone:
+            self.metricsExporter = MetricsExporter.fromSettings(self.settings, account.data_path, parent=self)
+            if self.metricsExporter is not None:
+                self.metricsExporter.start()
+
+        self.parser = HeadlessSteamParser(
+            username=account.username,
+            password=account.password,
+            data_path=account.data_path
+        )
+        self.parser.spacer = self.spacer
+        if self.parser.apps:
+            self._setApps(self.parser.apps)
+        parserThread = self._thread(self.parser)
+        self.parser.steamDataReady.connect(self.on_steamDataReady)
+        self.parser.steamDataDelta.connect(self.on_steamDataDelta)
+        self.parser.steamDataError.connect(self.on_steamDataError)
+        self.parser.timerStart.connect(self.on_parser_timerStart)
+        self.dropHistory = DropHistory.fromSettings(self.settings, account.data_path)
+        if self.dropHistory is not None:
+            historyThread = self._thread(self.dropHistory)
+            historyThread.started.connect(self.dropHistory.start)
+            historyThread.start()
+            self.parser.steamDataReady.connect(self.dropHistory.on_steamDataReady)
+            self.parser.steamDataDelta.connect(self.dropHistory.on_steamDataDelta)
+        requestGuard().circuitStateChanged.connect(self.on_requestGuard_circuitStateChanged)
+
+        if not account.idle:
+            # The local Steam client belongs to another account
+            self.logEvent('monitor_only')
+            parserThread.start()
+            QTimer.singleShot(refreshDelay, self.refresh)
+            return
+
+        self.idle = Idle()
+        self.idle.predictor = DropPredictor.fromSettings(self.settings, self.dropHistory)
+        self._idleThread = self._thread(self.idle)
+        self.idle.appDone.connect(self.on_idleAppDone)
+        self.idle.finished.connect(self.on_idleFinished)
+        self.idle.finished.connect(self._idleThread.quit)
+
+        self.multiIdle = MultiIdle()
+        self._multiIdleThread = self._thread(self.multiIdle)
+        self.multiIdle.appDone.connect(self.on_multiIdleAppDone)
+        self.multiIdle.allDone.connect(self.on_multiIdleAllDone)
+        self.multiIdle.finished.connect(self.on_idleFinished)
+        self.multiIdle.finished.connect(self._multiIdleThread.quit)
+
+        for worker in (self.idle, self.multiIdle):
+            worker.statusUpdate.connect(self.on_statusUpdate)
+            self.parser.steamDataReady.connect(worker.on_steamDataReady)
+            self.parser.steamDataDelta.connect(worker.on_steamDataDelta)
+            worker.scheduleRefresh.connect(self.parser.scheduleRefresh)
+            worker.unscheduleRefresh.connect(self.parser.unscheduleRefresh)
+            worker.finished.connect(self.parser.stopTimer)
+            worker.supervisor.childExited.connect(self.on_supervisor_childExited)
+            worker.supervisor.appFailing.connect(self.on_supervisor_appFailing)
+
+        if standalone:
+            self.steamWatcher = SteamWatcher()
+            watcherThread = self._thread(self.steamWatcher)
+            watcherThread.started.connect(self.steamWatcher.start)
+            watcherThread.start()
+        self.steamWatcher.steamRunningChanged.connect(self.on_steamWatcher_steamRunningChanged)
+
+        parserThread.start()
+        QTimer.singleShot(refreshDelay, self.refresh)
+
+    def stop(self):
+        ''' Stop all idle childs and threads (blocks until they are done) '''
+        self.logEvent('stop', active=len(self.activeApps))
+        for worker in (self.idle, self.multiIdle):
+            if worker is not None and worker.thread().isRunning():
+                QMetaObject.invokeMethod(worker, 'doStopIdle', Qt.BlockingQueuedConnection)
+        if self.dropHistory is not None:
+            QMetaObject.invokeMethod(self.dropHistory, 'stop', Qt.BlockingQueuedConnection)
+        for thread in self._threads:
+            thread.quit()
+            thread.wait()
+        if self.metricsExporter is not None:
+            self.metricsExporter.stop()
+
+    @pyqtSlot()
+    def refresh(self):
+        QMetaObject.invokeMethod(self.parser, 'requestUpdate', Qt.QueuedConnection)
+
+    @property
+    def gamesInRefundPeriod(self):
+        return self.apps.gamesInRefundPeriod
+
+    def multiIdleCapacity(self):
+        ''' Number of games MultiIdle may run at once (by max. childs and memory budget) '''
+        settings = self.settings
+        capacity = settings.value('multiidlemaxchilds', 32, type=int)
+        budget = settings.value('multiidlememorybudget', 0, type=int) * 1024
+        if budget:
+            capacity = min(capacity, budget // ProcessMemory.DEFAULT_CHILD_KIB)
+        return capacity
+
+    def nextAppWithDrops(self, after=None):
+        ''' Return the next app (by appid, wrapping around) with remaining drops or None '''
+        appids = sorted(self.apps.appidsWithDrops())
+        for appid in appids:
+            if after is None or appid > after.appid:
+                return self.apps[appid]
+        return self.apps[appids[0]] if appids else None
+
+    def autostart(self):
+        ''' Start idle if the Steam client is running, data is there and nothing is ideling '''
+        if self.idle is None or self.activeApps or self.apps is None or not self.steamWatcher.isRunning():
+            return
+        if self.mode == self.MULTI_IDLE and not self._multiIdleDone:
+            threshold = self.settings.value('multiidlethreshold', 2, type=int)
+            refund = self.gamesInRefundPeriod
+            if refund >= threshold and self.multiIdleCapacity() >= min(threshold, refund):
+                self.startMultiIdle()
+                return
+            self.logEvent('multiidle_skipped', refund=refund, threshold=threshold)
+        app = self.nextAppWithDrops()
+        if app is None:
+            self.logEvent('all_done', apps=len(self.apps))
+            return
+        self.startIdle(app)
+
+    def startIdle(self, app):
+        if not self._idleThread.isRunning():
+            self._idleThread.start()
+        self.activeApps = [app]
+        self.logEvent('idle_start', appid=app.appid, drops=app.remainingDrops, playtime=app.playTime)
+        QMetaObject.invokeMethod(self.idle, 'doStartIdle', Qt.QueuedConnection, Q_ARG(App, app))
+
+    def startMultiIdle(self):
+        if not self._multiIdleThread.isRunning():
+            self._multiIdleThread.start()
+        self.activeApps = [self.apps[appid] for appid in self.apps.appidsWithDrops(refundOnly=True)]
+        self.logEvent('multiidle_start', apps=len(self.activeApps))
+        QMetaObject.invokeMethod(self.multiIdle, 'doStartIdle', Qt.QueuedConnection,
+                                    Q_ARG(list, self.activeApps))
+
+    def stopIdle(self):
+        ''' Stop whatever is ideling, on_idleFinished is called when done '''
+        if len(self.activeApps) > 1:
+            QMetaObject.invokeMethod(self.multiIdle, 'doStopIdle', Qt.QueuedConnection)
+        elif self.activeApps:
+            QMetaObject.invokeMethod(self.idle, 'doStopIdle', Qt.QueuedConnection)
+
+    def _setApps(self, apps):
+        # No copy, the snapshot is never modified
+        self.apps = apps
+
+    def _logTotals(self, event, **fields):
+        self.logEvent(event,
+            apps=len(self.apps),
+            drops=self.apps.totalRemainingDrops,
+            refund=self.apps.gamesInRefundPeriod,
+            **fields
+        )
+
+    @pyqtSlot(AppSnapshot)
+    def on_steamDataReady(self, apps):
+        self._setApps(apps)
+        self.lastRefresh = time()
+        self.lastError = None
+        self._logTotals('steam_data', version=self.parser.version)
+        self.autostart()
+        self.statusChanged.emit()
+
+    @pyqtSlot(SteamDataDelta)
+    def on_steamDataDelta(self, delta):
+        self._setApps(delta.snapshot)
+        self.lastRefresh = time()
+        self.lastError = None
+        self._logTotals('steam_delta', version=delta.version, changed=len(delta))
+        self.autostart()
+        self.statusChanged.emit()
+
+    @pyqtSlot(str)
+    def on_steamDataError(self, msg):
+        self.lastError = msg
+        self.logEvent('steam_error', message=repr(msg))
+        self.statusChanged.emit()
+
+    @pyqtSlot(int)
+    def on_parser_timerStart(self, interval):
+        self.logEvent('refresh_scheduled', seconds=interval // 1000)
+
+    @pyqtSlot(str)
+    def on_requestGuard_circuitStateChanged(self, state):
+        self.logEvent('circuit', state=state)
+
+    @pyqtSlot(str)
+    def on_statusUpdate(self, msg):
+        self.logEvent('status', message=repr(msg))
+
+    @pyqtSlot(bool)
+    def on_steamWatcher_steamRunningChanged(self, running):
+        self.logEvent('steam_client', running=running)
+        if running:
+            self.autostart()
+        else:
+            # autostart picks up again when the client is back
+            self.stopIdle()
+
+    @pyqtSlot(App)
+    def on_idleAppDone(self, app):
+        self.logEvent('idle_done', appid=app.appid)
+        nextApp = self.nextAppWithDrops(after=app)
+        if nextApp is None or nextApp.appid == app.appid:
+            self.stopIdle()
+        else:
+            self.startIdle(nextApp)
+
+    @pyqtSlot(App)
+    def on_multiIdleAppDone(self, app):
+        self.logEvent('multiidle_app_done', appid=app.appid, playtime=app.playTime)
+        self.activeApps = [a for a in self.activeApps if a.appid != app.appid]
+
+    @pyqtSlot()
+    def on_multiIdleAllDone(self):
+        self.logEvent('multiidle_done')
+        # Continue with normal idle as soon as fresh data has arrived
+        self._multiIdleDone = True
+        self.activeApps = []
+        self.refresh()
+
+    @pyqtSlot()
+    def on_idleFinished(self):
+        self.logEvent('idle_stopped')
+        self.activeApps = []
+        self.refresh()
+
+    @pyqtSlot(int, int, str, float)
+    def on_supervisor_childExited(self, appid, exitcode, reason, uptime):
+        self.logEvent('child_exited', appid=appid, exitcode=exitcode, uptime=int(uptime))
+
+    @pyqtSlot(int, str)
+    def on_supervisor_appFailing(self, appid, reason):
+        self.logEvent('child_failing', appid=appid, reason=repr(reason))
@@ -0,0 +1,54 @@
+''' Launch IdleChild processes from a pre-forked server
+
+    A plain IdleChild is forked from the GUI process, so every child carries
+    (and touches) a copy of Qt and everything else the GUI has imported. With
+    the forkserver start method children are forked from a small server
+    process instead, which has steam_idle.idle (and with it the steam_api
+    library) imported once already.
+
+    The forkserver start method is not available on Windows (nor Python 2).
+    The children still import the main module of the parent (like every
+    forkserver/spawn child does) and bench_launcher did not show a win over a
+    plain fork, so IdleChild stays the default and this is opt-in
+    (launcher/forkserver setting).
+'''
+import logging
+import multiprocessing
+from steam_idle.idle import IdleChild
+
+logger = logging.getLogger(__name__)
+# Modules imported by the fork server, inherited by all childs.
+# page_parser is needed to unpickle the App instance of a child.
+PRELOAD = ['steam_idle.idle', 'steam_idle.page_parser', __name__]
+_context = None
+
+def forkserverAvailable():
+    # get_all_start_methods is Python 3.4+
+    return 'forkserver' in getattr(multiprocessing, 'get_all_start_methods', lambda: ())()
+
+def forkserverContext():
+    global _context
+    if _context is None:
+        _context = multiprocessing.get_context('forkserver')
+        _context.set_forkserver_preload(PRELOAD)
+    return _context
+
+class ForkServerIdleChild(IdleChild):
+    ''' IdleChild forked from the fork server, same interface as IdleChild '''
+    @staticmethod
+    def _Popen(process_obj):
+        return forkserverContext().Process._Popen(process_obj)
+
+def idleChildClass(forkserver=False):
+    ''' Returns the IdleChild class to launch childs with, the fork server one
+        only if requested and available
+    '''
+    return ForkServerIdleChild if forkserver and forkserverAvailable() else IdleChild
+
+def warmUp():
+    ''' Start the fork server (if not running already) so the first child does not wait for it '''
+    if forkserverAvailable():
+        from multiprocessing import forkserver
+        forkserverContext()
+        forkserver.ensure_running()
+        logger.debug('fork server running')
@@ -0,0 +1,188 @@
+import logging
+from time import time
+try:
+    from multiprocessing.connection import wait
+except ImportError: # Python 2, no process sentinels
+    wait = None
+from steam_idle.idle import strfsec, IdleChild
+from PyQt4.QtCore import pyqtSlot, pyqtSignal, QObject, QTimer
+from steam_idle_qt import ProcessMemory
+from steam_idle_qt.Metrics import metrics
+
+class IdleSupervisor(QObject):
+    ''' Starts and watches IdleChild processes, one per appid
+
+        All process sentinels are polled with a single non-blocking wait()
+        every pollInterval msec (is_alive() of every child on Python 2). Childs that exited unexpectedly are restarted
+        with exponential backoff. If a child keeps crashing (maxRestarts times
+        without running stableUptime seconds in between) the app is given up
+        and appFailing is emitted.
+
+        Memory (RSS/PSS) of the childs is sampled every memorySampleInterval
+        seconds from /proc.
+    '''
+    childStarted = pyqtSignal(int) # appid
+    childExited = pyqtSignal(int, int, str, float) # appid, exitcode, reason, uptime in seconds
+    childStopped = pyqtSignal(int) # appid, terminated by stop()
+    childRestarted = pyqtSignal(int, int) # appid, number of restarts
+    appFailing = pyqtSignal(int, str) # appid, reason of the last exit
+    memorySampled = pyqtSignal(int, int) # total KiB of all childs, number of childs
+    childClass = IdleChild # Or IdleLauncher.ForkServerIdleChild
+    pollInterval = 2000 # msec
+    restartDelay = 5 # Seconds before the first restart, doubled on every further one
+    maxRestartDelay = 5 * 60
+    maxRestarts = 5
+    stableUptime = 10 * 60 # Seconds, a child running this long resets the restart count
+    memorySampleInterval = 30 # Seconds
+
+    def __init__(self, parent=None):
+        super(IdleSupervisor, self).__init__(parent)
+        self.logger = logging.getLogger('.'.join((__name__, self.__class__.__name__)))
+        self._childs = {} # {<appid>: (<IdleChild>, <start timestamp>), ...}
+        self._restarts = {} # {<appid>: <number of restarts>, ...}
+        self._pendingRestarts = {} # {<appid>: (<app>, <due timestamp>), ...}
+        self._memory = {} # {<appid>: (<rss KiB>, <pss KiB>), ...} of the last sample
+        self._lastMemorySample = 0
+        self._timer = QTimer(self)
+        self._timer.timeout.connect(self.poll)
+
+    def start(self, app):
+        ''' Start a child for app (unless one is running already) '''
+        if app.appid in self._childs:
+            return self._childs[app.appid][0]
+        self._pendingRestarts.pop(app.appid, None)
+        with metrics().span('child_spawn'):
+            p = self.childClass(app)
+            p.start()
+        self._childs[app.appid] = (p, time())
+        self.logger.debug('started %s', p)
+        self.childStarted.emit(app.appid)
+        if not self._timer.isActive():
+            self._timer.start(self.pollInterval)
+        return p
+
+    def stop(self, appid):
+        ''' Terminate the child of appid, it won't be restarted '''
+        self._pendingRestarts.pop(appid, None)
+        self._restarts.pop(appid, None)
+        p, _ = self._childs.pop(appid, (None, None))
+        if p is not None:
+            self.logger.debug('terminating %s', p)
+            with metrics().span('child_terminate'):
+                p.terminate()
+                p.join()
+            self.childStopped.emit(appid)
+        self._memory.pop(appid, None)
+        self._stopTimerIfIdle()
+        return p
+
+    def stopAll(self):
+        for appid in list(self._childs):
+            self.stop(appid)
+        self._pendingRestarts.clear()
+        self._stopTimerIfIdle()
+
+    def isRunning(self, appid):
+        ''' True if appid has a child or one is about to be restarted '''
+        return appid in self._childs or appid in self._pendingRestarts
+
+    def child(self, appid):
+        return self._childs.get(appid, (None, None))[0]
+
+    def uptime(self, appid):
+        ''' Seconds the child of appid is running, None if there is none '''
+        started = self._childs.get(appid, (None, None))[1]
+        return time() - started if started is not None else None
+
+    def restarts(self, appid):
+        return self._restarts.get(appid, 0)
+
+    def sampleMemory(self):
+        ''' Read the memory usage of all childs, returns the total in KiB '''
+        self._memory = dict(
+            (appid, ProcessMemory.processMemory(p.pid)) for appid, (p, _) in self._childs.items()
+        )
+        self._lastMemorySample = time()
+        total = self.totalMemory()
+        self.memorySampled.emit(total, len(self._memory))
+        return total
+
+    def memoryUsage(self):
+        ''' Returns {<appid>: (<rss KiB>, <pss KiB>), ...} of the last sample '''
+        return dict(self._memory)
+
+    def sampledChilds(self):
+        ''' Number of childs in the last sample '''
+        return len(self._memory)
+
+    def totalMemory(self):
+        ''' KiB all childs cost (as of the last sample) '''
+        return sum(ProcessMemory.cost(*m) or 0 for m in self._memory.values())
+
+    def childMemoryEstimate(self):
+        ''' KiB a further child is expected to cost, the mean of the running ones '''
+        costs = [c for c in (ProcessMemory.cost(*m) for m in self._memory.values()) if c]
+        if not costs:
+            return ProcessMemory.DEFAULT_CHILD_KIB
+        return sum(costs) // len(costs)
+
+    def _stopTimerIfIdle(self):
+        if not self._childs and not self._pendingRestarts:
+            self._timer.stop()
+
+    @staticmethod
+    def exitReason(exitcode):
+        if exitcode == 0:
+            # IdleChild returns if the Steam API could not be initialized
+            return 'exited'
+        elif exitcode < 0:
+            return 'killed by signal {}'.format(-exitcode)
+        return 'exit code {}'.format(exitcode)
+
+    @pyqtSlot()
+    def poll(self):
+        ''' Reap exited childs and run due restarts '''
+        for appid in self._exitedChilds():
+            self._onExit(appid)
+
+        now = time()
+        for appid, (app, due) in list(self._pendingRestarts.items()):
+            if due <= now:
+                del self._pendingRestarts[appid]
+                self.logger.info('restarting %s (restart %d)', app, self._restarts.get(appid, 0))
+                self.start(app)
+                self.childRestarted.emit(appid, self._restarts.get(appid, 0))
+
+        if self._childs and now - self._lastMemorySample >= self.memorySampleInterval:
+            self.sampleMemory()
+        self._stopTimerIfIdle()
+
+    def _exitedChilds(self):
+        if not self._childs:
+            return []
+        if wait is None:
+            # is_alive() reaps the child if it has exited
+            return [appid for appid, (p, _) in self._childs.items() if not p.is_alive()]
+        sentinels = dict((p.sentinel, appid) for appid, (p, _) in self._childs.items())
+        return [sentinels[sentinel] for sentinel in wait(list(sentinels), timeout=0)]
+
+    def _onExit(self, appid):
+        p, started = self._childs.pop(appid)
+        p.join()
+        self._memory.pop(appid, None)
+        uptime = time() - started
+        reason = self.exitReason(p.exitcode)
+        self.logger.warning('%s %s after %s', p, reason, strfsec(int(uptime)))
+        self.childExited.emit(appid, p.exitcode, reason, uptime)
+        metrics().count('child_crashes')
+
+        restarts = 0 if uptime >= self.stableUptime else self._restarts.get(appid, 0)
+        if restarts >= self.maxRestarts:
+            self.logger.error('%s keeps crashing, giving up', p.app)
+            self._restarts.pop(appid, None)
+            self.appFailing.emit(appid, reason)
+            return
+        self._restarts[appid] = restarts + 1
+        delay = min(self.restartDelay * 2 ** restarts, self.maxRestartDelay)
+        self._pendingRestarts[appid] = (p.app, time() + delay)
+        self.logger.debug('restarting %s in %s', p.app, strfsec(delay))
@@ -0,0 +1,178 @@
+''' Timing spans and counters of the hot paths, exported to a file
+
+    Instrumented code calls metrics().span(name) (a context manager) or
+    metrics().count(name). While metrics are disabled both return right away,
+    span() hands out a shared no-op context manager.
+
+    MetricsExporter writes a snapshot every interval seconds, either in the
+    Prometheus text format (for the textfile collector of the node exporter)
+    or as JSON. The file is replaced atomically, so a scraper never reads a
+    partial one.
+'''
+import os
+import json
+import logging
+from time import time
+from threading import Lock
+from PyQt4.QtCore import pyqtSlot, QObject, QTimer
+
+_replace = getattr(os, 'replace', os.rename) # os.rename does not overwrite on Windows
+
+class _NullSpan(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL_SPAN = _NullSpan()
+
+class _Span(object):
+    __slots__ = ('metrics', 'name', 'start')
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.name, time() - self.start)
+        return False
+
+class Metrics(object):
+    ''' Thread safe registry of spans ({<name>: [<count>, <seconds>, <max seconds>]})
+        and counters ({<name>: <value>})
+    '''
+    prefix = 'steam_idle'
+
+    def __init__(self):
+        self.enabled = False
+        self._lock = Lock()
+        self._spans = {}
+        self._counters = {}
+
+    def span(self, name):
+        ''' Context manager timing its block as name '''
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name)
+
+    def observe(self, name, seconds):
+        if not self.enabled:
+            return
+        with self._lock:
+            s = self._spans.get(name)
+            if s is None:
+                self._spans[name] = [1, seconds, seconds]
+            else:
+                s[0] += 1
+                s[1] += seconds
+                if seconds > s[2]:
+                    s[2] = seconds
+
+    def count(self, name, value=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def reset(self):
+        with self._lock:
+            self._spans.clear()
+            self._counters.clear()
+
+    def snapshot(self):
+        ''' Returns a JSON serializable copy of all values '''
+        with self._lock:
+            return {
+                'timestamp': time(),
+                'spans': dict(
+                    (name, {'count': c, 'seconds': s, 'max_seconds': m})
+                    for name, (c, s, m) in self._spans.items()
+                ),
+                'counters': dict(self._counters),
+            }
+
+    def prometheus(self):
+        ''' Returns all values in the Prometheus text exposition format '''
+        snapshot = self.snapshot()
+        lines = []
+        for name, s in sorted(snapshot['spans'].items()):
+            metric = '{}_{}_seconds'.format(self.prefix, name)
+            lines.append('# TYPE {} summary'.format(metric))
+            lines.append('{}_count {}'.format(metric, s['count']))
+            lines.append('{}_sum {!r}'.format(metric, s['seconds']))
+            lines.append('# TYPE {}_max gauge'.format(metric))
+            lines.append('{}_max {!r}'.format(metric, s['max_seconds']))
+        for name, value in sorted(snapshot['counters'].items()):
+            metric = '{}_{}_total'.format(self.prefix, name)
+            lines.append('# TYPE {} counter'.format(metric))
+            lines.append('{} {}'.format(metric, value))
+        lines.append('# TYPE {}_metrics_timestamp_seconds gauge'.format(self.prefix))
+        lines.append('{}_metrics_timestamp_seconds {!r}'.format(self.prefix, snapshot['timestamp']))
+        return '\n'.join(lines) + '\n'
+
+_metrics = Metrics()
+def metrics():
+    ''' Returns the Metrics instance shared by all threads '''
+    return _metrics
+
+class MetricsExporter(QObject):
+    ''' Writes the shared metrics to path every interval seconds
+
+        format is one of FORMATS, metrics are enabled by start() and
+        disabled by stop() (which writes a last snapshot).
+    '''
+    PROMETHEUS = 'prometheus'
+    JSON = 'json'
+    FORMATS = (PROMETHEUS, JSON)
+
+    def __init__(self, path, format=PROMETHEUS, interval=60, parent=None):
+        super(MetricsExporter, self).__init__(parent)
+        self.logger = logging.getLogger('.'.join((__name__, self.__class__.__name__)))
+        if format not in self.FORMATS:
+            raise ValueError('Unknown metrics format "%s"' % format)
+        self.path = path
+        self.format = format
+        self._timer = QTimer(self)
+        self._timer.setInterval(max(1, interval) * 1000)
+        self._timer.timeout.connect(self.write)
+
+    @classmethod
+    def fromSettings(cls, settings, data_path, parent=None):
+        ''' Exporter configured by the metrics/* settings, None if disabled '''
+        format = settings.value('metrics/format', 'none')
+        if format not in cls.FORMATS:
+            return None
+        path = settings.value('metrics/path', '') or os.path.join(
+            data_path, 'metrics.prom' if format == cls.PROMETHEUS else 'metrics.json'
+        )
+        return cls(path, format, settings.value('metrics/interval', 60, type=int), parent)
+
+    def start(self):
+        self.logger.info('Writing %s metrics to "%s" every %dsec',
+            self.format, self.path, self._timer.interval() // 1000)
+        metrics().enabled = True
+        self._timer.start()
+
+    def stop(self):
+        self._timer.stop()
+        self.write()
+        metrics().enabled = False
+
+    @pyqtSlot()
+    def write(self):
+        if self.format == self.PROMETHEUS:
+            data = metrics().prometheus()
+        else:
+            data = json.dumps(metrics().snapshot(), indent=2, sort_keys=True)
+        tmp = self.path + '.tmp'
+        try:
+            with open(tmp, 'w') as f:
+                f.write(data)
+            _replace(tmp, self.path)
+        except (IOError, OSError):
+            self.logger.exception('Unable to write metrics to "%s"', self.path)
@@ -0,0 +1,130 @@
+''' Idle several Steam accounts in one process
+
+    Every account gets an IdleDaemon (with its own parser and idle workers).
+    What can be shared is shared: the Steam client watcher, the RequestGuard
+    (rate limit and circuit breaker of all requests) and a RefreshSpacer that
+    keeps the refreshes of all accounts accountspacing seconds apart. The
+    first refreshes are staggered by the same spacing.
+
+    All idle childs talk to the one local Steam client, so only the account
+    it is logged in to (see Account) idles. The others are refreshed and
+    recorded only.
+
+    The state of all accounts is logged and written to accounts.json in the
+    data path every statusInterval seconds (and shortly after it changed).
+'''
+import os
+import json
+import logging
+from time import time
+from PyQt4.QtCore import pyqtSlot, pyqtSignal, QObject, QThread, QTimer
+from steam_idle_qt.IdleDaemon import IdleDaemon, Account, defaultSettings, dataPath
+from steam_idle_qt.RefreshScheduler import RefreshSpacer
+from steam_idle_qt.SteamWatcher import SteamWatcher
+from steam_idle_qt.Metrics import MetricsExporter
+
+_replace = getattr(os, 'replace', os.rename) # os.rename does not overwrite on Windows
+
+class NoAccountsError(Exception):
+    pass
+
+class MultiAccountEngine(QObject):
+    statusChanged = pyqtSignal(list) # [<IdleDaemon.status() dict>, ...]
+    statusInterval = 60 # Seconds between two status summaries
+    statusDelay = 2000 # msec, changes within this time are summed up by one status update
+
+    def __init__(self, accounts=None, mode=None, parent=None):
+        super(MultiAccountEngine, self).__init__(parent)
+        self.logger = logging.getLogger('.'.join((__name__, self.__class__.__name__)))
+        settings = defaultSettings()
+        self.accounts = accounts if accounts is not None else Account.allFromSettings(settings)
+        self.mode = mode
+        self.statusPath = os.path.join(dataPath(settings), 'accounts.json')
+        self.spacer = RefreshSpacer(settings.value('accountspacing', 30, type=int))
+        self.daemons = []
+        self.metricsExporter = None
+        self._watcherThread = None
+        self._statusTimer = QTimer(self)
+        self._statusTimer.timeout.connect(self.updateStatus)
+        self._statusDelayTimer = QTimer(self)
+        self._statusDelayTimer.setSingleShot(True)
+        self._statusDelayTimer.timeout.connect(self.updateStatus)
+
+    def start(self):
+        if not self.accounts:
+            raise NoAccountsError('No accounts configured')
+        settings = defaultSettings()
+        self.logger.info('Starting %d accounts, refreshes %ds apart',
+            len(self.accounts), self.spacer.spacing)
+        idling = [a.username for a in self.accounts if a.idle]
+        if idling:
+            self.logger.info('Idling account %s, monitoring the others', ', '.join(idling))
+        else:
+            self.logger.warning('No account matches the idleaccount setting, monitoring all')
+        self.metricsExporter = MetricsExporter.fromSettings(settings, dataPath(settings), parent=self)
+        if self.metricsExporter is not None:
+            self.metricsExporter.start()
+
+        self.steamWatcher = SteamWatcher()
+        self._watcherThread = QThread(self)
+        self.steamWatcher.moveToThread(self._watcherThread)
+        self._watcherThread.started.connect(self.steamWatcher.start)
+
+        for i, account in enumerate(self.accounts):
+            daemon = IdleDaemon(
+                mode=self.mode,
+                account=account,
+                steamWatcher=self.steamWatcher,
+                spacer=self.spacer,
+                parent=self,
+            )
+            daemon.statusChanged.connect(self.on_daemon_statusChanged)
+            daemon.start(refreshDelay=int(i * self.spacer.spacing * 1000))
+            self.daemons.append(daemon)
+
+        self._watcherThread.start()
+        self._statusTimer.start(self.statusInterval * 1000)
+
+    def stop(self):
+        ''' Stop all accounts (blocks until their idle childs are gone) '''
+        self._statusTimer.stop()
+        self._statusDelayTimer.stop()
+        for daemon in self.daemons:
+            daemon.stop()
+        if self._watcherThread is not None:
+            self._watcherThread.quit()
+            self._watcherThread.wait()
+        self.updateStatus()
+        if self.metricsExporter is not None:
+            self.metricsExporter.stop()
+
+    def status(self):
+        return [daemon.status() for daemon in self.daemons]
+
+    @pyqtSlot()
+    def on_daemon_statusChanged(self):
+        if not self._statusDelayTimer.isActive():
+            self._statusDelayTimer.start(self.statusDelay)
+
+    @pyqtSlot()
+    def updateStatus(self):
+        ''' Log a summary of all accounts and write it to statusPath '''
+        status = self.status()
+        self.logger.info('accounts=%d apps=%d drops=%d idling=%d errors=%d',
+            len(status),
+            sum(s['apps'] for s in status),
+            sum(s['drops'] for s in status),
+            sum(len(s['idling']) for s in status),
+            sum(1 for s in status if s['last_error']),
+        )
+        for s in status:
+            self.logger.info('account=%s mode=%s apps=%d drops=%d refund=%d idling=%d',
+                s['account'], s['mode'], s['apps'], s['drops'], s['refund'], len(s['idling']))
+        tmppath = self.statusPath + '.tmp'
+        try:
+            with open(tmppath, 'w') as f:
+                json.dump({'timestamp': time(), 'accounts': status}, f, indent=2)
+            _replace(tmppath, self.statusPath)
+        except (IOError, OSError):
+            self.logger.exception('Unable to write account status "%s"', self.statusPath)
+        self.statusChanged.emit(status)
@@ -0,0 +1,44 @@
+''' Cheap per process memory accounting from /proc (Linux only)
+
+    PSS (proportional set size) splits shared pages between the processes
+    sharing them, so the PSS of all idle childs adds up to what they really
+    cost. It is read from /proc/<pid>/smaps_rollup (Linux >= 4.14), older
+    kernels only provide the RSS via /proc/<pid>/statm.
+'''
+import os
+
+# Memory an idle child is expected to need until it has been measured (KiB)
+DEFAULT_CHILD_KIB = 8 * 1024
+_pageKiB = None
+
+def available():
+    return os.path.exists('/proc/self/statm')
+
+def processMemory(pid):
+    ''' Returns (rss, pss) of pid in KiB
+        pss is None if the kernel does not provide it, both are None if pid is gone
+        or /proc is not available.
+    '''
+    global _pageKiB
+    rss = pss = None
+    try:
+        with open('/proc/%d/smaps_rollup' % pid) as f:
+            for line in f:
+                if line.startswith('Rss:'):
+                    rss = int(line.split()[1])
+                elif line.startswith('Pss:'):
+                    pss = int(line.split()[1])
+                    break
+    except (IOError, OSError):
+        try:
+            with open('/proc/%d/statm' % pid) as f:
+                if _pageKiB is None:
+                    _pageKiB = os.sysconf('SC_PAGE_SIZE') // 1024
+                rss = int(f.read().split()[1]) * _pageKiB
+        except (IOError, OSError, ValueError):
+            pass
+    return rss, pss
+
+def cost(rss, pss):
+    ''' The memory a process costs, PSS if known (RSS counts shared pages for every process) '''
+    return pss if pss is not None else rss
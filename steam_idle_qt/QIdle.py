@@ -1,27 +1,44 @@
 import logging
 from datetime import datetime, timedelta
-from time import sleep
+from time import time
+from collections import deque
 from steam_idle.page_parser import App
-from steam_idle.idle import IdleChild, strfsec, calc_delay
-from PyQt4.QtCore import pyqtSlot, pyqtSignal, QObject
+from steam_idle.idle import strfsec, calc_delay
+from PyQt4.QtCore import pyqtSlot, pyqtSignal, QObject, QTimer
+from steam_idle_qt.SteamDataDelta import SteamDataDelta
+from steam_idle_qt.AppSnapshot import AppSnapshot
+from steam_idle_qt.IdleSupervisor import IdleSupervisor
+from steam_idle_qt import ProcessMemory
+from steam_idle_qt.SettingsStore import settingsStore
+from steam_idle_qt.IdleLauncher import idleChildClass
 
 class BaseIdle(QObject):
     finished = pyqtSignal()
     appDone = pyqtSignal(App)
     statusUpdate = pyqtSignal(str)
-    updateSteamParserTimer = pyqtSignal(int)
+    # Request a refresh of the steam data of appid in msec (appid, msec)
+    scheduleRefresh = pyqtSignal(int, int)
+    unscheduleRefresh = pyqtSignal(int)
 
     def __init__(self):
         super(BaseIdle, self).__init__()
         self.logger = logging.getLogger('.'.join((__name__, self.__class__.__name__)))
+        # Child of this object, so it moves to the worker thread with it
+        self.supervisor = IdleSupervisor(parent=self)
+        self.supervisor.childClass = idleChildClass(settingsStore().value('launcher/forkserver', False, type=bool))
+        self.supervisor.appFailing.connect(self.on_supervisor_appFailing)
 
 class Idle(BaseIdle):
-    idleChild = None
     app = None
+    predictor = None # DropPredictor used for the refresh delay, calc_delay is used without
+    _since = 0 # Timestamp of the last drop of app (or the start of idle)
 
     def _idle(self):
         if self.app.remainingDrops > 0:
-            delay = calc_delay(self.app.remainingDrops)
+            if self.predictor is not None:
+                delay = self.predictor.refreshDelay(self.app.appid, self.app.remainingDrops, self._since)
+            else:
+                delay = calc_delay(self.app.remainingDrops)
             until = datetime.now() + timedelta(seconds=delay)
 
             self.logger.info('_idle called: %s has %d remaining drops: Ideling for %s (\'till %s)',
@@ -30,22 +47,22 @@ class Idle(BaseIdle):
                     strfsec(delay),
                     until.strftime('%c')
             )
-            # Setup and start idleChild if not done already
-            if self.idleChild == None:
+            # Setup and start idleChild if not done already, the supervisor restarts crashed ones
+            if not self.supervisor.isRunning(self.app.appid):
                 self.logger.debug('setup a new child')
-                self.idleChild = IdleChild(self.app)
-                self.idleChild.start()
+                self.supervisor.start(self.app)
             else:
-                self.logger.debug('child is still running: %s', self.idleChild)
+                self.logger.debug('child is still running: %s', self.supervisor.child(self.app.appid))
             # idleChild is setup or still running
 
-            # Setup QStremParser timer with new delay*1000
-            self.updateSteamParserTimer.emit(delay*1000)
+            # Check this app again when the delay is over
+            self.scheduleRefresh.emit(self.app.appid, delay*1000)
             # Send status update
-            self.statusUpdate.emit('Ideling "{}" for {} (\'till {})'.format(
+            self.statusUpdate.emit('Ideling "{}" for {} (\'till {}){}'.format(
                 self.app.name,
                 strfsec(delay),
                 until.strftime('%c'),
+                self._predictionStatus(),
             ))
         else:
             self.logger.info('No drops left, stopping idle and emitting appDone signal')
@@ -53,17 +70,21 @@ class Idle(BaseIdle):
             # Emit appDone signal, main thead should send next app via doStartIdle or stop via doStopIdle
             self.appDone.emit(self.app)
 
+    def _predictionStatus(self):
+        ''' ", next drop expected at <time> (<low>-<high>)" if there is a prediction '''
+        prediction = self.predictor.predict(self.app.appid) if self.predictor is not None else None
+        if prediction is None:
+            return ''
+        expected, low, high = (datetime.fromtimestamp(self._since + s) for s in prediction)
+        return ', next drop expected at {} ({}-{})'.format(
+            expected.strftime('%X'), low.strftime('%X'), high.strftime('%X'))
+
     def _stopIdle(self):
         ''' Stops idleChild
             does not emit any signals or trigger further action
         '''
         self.logger.debug('_stopIdle called')
-        if self.idleChild != None:
-            self.logger.debug('Terminating child')
-            self.idleChild.terminate()
-            self.idleChild.join()
-            self.idleChild = None
-            self.logger.debug('Child terminated')
+        self.supervisor.stopAll()
 
     @pyqtSlot(App)
     def doStartIdle(self, app):
@@ -71,21 +92,45 @@ class Idle(BaseIdle):
         if self.app == None or app.appid != self.app.appid:
             # New/first app, stopIdle first
             self._stopIdle() # this won't do anything on first run
+            if self.app != None:
+                self.unscheduleRefresh.emit(self.app.appid)
             self.app = app
+            self._since = time()
         # Same app, just continue
         self._idle()
 
-    @pyqtSlot(dict)
+    @pyqtSlot(AppSnapshot)
     def on_steamDataReady(self, apps):
-        ''' Called whenever new steam data arrives '''
+        ''' Called whenever a full steam data snapshot arrives '''
         if self.app is None:
             # No idle child running, ignore signal
             return
         self.logger.debug('on_steamDataReady with %d apps as parameter', len(apps))
-        newapp = apps.get(self.app.appid)
+        self._updateApp(apps.get(self.app.appid))
+
+    @pyqtSlot(SteamDataDelta)
+    def on_steamDataDelta(self, delta):
+        ''' Called whenever a steam data refresh is done
+            Only the app currently ideling is looked up in the delta.
+        '''
+        if self.app is None:
+            # No idle child running, ignore signal
+            return
+        self.logger.debug('on_steamDataDelta: %s', delta)
+        appid = self.app.appid
+        if appid in delta.removed:
+            self._updateApp(None)
+        else:
+            # Unchanged apps are not part of the delta, continue with the current instance
+            self._updateApp(delta.changed.get(appid) or delta.added.get(appid) or self.app)
+
+    def _updateApp(self, newapp):
         if newapp:
             self.logger.debug('updated app: OLD: %s', self.app)
             self.logger.debug('updated app: NEW: %s', newapp)
+            if newapp.remainingDrops < self.app.remainingDrops:
+                # A card dropped, the next one is predicted from now on
+                self._since = time()
             self.app = newapp
             self._idle()
         else:
@@ -94,6 +139,16 @@ class Idle(BaseIdle):
             self._stopIdle()
             self.appDone.emit(self.app)
 
+    @pyqtSlot(int, str)
+    def on_supervisor_appFailing(self, appid, reason):
+        ''' The child keeps crashing, continue with the next app '''
+        if self.app is None or self.app.appid != appid:
+            return
+        self.statusUpdate.emit('Giving up on "{}" ({})'.format(self.app.name, reason))
+        self._stopIdle()
+        self.unscheduleRefresh.emit(appid)
+        self.appDone.emit(self.app)
+
     @pyqtSlot()
     def doStopIdle(self):
         ''' Called when idle is forcefully stopped (on stopAction, nextAction or app quit for example)
@@ -107,84 +162,291 @@ class Idle(BaseIdle):
 
 class MultiIdle(BaseIdle):
     allDone = pyqtSignal()
-    # Format {<appid>: (<IdleChild instance>, endtime), ...}
-    idleChilds = {}
+    overdueDelay = 5 * 60 # Seconds to wait before re-checking an app that should be done
+
+    # Childs are spawned one per timer event so the worker thread stays responsive.
+    # Steam client will crash if childs spawn too fast, the interval between spawns
+    # backs off if the client seems to struggle and recovers if it doesn't.
+    spawnInterval = 250 # msec, base interval between two spawns
+    maxSpawnInterval = 10 * 1000 # msec
+    slowSpawn = 0.5 # Seconds, a spawn taking longer than this counts as slow
+    _spawnDuration = 0.0
+    # Not more than maxChilds apps are ideling at once and childs are only launched
+    # as long as they fit into the memory budget. The others are queued and
+    # rotated in when running apps are done.
+    _maxChilds = 32
+    _memoryBudget = 0 # KiB, 0 for no budget
+
+    def __init__(self):
+        super(MultiIdle, self).__init__()
+        # Format {<appid>: (<App instance>, endtime), ...}, processes are owned by the supervisor
+        self.idleChilds = {}
+        self._spawnQueue = deque() # Apps waiting to be spawned
+        self._spawnTotal = 0
+        self._spawnTimer = None
+        self._currentInterval = self.spawnInterval
+        self._lastSpawned = None # (appid, IdleChild) of the last spawn, checked on the next one
+        self._noProcLogged = False # Warned that the memory budget can not be measured
+        self.supervisor.memorySampled.connect(self.on_supervisor_memorySampled)
+        # Queued to the worker thread
+        settingsStore().settingChanged.connect(self.on_settings_settingChanged)
+
+    @property
+    def settings(self):
+        return settingsStore()
+
+    @property
+    def maxChilds(self):
+        return self._maxChilds
+
+    @property
+    def memoryBudget(self):
+        return self._memoryBudget
+
+    @pyqtSlot(str, object)
+    def on_settings_settingChanged(self, key, value):
+        ''' Apply new limits to a running MultiIdle, running childs are never stopped '''
+        if key not in ('multiidlemaxchilds', 'multiidlememorybudget') or self._spawnTimer is None:
+            return
+        settings = self.settings
+        self._maxChilds = max(1, settings.value('multiidlemaxchilds', 32, type=int))
+        self._memoryBudget = settings.value('multiidlememorybudget', 0, type=int) * 1024
+        self._fillSlots()
 
     @pyqtSlot(list)
     def doStartIdle(self, apps):
         self.logger.info('MultiIdle.multiIdle(%s)', apps)
-        minimumDelay = None
-        for app in apps:
-            delay = int((2.0 - app.playTime) * 60 * 60)
-            if delay <= 0 or app.remainingDrops == 0:
-                # App has > 2h playtime
-                continue
-            # Human readable time
-            endtime = (datetime.now() + timedelta(seconds=delay))
-            # How long 'till the next app reaches 2h playtime?
-            if minimumDelay is None or delay < minimumDelay:
-                minimumDelay = delay
-
-            self.statusUpdate.emit('Launching Idle child {} of {}'.format(
-                len(self.idleChilds) + 1, len(apps)
-            ))
+        settings = self.settings
+        self._maxChilds = max(1, settings.value('multiidlemaxchilds', 32, type=int))
+        self._memoryBudget = settings.value('multiidlememorybudget', 0, type=int) * 1024
+        queued = dict((a.appid, a) for a in self._spawnQueue)
+        queued.update(
+            (app.appid, app) for app in apps
+            if app.playTime < 2.0 and app.remainingDrops > 0 and app.appid not in self.idleChilds
+        )
+        self._setSpawnQueue(queued.values())
+        self._spawnTotal = len(self.idleChilds) + len(self._spawnQueue)
+        self._currentInterval = self.spawnInterval
+        self._lastSpawned = None
+        if self._spawnTimer is None:
+            # Created here (not in __init__) to live in the worker thread
+            self._spawnTimer = QTimer(self)
+            self._spawnTimer.setSingleShot(True)
+            self._spawnTimer.timeout.connect(self._spawnNext)
+        self._spawnNext()
+
+    def _setSpawnQueue(self, apps):
+        ''' Queue apps, the ones closest to 2h playtime first '''
+        self._spawnQueue = deque(sorted(apps, key=lambda a: a.playTime, reverse=True))
 
-            p = IdleChild(app)
-            # Start the (idle) process
-            p.start()
-            self.idleChilds[app.appid] = (p, endtime)
-            self.logger.debug('doStartIdle: started %s', p)
-            if len(self.idleChilds) < len(apps):
-                # Steam client will crash if childs spawn too fast
-                sleep(0.25)
+    @pyqtSlot()
+    def _spawnNext(self):
+        ''' Spawn the next queued app and re-arm the timer for the one after '''
+        self._adaptSpawnInterval()
+        if not self._spawnQueue or not self._hasFreeSlot():
+            # All childs spawned or no free slot, _stopChild (or a memory sample) will continue
+            self._lastSpawned = None
+            self._emitStatus()
+            self._checkAllDone()
+            return
 
-        # All childs spawned
-        self.statusUpdate.emit('Multi-Idling {} apps'.format(len(self.idleChilds)))
+        app = self._spawnQueue.popleft()
+        self.statusUpdate.emit('Launching Idle child {} of {}'.format(
+            len(self.idleChilds) + 1, self._spawnTotal
+        ))
+        started = time()
+        self._startChild(app)
+        self._spawnDuration = time() - started
+        self._lastSpawned = (app.appid, self.supervisor.child(app.appid))
+        # Always check the last child once more, even if the queue is empty now
+        self._spawnTimer.start(self._currentInterval)
 
-        # Start SteamParser timer with the minimum delay
-        self.updateSteamParserTimer.emit(minimumDelay*1000)
+    def _adaptSpawnInterval(self):
+        ''' Back off if the last spawn was slow or its child died, speed up otherwise '''
+        if self._lastSpawned is None:
+            return
+        appid, p = self._lastSpawned
+        if not p.is_alive():
+            # Most likely the Steam API could not be initialized, the supervisor restarts it
+            self.logger.warning('%s died right after spawning, slowing down spawns', p)
+            self._currentInterval = min(self._currentInterval * 2, self.maxSpawnInterval)
+        elif self._spawnDuration > self.slowSpawn:
+            self.logger.debug('Spawn took %.2fs, slowing down spawns', self._spawnDuration)
+            self._currentInterval = min(int(self._currentInterval * 1.5), self.maxSpawnInterval)
+        else:
+            self._currentInterval = max(int(self._currentInterval * 0.75), self.spawnInterval)
+        self.logger.debug('spawn interval: %dms', self._currentInterval)
 
-    @pyqtSlot(dict)
+    def _startChild(self, app):
+        delay = int((2.0 - app.playTime) * 60 * 60)
+        # Human readable time
+        endtime = (datetime.now() + timedelta(seconds=delay))
+        # Start the (idle) process
+        p = self.supervisor.start(app)
+        self.idleChilds[app.appid] = (app, endtime)
+        # Check the app again when it should have reached 2h playtime
+        self.scheduleRefresh.emit(app.appid, delay*1000)
+        self.logger.debug('_startChild: started %s', p)
+
+    def _hasFreeSlot(self):
+        if len(self.idleChilds) >= self.maxChilds:
+            return False
+        if not self.memoryBudget or not self.idleChilds:
+            # Always allow one child, even if the budget is too small for it
+            return True
+        estimate = self.supervisor.childMemoryEstimate()
+        if not ProcessMemory.available():
+            if not self._noProcLogged:
+                self.logger.warning('No /proc to measure idle childs, assuming %d KiB per child '
+                    'for the memory budget', estimate)
+                self._noProcLogged = True
+            return (len(self.idleChilds) + 1) * estimate <= self.memoryBudget
+        # The last sample of the supervisor, childs started after it are estimated
+        unsampled = max(0, len(self.idleChilds) - self.supervisor.sampledChilds())
+        total = self.supervisor.totalMemory() + unsampled * estimate
+        if total + estimate > self.memoryBudget:
+            self.logger.debug('Memory budget reached: %d KiB used, %d KiB per child, %d KiB budget',
+                total, estimate, self.memoryBudget)
+            return False
+        return True
+
+    def _fillSlots(self):
+        ''' Rotate queued apps in if slots are free '''
+        if (self._spawnQueue and self._spawnTimer is not None and not self._spawnTimer.isActive()
+                and self._hasFreeSlot()):
+            self._spawnTimer.start(self._currentInterval)
+
+    @pyqtSlot(int, int)
+    def on_supervisor_memorySampled(self, total, childs):
+        # Childs may need less memory than estimated, make use of it
+        if self.memoryBudget:
+            self._fillSlots()
+
+    def _updateQueued(self, lookup):
+        ''' Update queued apps with fresh steam data, lookup(appid) returns the
+            new app instance, None if it has vanished or the queued one if unchanged.
+        '''
+        queued = []
+        for app in self._spawnQueue:
+            newapp = lookup(app.appid, app)
+            if newapp is None or newapp.playTime >= 2.0 or newapp.remainingDrops < 1:
+                self.logger.debug('%s dropped from queue', app)
+                self.appDone.emit(newapp or app)
+            else:
+                queued.append(newapp)
+        self._setSpawnQueue(queued)
+
+    def _emitStatus(self):
+        status = 'Multi-Idling {} apps'.format(len(self.idleChilds))
+        memory = self.supervisor.totalMemory()
+        if memory:
+            status += ', {:.0f} MiB'.format(memory / 1024.0)
+        if self._spawnQueue:
+            status += ' ({} queued)'.format(len(self._spawnQueue))
+        self.statusUpdate.emit(status)
+
+    def _cancelSpawns(self):
+        ''' Drop all apps that have not been spawned yet '''
+        if self._spawnTimer is not None:
+            self._spawnTimer.stop()
+        self._spawnQueue.clear()
+        self._lastSpawned = None
+
+    @pyqtSlot(AppSnapshot)
     def on_steamDataReady(self, apps):
-        ''' Called whenever new steam data arrives '''
-        if len(self.idleChilds) < 1:
-            # No idle child running, ignore signal
+        ''' Called whenever a full steam data snapshot arrives '''
+        if len(self.idleChilds) < 1 and not self._spawnQueue:
+            # No idle child running or queued, ignore signal
             return
         self.logger.debug('on_steamDataReady with %d apps as parameter', len(apps))
         for appid in list(self.idleChilds):
-            newapp = apps.get(appid)
-            if newapp:
-                self.logger.debug('updated app: OLD: %s', self.idleChilds[appid][0].app)
-                self.logger.debug('updated app: NEW: %s', newapp)
-                if newapp.playTime >= 2.0 or newapp.remainingDrops < 1:
-                    self.logger.debug('%s has reached 2h playtime or has no drops remaining', newapp)
-                    # Stop this child
-                    self._stopChild(appid)
-                    self.appDone.emit(newapp)
-            else:
-                self.logger.error('appid %d not found in badged', appid)
-                # TODO: Maybe better to raise error to main thread than just continue with next app?
+            self._updateApp(appid, apps.get(appid))
+        self._updateQueued(lambda appid, app: apps.get(appid))
+        self._rescheduleOverdue()
+        self._checkAllDone()
+
+    @pyqtSlot(SteamDataDelta)
+    def on_steamDataDelta(self, delta):
+        ''' Called whenever a steam data refresh is done
+            Only apps that changed or vanished and are ideling or queued are looked at.
+        '''
+        if len(self.idleChilds) < 1 and not self._spawnQueue:
+            # No idle child running or queued, ignore signal
+            return
+        self.logger.debug('on_steamDataDelta: %s', delta)
+        for appid in [a for a in delta.removed if a in self.idleChilds]:
+            self._updateApp(appid, None)
+        for appid in [a for a in delta.changed if a in self.idleChilds]:
+            self._updateApp(appid, delta.changed[appid])
+        self._updateQueued(
+            lambda appid, app: None if appid in delta.removed else delta.changed.get(appid, app)
+        )
+        self._rescheduleOverdue()
+        self._checkAllDone()
+
+    def _updateApp(self, appid, newapp):
+        if newapp:
+            self.logger.debug('updated app: OLD: %s', self.idleChilds[appid][0])
+            self.logger.debug('updated app: NEW: %s', newapp)
+            if newapp.playTime >= 2.0 or newapp.remainingDrops < 1:
+                self.logger.debug('%s has reached 2h playtime or has no drops remaining', newapp)
+                # Stop this child
                 self._stopChild(appid)
                 self.appDone.emit(newapp)
+            else:
+                # Playtime has changed, move the deadline accordingly
+                delay = int((2.0 - newapp.playTime) * 60 * 60)
+                self.idleChilds[appid] = (newapp, datetime.now() + timedelta(seconds=delay))
+                self.scheduleRefresh.emit(appid, delay*1000)
+        else:
+            self.logger.error('appid %d not found in badged', appid)
+            # TODO: Maybe better to raise error to main thread than just continue with next app?
+            oldapp = self.idleChilds[appid][0]
+            self._stopChild(appid)
+            self.appDone.emit(oldapp)
+
+    def _rescheduleOverdue(self):
+        ''' Steam updates the playtime with some lag, so apps that should have
+            reached 2h playtime already are checked again a bit later
+        '''
+        now = datetime.now()
+        for appid, (app, endtime) in list(self.idleChilds.items()):
+            if endtime <= now:
+                self.logger.debug('%s is overdue, checking again in %s', app, strfsec(self.overdueDelay))
+                self.idleChilds[appid] = (app, now + timedelta(seconds=self.overdueDelay))
+                self.scheduleRefresh.emit(appid, self.overdueDelay*1000)
 
-        if len(self.idleChilds) == 0:
+    def _checkAllDone(self):
+        if len(self.idleChilds) == 0 and not self._spawnQueue:
             self.logger.info('All childs completed, emitting allDone signal')
             self.allDone.emit()
 
     @pyqtSlot()
     def doStopIdle(self):
         self.logger.debug('doStopIdle called')
+        # Stop spawning first, queued apps are never started
+        self._cancelSpawns()
         for appid, _ in sorted(self.idleChilds.items(), key=lambda x: x[1][1], reverse=True):
             self._stopChild(appid)
         self.finished.emit()
 
+    @pyqtSlot(int, str)
+    def on_supervisor_appFailing(self, appid, reason):
+        ''' The child keeps crashing, give up on the app and free its slot '''
+        if appid not in self.idleChilds:
+            return
+        app = self.idleChilds[appid][0]
+        self.logger.error('Giving up on %s (%s)', app, reason)
+        self._stopChild(appid)
+        self.appDone.emit(app)
+        self._checkAllDone()
+
     def _stopChild(self, appid):
-        p = self.idleChilds.get(appid)[0]
-        self.logger.debug('MultiIdle._stopChild(%s)', p)
-        p.terminate()
-        self.logger.debug('MultiIdle._stopChild(%s) child terminated', p)
-        p.join()
-        self.logger.debug('MultiIdle._stopChild(%s) joined thead', p)
-        del self.idleChilds[appid]
-        self.logger.debug('MultiIdle._stopChild(%s) DONE', p)
-        self.statusUpdate.emit('Multi-Idling {} apps'.format(len(self.idleChilds)))
+        app, _ = self.idleChilds.pop(appid)
+        self.logger.debug('MultiIdle._stopChild(%s)', app)
+        self.supervisor.stop(appid)
+        self.unscheduleRefresh.emit(appid)
+        self.logger.debug('MultiIdle._stopChild(%s) DONE', app)
+        self._emitStatus()
+        # A slot is free now
+        self._fillSlots()
@@ -0,0 +1,131 @@
+import logging
+try:
+    from concurrent.futures import ThreadPoolExecutor
+except ImportError: # Python 2 without the futures backport
+    ThreadPoolExecutor = None
+from bs4 import BeautifulSoup
+from steam_idle_qt.Metrics import metrics
+from steam_idle.page_parser import SteamBadges, App, PageParserError, AppIdNotFoundError, re_Drops, re_PlayTime
+
+class QSteamBadges(SteamBadges):
+    ''' SteamBadges with some additions used by QSteamParser '''
+    concurrency = 1 # Number of badges pages fetched in parallel
+
+    def __init__(self, swb, data_path='', concurrency=4):
+        super(QSteamBadges, self).__init__(swb, data_path)
+        self.logger = logging.getLogger('.'.join((__name__, self.__class__.__name__)))
+        self.setConcurrency(concurrency)
+
+    def setConcurrency(self, concurrency):
+        ''' Set the maximum number of badges pages fetched in parallel
+            The connection pool of the browser session is resized to keep one
+            connection alive per worker.
+        '''
+        concurrency = max(1, concurrency)
+        if concurrency != self.concurrency:
+            self.logger.debug('Setting concurrency to %d', concurrency)
+            self.concurrency = concurrency
+            self.swb.setPoolSize(concurrency)
+
+    def _get(self, url, **kwargs):
+        ''' GET url, login again and retry once if redirected (like SteamBadges)
+            The browser is shared by the workers, it does one login at a time.
+
+            Raises PageParserError if the page could not be fetched
+        '''
+        for retry in (False, True):
+            seen = self.swb.logins
+            r = self.swb.get(url, **kwargs)
+            if r is None:
+                # SteamWebBrowser.get returns None if the login it tried failed
+                raise PageParserError('Unable to fetch "%s", login failed' % url)
+            if r.status_code != 302:
+                return r
+            if retry:
+                raise PageParserError('Unable to fetch "%s", redirected after login' % url)
+            self.logger.warning('Redirected fetching "%s", login again', url)
+            if not self.swb.relogin(seen):
+                raise PageParserError('Unable to fetch "%s", login failed' % url)
+
+    def _fetch_badges_page(self, page):
+        ''' Fetch and parse badges page number page
+            Returns a tuple of the number of badges pages (only parsed from page 1)
+            and a dict of all apps on this page: (<pages>, {<appid>: <App instance>, ...})
+        '''
+        r = self._get('https://steamcommunity.com/my/badges', params={'p': page})
+        with metrics().span('html_parse'):
+            soup = BeautifulSoup(r.content, 'html.parser')
+            badgePages = None
+            if page == 1:
+                try:
+                    badgePages = int(soup.find_all('a', {'class': 'pagelink'})[-1].get_text())
+                except (IndexError, ValueError):
+                    badgePages = 1
+
+            apps = {}
+            for b in soup.find_all('div', {'class': 'badge_title_stats'}):
+                try:
+                    app = self.parse_badge(b)
+                except PageParserError:
+                    # Could not correctly parse app info, continue with the next one
+                    continue
+                apps[app.appid] = app
+        return badgePages, apps
+
+    def parse_badges_pages(self, appid_filter=None):
+        ''' Iterates over all badges pages of a steam profile
+            The first page is fetched to get the number of pages, all other pages
+            are fetched by a pool of up to self.concurrency workers (one after
+            the other if concurrent.futures is not available).
+
+            @param appid_filter only look for appids listed here
+        '''
+        badgePages, parsed_apps = self._fetch_badges_page(1)
+        self.logger.debug('Fetching %d badges pages with %d workers', badgePages, self.concurrency)
+        if badgePages > 1 and ThreadPoolExecutor is None:
+            for page in range(2, badgePages + 1):
+                parsed_apps.update(self._fetch_badges_page(page)[1])
+        elif badgePages > 1:
+            with ThreadPoolExecutor(max_workers=min(self.concurrency, badgePages - 1)) as executor:
+                for _, apps in executor.map(self._fetch_badges_page, range(2, badgePages + 1)):
+                    parsed_apps.update(apps)
+
+        if appid_filter:
+            parsed_apps = dict((k, v) for k, v in parsed_apps.items() if k in appid_filter)
+
+        if not parsed_apps:
+            self.logger.error('Could not find any badges on badge pages')
+
+        return parsed_apps
+
+    def parse_gamecards_page(self, appid):
+        ''' Fetch and parse the gamecards page of a single app
+            Returns an App instance with remainingDrops and playTime set (but no name)
+
+            Raises AppIdNotFoundError if the page does not contain badge info for appid
+        '''
+        r = self._get('https://steamcommunity.com/my/gamecards/%d/' % appid)
+        with metrics().span('html_parse'):
+            soup = BeautifulSoup(r.content, 'html.parser')
+            stats = soup.find('div', {'class': 'badge_title_stats'})
+        if stats is None:
+            raise AppIdNotFoundError('Could not find badge info on gamecards page of %d' % appid)
+
+        app = App(self.image_path)
+        app.appid = appid
+        try:
+            # Parse remaining drops (will raise if there are none)
+            progress = stats.find('span', {'class': 'progress_info_bold'}).get_text()
+            app.remainingDrops = int(re_Drops.match(progress).groups()[0])
+        except:
+            app.remainingDrops = 0
+
+        try:
+            # Parse play time
+            app.playTime = float(re_PlayTime.search(stats.get_text()).groups()[0])
+        except:
+            app.playTime = 0.0
+
+        # No repr() of app here, it fails without a name
+        self.logger.debug('Parsed gamecards page of %d: %d drops, %.1f hrs', appid, app.remainingDrops, app.playTime)
+        return app
@@ -1,14 +1,41 @@
+import os
+import random
 import logging
-from PyQt4.QtCore import pyqtSlot, pyqtSignal, QObject, QTimer, QSettings
+from time import time
+from PyQt4.QtCore import pyqtSlot, pyqtSignal, QObject
 from steam_idle_qt.QSteamWebBrowser import QSteamWebBrowser
-from steam_idle.page_parser import SteamBadges
+from steam_idle_qt.QSteamBadges import QSteamBadges
+from steam_idle_qt.SnapshotCache import SnapshotCache
+from steam_idle_qt.RefreshScheduler import RefreshScheduler
+from steam_idle_qt.SteamDataDelta import SteamDataDelta
+from steam_idle_qt.AppSnapshot import AppSnapshot
+from steam_idle_qt.Metrics import metrics
+from steam_idle_qt.SettingsStore import settingsStore
+from steam_idle.page_parser import PageParserError
+
+def appChanged(record, new):
+    ''' True if new holds other data than record (AppSnapshot.record)
+        (App.__eq__ does not compare remainingDrops and playTime)
+    '''
+    return record != (new.name, new.remainingDrops, new.playTime)
 
 class QSteamParser(QObject):
-    steamDataReady = pyqtSignal(dict)
+    # Full snapshot, only emitted on first load and on resync
+    steamDataReady = pyqtSignal(AppSnapshot)
+    # Changes since the last emitted snapshot, emitted on every other refresh
+    steamDataDelta = pyqtSignal(SteamDataDelta)
+    # Emitted with an error message if an update failed, it will be retried
+    steamDataError = pyqtSignal(str)
     timerStart = pyqtSignal(int)
     timerStop = pyqtSignal()
-    timerTimeout = pyqtSignal(int)
-    timer = None
+    scheduleChanged = pyqtSignal(list)
+    apps = None # Current AppSnapshot, replaced (never modified) by updates
+    version = 0 # Incremented with every change of the snapshot
+    lastFullUpdate = 0 # Timestamp of the last update of all apps
+    failedUpdates = 0 # Number of consecutive failed updates
+    FULL_UPDATE = 0 # Pseudo appid used to schedule a retry of a full update
+    browserClass = QSteamWebBrowser # Session used for all requests
+    spacer = None # RefreshSpacer shared with the parsers of other accounts
 
     def __init__(self, username, password, data_path):
         super(QSteamParser, self).__init__()
@@ -16,54 +43,191 @@ class QSteamParser(QObject):
 
         # Setup SteamWebBrowser etc.
         self.logger.debug('Init QSteamWebBrowser')
-        swb = QSteamWebBrowser(
+        swb = self.browserClass(
                 username=username,
                 password=password,
-                parent=self
+                parent=self,
+                appdata_path=data_path
         )
         self.logger.debug('Using data path: "%s"', data_path)
-        self.sbb = SteamBadges(swb, data_path)
+        self.sbb = QSteamBadges(swb, data_path, concurrency=self.badgeConcurrency)
+
+        # Start with the snapshot of the last run, the first update will send a delta against it
+        self.cache = SnapshotCache(os.path.join(data_path, 'snapshot.json'), self.sbb.image_path)
+        self.version, self.apps = self.cache.load()
+
+        # Child object, moved to the parser thread with this instance
+        self.scheduler = RefreshScheduler(maxInterval=self.maxRefreshTime, parent=self)
+        self.scheduler.refreshDue.connect(self.on_scheduler_refreshDue)
+        self.scheduler.timerStart.connect(self.timerStart)
+        self.scheduler.timerStop.connect(self.timerStop)
+        self.scheduler.scheduleChanged.connect(self.scheduleChanged)
+        # Queued to the parser thread
+        settingsStore().settingChanged.connect(self.on_settings_settingChanged)
 
     @property
     def settings(self):
-        return QSettings(QSettings.IniFormat, QSettings.UserScope, 'jayme-github', 'SteamIdle')
+        return settingsStore()
 
-    @pyqtSlot(int)
-    def startTimer(self, interval):
-        # Interval should never exceed maxrefreshtime
-        maxrefreshtime = self.settings.value('maxrefreshtime', 15, type=int)*60*1000
-        newInterval = maxrefreshtime if interval > maxrefreshtime else interval
-        self.logger.debug('Requested %dmsec timer, setting up timer for %dmsec',
-            interval,
-            newInterval,
-        )
-        self.stopTimer()
-        self.timer = QTimer()
-        self.timer.timeout.connect(self.on_timer_timeout)
-        self.timer.start(newInterval)
-        self.timerStart.emit(newInterval)
+    @property
+    def badgeConcurrency(self):
+        return self.settings.value('badgeconcurrency', 4, type=int)
 
-    @pyqtSlot()
-    def startDefaultTimer(self):
-        self.startTimer(self.settings.value('maxrefreshtime', 15, type=int)*60*1000)
+    @property
+    def maxRefreshTime(self):
+        return self.settings.value('maxrefreshtime', 15, type=int)*60
+
+    @pyqtSlot(str, object)
+    def on_settings_settingChanged(self, key, value):
+        if key == 'maxrefreshtime':
+            # Refreshes should never be more than maxrefreshtime apart
+            self.scheduler.setMaxInterval(self.maxRefreshTime)
+        elif key == 'badgeconcurrency':
+            self.sbb.setConcurrency(self.badgeConcurrency)
+
+    @pyqtSlot(int, int)
+    def scheduleRefresh(self, appid, interval):
+        ''' Refresh the data of appid in interval msec '''
+        self.logger.debug('Scheduling refresh of %d in %dmsec', appid, interval)
+        self.scheduler.schedule(appid, interval/1000.0)
+
+    @pyqtSlot(int)
+    def unscheduleRefresh(self, appid):
+        self.scheduler.unschedule(appid)
 
     @pyqtSlot()
     def stopTimer(self):
-        if self.timer:
-            self.logger.debug('Stopping timer')
-            self.timer.stop()
-            self.timer = None
-            self.timerStop.emit()
+        self.logger.debug('Clearing refresh schedule')
+        self.scheduler.clear()
+
+    @pyqtSlot(list)
+    def on_scheduler_refreshDue(self, appids):
+        ''' Refresh only the apps that are due if possible, all apps otherwise
+            (e.g. if the last full refresh is older than fullrefreshtime)
+        '''
+        if self.spacer is not None:
+            wait = self.spacer.acquire()
+            if wait > 0:
+                # Another account has refreshed just now, try again later
+                self.logger.debug('Delaying refresh of %s by %.1fsec', appids, wait)
+                for appid in appids or [self.FULL_UPDATE]:
+                    self.scheduler.schedule(appid, wait)
+                return
+        fullrefreshtime = self.settings.value('fullrefreshtime', 60, type=int)*60
+        if appids and self.apps and len(appids) <= self.sbb.concurrency and \
+                all(appid in self.apps for appid in appids) and \
+                time() - self.lastFullUpdate < fullrefreshtime:
+            self.updateSelectedApps(appids)
+        else:
+            self.updateApps()
+
+    def _runUpdate(self, update, appids):
+        ''' Call update(), on errors a retry of appids (or a full update) is
+            scheduled with exponential backoff.
+        '''
+        try:
+            update()
+        except Exception as e:
+            self.failedUpdates += 1
+            metrics().count('refreshes_failed')
+            delay = min(30 * 2 ** (self.failedUpdates - 1), self.maxRefreshTime)
+            delay = random.uniform(delay / 2.0, delay)
+            self.logger.exception('Update from steam failed (%d times in a row), retrying in %dsec',
+                self.failedUpdates,
+                delay,
+            )
+            for appid in appids or [self.FULL_UPDATE]:
+                self.scheduler.schedule(appid, delay)
+            self.steamDataError.emit(str(e))
+        else:
+            self.failedUpdates = 0
 
     @pyqtSlot()
-    def on_timer_timeout(self):
-        self.logger.debug(self.timer.interval())
-        self.timerTimeout.emit(self.timer.interval())
-        self.updateApps()
+    def requestUpdate(self):
+        ''' Update all apps, as soon as the spacer allows it '''
+        self.on_scheduler_refreshDue([])
 
     @pyqtSlot()
     def updateApps(self):
+        self._runUpdate(self._updateApps, [])
+
+    def _updateApps(self):
         self.logger.info('Updating apps from steam')
+        metrics().count('refreshes_full')
+        self.sbb.setConcurrency(self.badgeConcurrency)
         apps = self.sbb.get_apps()
+        self.lastFullUpdate = time()
         self.logger.debug('ParseApps: %d apps', len(apps))
-        self.steamDataReady.emit(apps)
+        self._publish(apps)
+
+    @pyqtSlot(list)
+    def updateSelectedApps(self, appids):
+        ''' Update some apps from their gamecards pages
+            Falls back to updating all apps if there is no snapshot or an appid could not be parsed
+        '''
+        self._runUpdate(lambda: self._updateSelectedApps(appids), appids)
+
+    def _updateSelectedApps(self, appids):
+        if not self.apps or any(appid not in self.apps for appid in appids):
+            self._updateApps()
+            return
+        self.logger.info('Updating apps %s from steam', appids)
+        metrics().count('refreshes_selected')
+        apps = {}
+        for appid in appids:
+            try:
+                app = self.sbb.parse_gamecards_page(appid)
+            except PageParserError:
+                self.logger.exception('Unable to parse gamecards page, updating all apps')
+                self._updateApps()
+                return
+            # The gamecards page does not contain the app name
+            app.name = self.apps.name(appid)
+            apps[appid] = app
+        self._publish(apps, partial=True)
+
+    @pyqtSlot()
+    def resync(self):
+        ''' Drop the current snapshot and send a full one with the next update '''
+        self.logger.debug('resync requested')
+        self.apps = None
+        self.updateApps()
+
+    def _publish(self, apps, partial=False):
+        ''' Make apps the current snapshot
+            emits steamDataReady if there was no snapshot before, steamDataDelta otherwise
+
+            @param partial apps holds only some apps, all others are unchanged
+        '''
+        if self.apps is None:
+            self.version += 1
+            self.apps = AppSnapshot.fromApps(self.version, apps, self.sbb.image_path)
+            self.logger.debug('Sending full snapshot version %d', self.version)
+            # All receivers share the (immutable) snapshot
+            self.steamDataReady.emit(self.apps)
+            self.cache.save(self.apps)
+            return
+
+        added = {}
+        changed = {}
+        for appid, app in apps.items():
+            record = self.apps.record(appid)
+            if record is None:
+                added[appid] = app
+            elif appChanged(record, app):
+                changed[appid] = app
+        removed = [] if partial else [appid for appid in self.apps if appid not in apps]
+
+        baseVersion = self.version
+        if added or removed or changed:
+            self.version += 1
+            if partial:
+                self.apps = self.apps.replace(self.version, apps)
+            else:
+                self.apps = AppSnapshot.fromApps(self.version, apps, self.sbb.image_path)
+        delta = SteamDataDelta(baseVersion, self.version, added, removed, changed, self.apps)
+        self.logger.debug('Sending %s', delta)
+        # An empty delta is send as well, receivers use it as "refresh done" notification
+        self.steamDataDelta.emit(delta)
+        if len(delta) > 0:
+            self.cache.save(self.apps)
@@ -1,30 +1,96 @@
 import os
 import stat
+from threading import Lock, RLock, local
 from steamweb import SteamWebBrowser
 
-from PyQt4.QtCore import QObject, QSettings, QDir
-from PyQt4.QtGui import QInputDialog, QLineEdit
-from .ui.captchadialog import CaptchaDialog
+from PyQt4.QtCore import QObject, QDir
+from .RequestGuard import GuardedHTTPAdapter, requestGuard
+from .SettingsStore import settingsStore
 
 class QSteamWebBrowser(SteamWebBrowser, QObject):
     name = 'SteamIdle'
-    def __init__(self, username, password, parent=None):
+    # Transport adapter mounted for all requests, see setPoolSize
+    adapterClass = GuardedHTTPAdapter
+    def __init__(self, username, password, parent=None, appdata_path=None):
         self.parent = parent
         QObject.__init__(self, self.parent)
         # Set appdata path, this will end up in something like ~/.config/jayme-github/SteamIdle/
-        self._appdata_path = os.path.join(
+        # (one directory per account if there are multiple)
+        self._appdata_path = appdata_path or os.path.join(
             os.path.dirname(QDir.toNativeSeparators(self.settings.fileName())),
             'SteamIdle'
         )
-        for p in (os.path.dirname(QDir.toNativeSeparators(self.settings.fileName())), self._appdata_path):
-            if not os.path.isdir(p):
-                os.mkdir(p, stat.S_IRWXU)
+        if not os.path.isdir(self._appdata_path):
+            os.makedirs(self._appdata_path, stat.S_IRWXU)
         self.logger.debug('_appdata_path: "%s"', self._appdata_path)
+        # The session may be used by multiple threads (see QSteamBadges)
+        self._cookieLock = Lock()
+        # Logins are serialized, login() calls again for captcha and SteamGuard codes
+        self._loginLock = RLock()
+        self._logins = 0 # Number of successful logins
+        self._request = local() # Logins seen by the request of a thread, see login
         SteamWebBrowser.__init__(self, username=username, password=password)
+        # Replace the default adapters, all requests go through the shared RequestGuard
+        self.setPoolSize(10)
 
     @property
     def settings(self):
-        return QSettings(QSettings.IniFormat, QSettings.UserScope, 'jayme-github', 'SteamIdle')
+        return settingsStore()
+
+    def setPoolSize(self, size):
+        ''' Mount new HTTP adapters that keep up to size connections per host alive
+            Use this if the session is shared by size threads.
+        '''
+        self.logger.debug('setPoolSize(%d)', size)
+        for prefix in ('http://', 'https://'):
+            # Retries are done by the RequestGuard
+            self.session.mount(prefix, self.adapterClass(
+                requestGuard(),
+                pool_connections=size,
+                pool_maxsize=max(size, 10),
+                max_retries=0,
+            ))
+
+    @property
+    def logins(self):
+        ''' Number of successful logins, pass it to relogin '''
+        return self._logins
+
+    def login(self, *args, **kwargs):
+        ''' Login, one thread at a time
+            If the session expired while multiple threads used it, only the first
+            one logs in (and asks for captcha or SteamGuard codes). The others
+            skip the login done since their request was started and retry.
+        '''
+        with self._loginLock:
+            seen = getattr(self._request, 'logins', None)
+            if seen is not None and seen != self._logins and not (args or kwargs):
+                self.logger.debug('Logged in by another thread meanwhile')
+                return self.steamid
+            steamid = SteamWebBrowser.login(self, *args, **kwargs)
+            if steamid:
+                self._logins += 1
+            return steamid
+
+    def relogin(self, seen):
+        ''' Login again, unless someone did since seen (the value of logins) '''
+        self._request.logins = seen
+        try:
+            return self.login()
+        finally:
+            self._request.logins = None
+
+    def get(self, url, **kwargs):
+        # SteamWebBrowser.get logs in again if the session expired
+        self._request.logins = self._logins
+        try:
+            return SteamWebBrowser.get(self, url, **kwargs)
+        finally:
+            self._request.logins = None
+
+    def _save_cookies(self):
+        with self._cookieLock:
+            return SteamWebBrowser._save_cookies(self)
 
     def _handle_captcha(self, captcha_data, message=''):
         ''' Called when a captcha must be solved
@@ -38,6 +104,8 @@ class QSteamWebBrowser(SteamWebBrowser, QObject):
             A string containing the solved captcha code.
         '''
         self.logger.debug('_handle_captcha(%s)', message)
+        # QtGui is imported on demand only, the headless daemon never gets here
+        from .ui.captchadialog import CaptchaDialog
         captchaDialog = CaptchaDialog(image_data=captcha_data, parent=self.parent)
         captchaDialog.exec_()
         return captchaDialog.lineEditCaptchaText.text()
@@ -55,6 +123,7 @@ class QSteamWebBrowser(SteamWebBrowser, QObject):
             A string containing the code.
         '''
         self.logger.debug('_handle_emailauth(%s)', message)
+        from PyQt4.QtGui import QInputDialog, QLineEdit
         emailauth, ok = QInputDialog.getText(
             self.parent,
             self.trUtf8('SteamGuard'),
@@ -75,6 +144,7 @@ class QSteamWebBrowser(SteamWebBrowser, QObject):
             A string containing the code.
         '''
         self.logger.debug('_handle_twofactor(%s)', message)
+        from PyQt4.QtGui import QInputDialog, QLineEdit
         twofactorcode, ok = QInputDialog.getText(
             self.parent,
             self.trUtf8('SteamGuard'),
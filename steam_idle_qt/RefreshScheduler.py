@@ -0,0 +1,96 @@
+import random
+import logging
+from threading import Lock
+from time import time
+from PyQt4.QtCore import pyqtSlot, pyqtSignal, QObject, QTimer
+from steam_idle_qt.DeadlineQueue import DeadlineQueue
+
+class RefreshScheduler(QObject):
+    ''' Holds a deadline per app at which its steam data has to be refreshed
+        (e.g. when it reaches 2h playtime or the next card drop is expected).
+
+        A single shot timer is armed for the earliest deadline. When it fires,
+        all deadlines within mergeWindow seconds are due as well and handled by
+        one refresh (refreshDue). The timer never waits longer than maxInterval
+        seconds, refreshDue is emitted with an empty list in that case.
+    '''
+    refreshDue = pyqtSignal(list) # [<appid>, ...] whose deadlines have been reached
+    scheduleChanged = pyqtSignal(list) # [(<appid>, <deadline timestamp>), ...] sorted by deadline
+    timerStart = pyqtSignal(int) # msec until the next refresh
+    timerStop = pyqtSignal()
+
+    def __init__(self, mergeWindow=60, maxInterval=15*60, parent=None):
+        super(RefreshScheduler, self).__init__(parent)
+        self.logger = logging.getLogger('.'.join((__name__, self.__class__.__name__)))
+        self.mergeWindow = mergeWindow
+        self.maxInterval = maxInterval
+        self._deadlines = DeadlineQueue()
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self.on_timer_timeout)
+
+    def schedule(self, appid, delay):
+        ''' Set the deadline of appid to delay seconds from now (replacing an old one) '''
+        self._deadlines.schedule(appid, time() + delay)
+        self._rearm()
+
+    def unschedule(self, appid):
+        if self._deadlines.unschedule(appid):
+            self._rearm()
+
+    def setMaxInterval(self, maxInterval):
+        if maxInterval != self.maxInterval:
+            self.maxInterval = maxInterval
+            self._rearm()
+
+    def clear(self):
+        self._deadlines.clear()
+        if self._timer.isActive():
+            self._timer.stop()
+            self.timerStop.emit()
+        self.scheduleChanged.emit([])
+
+    def upcoming(self):
+        ''' Returns [(<appid>, <deadline timestamp>), ...] sorted by deadline '''
+        return self._deadlines.upcoming()
+
+    def _rearm(self):
+        delay = self._deadlines.delay(time(), self.maxInterval)
+        if delay is None:
+            if self._timer.isActive():
+                self._timer.stop()
+                self.timerStop.emit()
+        else:
+            self.logger.debug('Next refresh in %.1fsec', delay)
+            self._timer.start(int(delay * 1000))
+            self.timerStart.emit(int(delay * 1000))
+        self.scheduleChanged.emit(self.upcoming())
+
+    @pyqtSlot()
+    def on_timer_timeout(self):
+        # Everything up to mergeWindow from now is refreshed together
+        due = self._deadlines.popDue(time() + self.mergeWindow)
+        self.logger.debug('Refresh due for: %s', due)
+        self._rearm()
+        self.refreshDue.emit(due)
+
+class RefreshSpacer(object):
+    ''' Keeps refreshes of several parsers (e.g. one per account) at least
+        spacing seconds apart, so they don't all hit Steam at once. Thread safe.
+    '''
+    def __init__(self, spacing=30):
+        self.spacing = spacing
+        self._last = 0
+        self._lock = Lock()
+
+    def acquire(self):
+        ''' Returns 0 if a refresh may run now, the number of seconds to wait
+            otherwise (with some jitter, so waiting parsers don't collide again)
+        '''
+        with self._lock:
+            now = time()
+            wait = self._last + self.spacing - now
+            if wait <= 0:
+                self._last = now
+                return 0
+        return wait + random.uniform(0, self.spacing)
@@ -0,0 +1,112 @@
+import random
+import logging
+from time import sleep
+from threading import Lock
+from requests.adapters import HTTPAdapter
+from requests.exceptions import ConnectionError, Timeout
+from PyQt4.QtCore import pyqtSignal, QObject
+from steam_idle_qt.CircuitBreaker import CircuitOpenError, TokenBucket, CircuitBreaker
+from steam_idle_qt.Metrics import metrics
+from steam_idle_qt.SettingsStore import settingsStore
+
+class RequestGuard(QObject):
+    ''' Paces, retries and (if steam keeps failing) blocks requests
+
+        Requests are rate limited by a token bucket. Responses with status 429
+        or 5xx, timeouts and connection errors are retried with jittered
+        exponential backoff. A request that failed after all retries is counted
+        by a circuit breaker which rejects all requests while open.
+    '''
+    circuitStateChanged = pyqtSignal(str)
+    retryStatus = (429, 500, 502, 503, 504)
+
+    def __init__(self, rate=2, burst=8, maxRetries=4, backoffBase=1.0, backoffMax=60.0):
+        super(RequestGuard, self).__init__()
+        self.logger = logging.getLogger('.'.join((__name__, self.__class__.__name__)))
+        self.bucket = TokenBucket(rate, burst)
+        self.breaker = CircuitBreaker(onStateChange=self._on_stateChange)
+        self.maxRetries = maxRetries
+        self.backoffBase = backoffBase
+        self.backoffMax = backoffMax
+
+    def _on_stateChange(self, state):
+        self.logger.warning('Circuit breaker is %s', state)
+        self.circuitStateChanged.emit(state)
+
+    def backoff(self, attempt, retryAfter=None):
+        ''' Seconds to wait before retry number attempt+1 (full jitter) '''
+        delay = random.uniform(0, min(self.backoffMax, self.backoffBase * 2 ** attempt))
+        if retryAfter:
+            delay = max(delay, min(self.backoffMax, retryAfter))
+        return delay
+
+    @classmethod
+    def fromSettings(cls, settings):
+        ''' RequestGuard with the rate limit of the requests/* settings '''
+        return cls(
+            rate=settings.value('requests/rate', 2, type=float),
+            burst=settings.value('requests/burst', 8, type=int),
+        )
+
+    def call(self, send):
+        ''' Call send() (which should return a response) applying rate limit,
+            retries and circuit breaker
+        '''
+        self.breaker.before()
+        try:
+            return self._retry(send)
+        finally:
+            # Frees the trial of a half-open breaker if send() raised anything else
+            self.breaker.cancel()
+
+    def _retry(self, send):
+        attempt = 0
+        while True:
+            self.bucket.acquire()
+            retryAfter = None
+            try:
+                with metrics().span('http_fetch'):
+                    r = send()
+            except (ConnectionError, Timeout) as e:
+                if attempt >= self.maxRetries:
+                    self.breaker.failure()
+                    raise
+                self.logger.warning('Request failed (%s), retrying', e)
+            else:
+                if r.status_code not in self.retryStatus:
+                    self.breaker.success()
+                    return r
+                if attempt >= self.maxRetries:
+                    self.breaker.failure()
+                    # Let the caller handle the error response
+                    return r
+                self.logger.warning('Got status %d for "%s", retrying', r.status_code, r.url)
+                try:
+                    retryAfter = float(r.headers.get('Retry-After', 0))
+                except ValueError:
+                    pass
+                r.close()
+            delay = self.backoff(attempt, retryAfter)
+            self.logger.debug('Retry %d in %.1fsec', attempt + 1, delay)
+            metrics().count('http_retries')
+            sleep(delay)
+            attempt += 1
+
+class GuardedHTTPAdapter(HTTPAdapter):
+    ''' HTTPAdapter sending every request through a RequestGuard '''
+    def __init__(self, guard, **kwargs):
+        self.guard = guard
+        super(GuardedHTTPAdapter, self).__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        return self.guard.call(lambda: super(GuardedHTTPAdapter, self).send(request, **kwargs))
+
+_requestGuard = None
+_requestGuardLock = Lock()
+def requestGuard():
+    ''' Returns the RequestGuard shared by all browser sessions '''
+    global _requestGuard
+    with _requestGuardLock:
+        if _requestGuard is None:
+            _requestGuard = RequestGuard.fromSettings(settingsStore())
+        return _requestGuard
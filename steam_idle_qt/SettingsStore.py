@@ -0,0 +1,156 @@
+''' Settings shared by all threads, read from the INI file once
+
+    A QSettings object reads (and with it parses) the INI file when it is
+    created. settingsStore() returns a single SettingsStore instead, which
+    keeps all values in memory and writes changes through to the file.
+    It provides the part of the QSettings interface used in here, so it can
+    be used in place of a QSettings object.
+
+    settingChanged is emitted (from the thread calling setValue) for every
+    value that has actually changed. Workers in other threads get it queued.
+
+    Every setValue writes the file, unless it is called within batch(): then
+    the file is written once at the end of the batch. Changes of the file
+    by other processes are read by reload(), which is called whenever the
+    file changes (as long as it existed when the store was created). Changes
+    written by the store itself are recognized by the file's inode, size and
+    mtime, and not read again.
+'''
+import os
+import logging
+from threading import Lock
+from contextlib import contextmanager
+from PyQt4.QtCore import pyqtSlot, pyqtSignal, QObject, QSettings, QFileSystemWatcher
+
+def toType(value, type):
+    ''' Convert a value as read from the INI file to type (like QSettings.value does) '''
+    if type is None or value is None or isinstance(value, type):
+        return value
+    if type is bool:
+        return str(value).lower() in ('true', '1', 'yes')
+    return type(value)
+
+def changed(old, new):
+    ''' True if old (as read from the INI file, converted to the type of new) differs from new '''
+    if old is None:
+        return True
+    try:
+        return toType(old, new.__class__) != new
+    except (TypeError, ValueError):
+        return True
+
+class SettingsStore(QObject):
+    settingChanged = pyqtSignal(str, object) # key, new value
+
+    def __init__(self, parent=None):
+        super(SettingsStore, self).__init__(parent)
+        self.logger = logging.getLogger('.'.join((__name__, self.__class__.__name__)))
+        self._lock = Lock()
+        self._settings = QSettings(QSettings.IniFormat, QSettings.UserScope, 'jayme-github', 'SteamIdle')
+        self._values = {}
+        self._batch = 0 # Nesting level of batch()
+        self._written = None # _signature() of the file as last written or read by this store
+        self.reload()
+        self._watcher = QFileSystemWatcher(self)
+        self._watcher.fileChanged.connect(self.on_watcher_fileChanged)
+        if os.path.exists(self.fileName()):
+            self._watcher.addPath(self.fileName())
+
+    @pyqtSlot(str)
+    def on_watcher_fileChanged(self, path):
+        # QSettings replaces the file on write, which ends the watch
+        if os.path.exists(path) and path not in self._watcher.files():
+            self._watcher.addPath(path)
+        with self._lock:
+            own = self._written is not None and self._signature() == self._written
+        if own:
+            # Written by setValue or batch(), the values in memory are current
+            return
+        self.reload()
+
+    def _signature(self):
+        ''' Identifies the current version of the file, None if there is none '''
+        try:
+            st = os.stat(self.fileName())
+        except OSError:
+            return None
+        return st.st_ino, st.st_size, st.st_mtime
+
+    def _sync(self):
+        ''' Write pending changes (holding the lock) '''
+        self._settings.sync()
+        self._written = self._signature()
+
+    def reload(self):
+        ''' Read the INI file again, settingChanged is emitted for every changed value '''
+        with self._lock:
+            self._sync()
+            old = self._values
+            self._values = dict((key, self._settings.value(key)) for key in self._settings.allKeys())
+            # The file has strings only, compare them as the type of the value in memory
+            updated = [(key, value) for key, value in self._values.items()
+                       if key not in old or changed(value, old[key])]
+        self.logger.debug('Loaded %d settings from "%s"', len(self._values), self.fileName())
+        if old:
+            for key, value in updated:
+                self.logger.debug('%s changed in "%s"', key, self.fileName())
+                self.settingChanged.emit(key, value)
+
+    def fileName(self):
+        return self._settings.fileName()
+
+    def contains(self, key):
+        with self._lock:
+            return key in self._values
+
+    def value(self, key, defaultValue=None, type=None):
+        with self._lock:
+            value = self._values.get(key)
+        if value is None:
+            return defaultValue
+        try:
+            return toType(value, type)
+        except (TypeError, ValueError):
+            self.logger.warning('Invalid value "%s" for %s, using %s', value, key, defaultValue)
+            return defaultValue
+
+    def setValue(self, key, value):
+        with self._lock:
+            isChanged = changed(self._values.get(key), value)
+            self._values[key] = value
+            self._settings.setValue(key, value)
+            if not self._batch:
+                self._sync()
+        if isChanged:
+            self.logger.debug('%s changed', key)
+            self.settingChanged.emit(key, value)
+
+    @contextmanager
+    def batch(self):
+        ''' Write the file once for all setValue calls within this block '''
+        with self._lock:
+            self._batch += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._batch -= 1
+                if not self._batch:
+                    self._sync()
+
+    def childGroups(self, group):
+        ''' Names of the subgroups of group (e.g. "a" and "b" for a/b/x and a/a/x in group a) '''
+        prefix = group + '/'
+        with self._lock:
+            keys = [k[len(prefix):] for k in self._values if k.startswith(prefix)]
+        return sorted(set(k.split('/', 1)[0] for k in keys if '/' in k))
+
+_settingsStore = None
+_settingsStoreLock = Lock()
+def settingsStore():
+    ''' Returns the SettingsStore shared by all threads '''
+    global _settingsStore
+    with _settingsStoreLock:
+        if _settingsStore is None:
+            _settingsStore = SettingsStore()
+        return _settingsStore
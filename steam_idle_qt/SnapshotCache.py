@@ -0,0 +1,49 @@
+import os
+import json
+import logging
+from steam_idle_qt.AppSnapshot import AppSnapshot
+
+_replace = getattr(os, 'replace', os.rename) # os.rename does not overwrite on Windows
+
+class SnapshotCache(object):
+    ''' Stores the last app snapshot of QSteamParser on disk so the UI can be
+        populated at startup before any data has been fetched from steam.
+
+        The file contains compact JSON:
+        {"version": <int>, "apps": [[<appid>, <name>, <remainingDrops>, <playTime>], ...]}
+    '''
+    def __init__(self, path, image_path=''):
+        self.logger = logging.getLogger('.'.join((__name__, self.__class__.__name__)))
+        self.path = path
+        self.image_path = image_path
+
+    def load(self):
+        ''' Returns a tuple (<version>, <AppSnapshot>)
+            or (0, None) if there is no (usable) cache
+        '''
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+            apps = AppSnapshot(data['version'], data['apps'], self.image_path)
+        except (IOError, OSError):
+            self.logger.debug('No snapshot cache at "%s"', self.path)
+            return 0, None
+        except (ValueError, KeyError, TypeError):
+            self.logger.exception('Ignoring broken snapshot cache "%s"', self.path)
+            return 0, None
+        self.logger.debug('Loaded %d apps (version %d) from snapshot cache', len(apps), data['version'])
+        return data['version'], apps
+
+    def save(self, snapshot):
+        ''' Write the AppSnapshot to disk (replacing the old file atomically) '''
+        data = {
+            'version': snapshot.version,
+            'apps': [list(row) for row in snapshot.rows()],
+        }
+        tmppath = self.path + '.tmp'
+        try:
+            with open(tmppath, 'w') as f:
+                json.dump(data, f, separators=(',', ':'))
+            _replace(tmppath, self.path)
+        except (IOError, OSError):
+            self.logger.exception('Unable to write snapshot cache "%s"', self.path)
@@ -0,0 +1,27 @@
+class SteamDataDelta(object):
+    ''' Changes between two versions of the steam data snapshot
+
+        added:   {<appid>: <App instance>, ...} apps that are new in this version
+        removed: [<appid>, ...] apps that are no longer on the badges pages
+        changed: {<appid>: <App instance>, ...} apps with new name, drops or playtime
+        snapshot: AppSnapshot of version (shared, receivers keep a reference instead of a copy)
+    '''
+    def __init__(self, baseVersion, version, added=None, removed=None, changed=None, snapshot=None):
+        self.baseVersion = baseVersion
+        self.version = version
+        self.snapshot = snapshot
+        self.added = added or {}
+        self.removed = removed or []
+        self.changed = changed or {}
+
+    def __len__(self):
+        return len(self.added) + len(self.removed) + len(self.changed)
+
+    def __repr__(self):
+        return '<SteamDataDelta {}->{} (+{}, -{}, ~{})>'.format(
+            self.baseVersion,
+            self.version,
+            len(self.added),
+            len(self.removed),
+            len(self.changed),
+        )
@@ -0,0 +1,135 @@
+import os
+import logging
+from PyQt4.QtCore import pyqtSlot, pyqtSignal, QObject, QTimer, QFileSystemWatcher, QSocketNotifier
+
+class SteamWatcher(QObject):
+    ''' Keeps track of whether the Steam client is running
+
+        On Linux the Steam client writes its pid to ~/.steam/steam.pid. That file
+        (and its directory) is watched for changes, and the process itself via
+        a pidfd (Linux >= 5.3) so its exit is noticed the moment it happens.
+        Everywhere else (and whenever the pidfile does not name a running
+        Steam client) steam_api.IsSteamRunning() is polled every pollInterval
+        msec.
+
+        steamRunningChanged is emitted on every change of the state only, the
+        last known state is available via isRunning().
+    '''
+    steamRunningChanged = pyqtSignal(bool)
+    pollInterval = 15 * 1000 # msec
+    pidPollInterval = 2 * 1000 # msec, to check the pid if there is no pidfd support
+    steamDir = os.path.expanduser('~/.steam')
+
+    def __init__(self, parent=None):
+        super(SteamWatcher, self).__init__(parent)
+        self.logger = logging.getLogger('.'.join((__name__, self.__class__.__name__)))
+        self._running = None
+        self._pid = None
+        self._pidfd = None
+        self._notifier = None
+        self._watcher = None
+        self._timer = None
+
+    @property
+    def pidfile(self):
+        return os.path.join(self.steamDir, 'steam.pid')
+
+    def isRunning(self):
+        ''' Last known state (False until the first check) '''
+        return bool(self._running)
+
+    @pyqtSlot()
+    def start(self):
+        ''' Start watching (call from the thread this object lives in) '''
+        self._timer = QTimer(self)
+        self._timer.timeout.connect(self.check)
+        if os.path.isdir(self.steamDir):
+            self._watcher = QFileSystemWatcher(self)
+            self._watcher.directoryChanged.connect(self.check)
+            self._watcher.fileChanged.connect(self.check)
+            self._watcher.addPath(self.steamDir)
+        self.check()
+
+    @pyqtSlot()
+    @pyqtSlot(str)
+    def check(self, path=None):
+        ''' Update the state, emits steamRunningChanged if it has changed '''
+        if self._watcher is not None:
+            pid = self._readPid()
+            if pid is not None and self._isSteamProcess(pid):
+                self._watchPid(pid)
+                self._setRunning(True)
+                return
+            self._watchPid(None)
+        # No pid to watch (e.g. ~/.steam without steam.pid), ask the Steam API
+        from steam_idle import steam_api
+        running = bool(steam_api.IsSteamRunning())
+        if not self._timer.isActive():
+            self._timer.start(self.pollInterval)
+        self._setRunning(running)
+
+    def _setRunning(self, running):
+        if running != self._running:
+            self._running = running
+            self.logger.info('Steam client is %s', 'running' if running else 'not running')
+            self.steamRunningChanged.emit(running)
+
+    def _readPid(self):
+        if os.path.exists(self.pidfile) and self.pidfile not in self._watcher.files():
+            # Rewritten in place on every start of the client
+            self._watcher.addPath(self.pidfile)
+        try:
+            with open(self.pidfile) as f:
+                return int(f.read().strip())
+        except (IOError, OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _isSteamProcess(pid):
+        ''' True if pid exists and is a Steam client (the pidfile may be stale) '''
+        try:
+            with open('/proc/%d/comm' % pid) as f:
+                return f.read().strip().startswith('steam')
+        except (IOError, OSError):
+            return False
+
+    def _watchPid(self, pid):
+        ''' Get notified when pid exits '''
+        if pid == self._pid:
+            return
+        self._unwatchPid()
+        self._pid = pid
+        if pid is None:
+            return
+        pidfd_open = getattr(os, 'pidfd_open', None)
+        if pidfd_open is not None:
+            try:
+                self._pidfd = pidfd_open(pid)
+            except OSError:
+                self._pidfd = None
+        if self._pidfd is not None:
+            # A pidfd becomes readable when the process exits
+            self._notifier = QSocketNotifier(self._pidfd, QSocketNotifier.Read, self)
+            self._notifier.activated.connect(self.on_notifier_activated)
+        else:
+            self._timer.start(self.pidPollInterval)
+
+    def _unwatchPid(self):
+        if self._notifier is not None:
+            self._notifier.setEnabled(False)
+            self._notifier.deleteLater()
+            self._notifier = None
+        if self._pidfd is not None:
+            os.close(self._pidfd)
+            self._pidfd = None
+        if self._timer is not None and self._watcher is not None:
+            self._timer.stop()
+        self._pid = None
+
+    @pyqtSlot(int)
+    def on_notifier_activated(self, fd):
+        self.logger.debug('Steam client (pid %s) exited', self._pid)
+        self._unwatchPid()
+        self._setRunning(False)
+        # The client may have been restarted already
+        self.check()
@@ -31,26 +31,17 @@ class Ui_MainWindow(object):
         self.centralWidget.setObjectName(_fromUtf8("centralWidget"))
         self.verticalLayout = QtGui.QVBoxLayout(self.centralWidget)
         self.verticalLayout.setObjectName(_fromUtf8("verticalLayout"))
-        self.tableWidgetGames = QtGui.QTableWidget(self.centralWidget)
-        self.tableWidgetGames.setContextMenuPolicy(QtCore.Qt.CustomContextMenu)
-        self.tableWidgetGames.setEditTriggers(QtGui.QAbstractItemView.NoEditTriggers)
-        self.tableWidgetGames.setSelectionMode(QtGui.QAbstractItemView.SingleSelection)
-        self.tableWidgetGames.setSelectionBehavior(QtGui.QAbstractItemView.SelectRows)
-        self.tableWidgetGames.setObjectName(_fromUtf8("tableWidgetGames"))
-        self.tableWidgetGames.setColumnCount(4)
-        self.tableWidgetGames.setRowCount(0)
-        item = QtGui.QTableWidgetItem()
-        self.tableWidgetGames.setHorizontalHeaderItem(0, item)
-        item = QtGui.QTableWidgetItem()
-        self.tableWidgetGames.setHorizontalHeaderItem(1, item)
-        item = QtGui.QTableWidgetItem()
-        self.tableWidgetGames.setHorizontalHeaderItem(2, item)
-        item = QtGui.QTableWidgetItem()
-        self.tableWidgetGames.setHorizontalHeaderItem(3, item)
-        self.tableWidgetGames.horizontalHeader().setMinimumSectionSize(1)
-        self.tableWidgetGames.horizontalHeader().setSortIndicatorShown(True)
-        self.tableWidgetGames.verticalHeader().setVisible(False)
-        self.verticalLayout.addWidget(self.tableWidgetGames)
+        self.tableViewGames = QtGui.QTableView(self.centralWidget)
+        self.tableViewGames.setContextMenuPolicy(QtCore.Qt.CustomContextMenu)
+        self.tableViewGames.setEditTriggers(QtGui.QAbstractItemView.NoEditTriggers)
+        self.tableViewGames.setSelectionMode(QtGui.QAbstractItemView.SingleSelection)
+        self.tableViewGames.setSelectionBehavior(QtGui.QAbstractItemView.SelectRows)
+        self.tableViewGames.setSortingEnabled(True)
+        self.tableViewGames.setObjectName(_fromUtf8("tableViewGames"))
+        self.tableViewGames.horizontalHeader().setMinimumSectionSize(1)
+        self.tableViewGames.horizontalHeader().setSortIndicatorShown(True)
+        self.tableViewGames.verticalHeader().setVisible(False)
+        self.verticalLayout.addWidget(self.tableViewGames)
         self.frame = QtGui.QFrame(self.centralWidget)
         self.frame.setMaximumSize(QtCore.QSize(16777215, 150))
         self.frame.setFrameShape(QtGui.QFrame.StyledPanel)
@@ -156,13 +147,6 @@ class Ui_MainWindow(object):
 
     def retranslateUi(self, MainWindow):
         MainWindow.setWindowTitle(_translate("MainWindow", "Steam Idle", None))
-        self.tableWidgetGames.setSortingEnabled(True)
-        item = self.tableWidgetGames.horizontalHeaderItem(1)
-        item.setText(_translate("MainWindow", "Game", None))
-        item = self.tableWidgetGames.horizontalHeaderItem(2)
-        item.setText(_translate("MainWindow", "Remaining drops", None))
-        item = self.tableWidgetGames.horizontalHeaderItem(3)
-        item.setText(_translate("MainWindow", "Playtime", None))
         self.labelTotalGamesToIdle.setText(_translate("MainWindow", "games left to idle", None))
         self.labelTotalGamesInRefund.setText(_translate("MainWindow", "in refund period (<2h play time)", None))
         self.labelTotalRemainingDrops.setText(_translate("MainWindow", "remaining card drops", None))
@@ -91,6 +91,25 @@ class Ui_Dialog(object):
         self.spinBoxMaxRefreshTime.setProperty("value", 15)
         self.spinBoxMaxRefreshTime.setObjectName(_fromUtf8("spinBoxMaxRefreshTime"))
         self.formLayout_2.setWidget(2, QtGui.QFormLayout.FieldRole, self.spinBoxMaxRefreshTime)
+        self.labelMultiIdleMaxChilds = QtGui.QLabel(self.groupBoxSteamIdle)
+        self.labelMultiIdleMaxChilds.setObjectName(_fromUtf8("labelMultiIdleMaxChilds"))
+        self.formLayout_2.setWidget(3, QtGui.QFormLayout.LabelRole, self.labelMultiIdleMaxChilds)
+        self.spinBoxMultiIdleMaxChilds = QtGui.QSpinBox(self.groupBoxSteamIdle)
+        self.spinBoxMultiIdleMaxChilds.setMinimum(1)
+        self.spinBoxMultiIdleMaxChilds.setMaximum(999)
+        self.spinBoxMultiIdleMaxChilds.setProperty("value", 32)
+        self.spinBoxMultiIdleMaxChilds.setObjectName(_fromUtf8("spinBoxMultiIdleMaxChilds"))
+        self.formLayout_2.setWidget(3, QtGui.QFormLayout.FieldRole, self.spinBoxMultiIdleMaxChilds)
+        self.labelMultiIdleMemoryBudget = QtGui.QLabel(self.groupBoxSteamIdle)
+        self.labelMultiIdleMemoryBudget.setObjectName(_fromUtf8("labelMultiIdleMemoryBudget"))
+        self.formLayout_2.setWidget(4, QtGui.QFormLayout.LabelRole, self.labelMultiIdleMemoryBudget)
+        self.spinBoxMultiIdleMemoryBudget = QtGui.QSpinBox(self.groupBoxSteamIdle)
+        self.spinBoxMultiIdleMemoryBudget.setMinimum(0)
+        self.spinBoxMultiIdleMemoryBudget.setMaximum(1048576)
+        self.spinBoxMultiIdleMemoryBudget.setSingleStep(64)
+        self.spinBoxMultiIdleMemoryBudget.setProperty("value", 0)
+        self.spinBoxMultiIdleMemoryBudget.setObjectName(_fromUtf8("spinBoxMultiIdleMemoryBudget"))
+        self.formLayout_2.setWidget(4, QtGui.QFormLayout.FieldRole, self.spinBoxMultiIdleMemoryBudget)
         self.verticalLayout.addWidget(self.groupBoxSteamIdle)
         self.buttonBox = QtGui.QDialogButtonBox(Dialog)
         self.buttonBox.setOrientation(QtCore.Qt.Horizontal)
@@ -128,4 +147,12 @@ class Ui_Dialog(object):
         self.spinBoxMultiIdleThreshold.setToolTip(_translate("Dialog", "Multi-Idle will not be startet if there are not at least %d games within the refund period.", None))
         self.labelMaxRefreshTime.setText(_translate("Dialog", "Update Steam data at least every:", None))
         self.spinBoxMaxRefreshTime.setSuffix(_translate("Dialog", "min", None))
+        self.labelMultiIdleMaxChilds.setToolTip(_translate("Dialog", "Maximum number of games Multi-Idle runs at once. Further games are started when others are done.", None))
+        self.labelMultiIdleMaxChilds.setText(_translate("Dialog", "Multi-Idle games at once:", None))
+        self.spinBoxMultiIdleMaxChilds.setToolTip(_translate("Dialog", "Maximum number of games Multi-Idle runs at once. Further games are started when others are done.", None))
+        self.labelMultiIdleMemoryBudget.setToolTip(_translate("Dialog", "Multi-Idle does not start further games if their idle processes would use more memory.", None))
+        self.labelMultiIdleMemoryBudget.setText(_translate("Dialog", "Multi-Idle memory budget:", None))
+        self.spinBoxMultiIdleMemoryBudget.setToolTip(_translate("Dialog", "Multi-Idle does not start further games if their idle processes would use more memory.", None))
+        self.spinBoxMultiIdleMemoryBudget.setSpecialValueText(_translate("Dialog", "Unlimited", None))
+        self.spinBoxMultiIdleMemoryBudget.setSuffix(_translate("Dialog", " MiB", None))
 
@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+
+"""
+Module implementing GamesTableModel and GamesFilterProxyModel.
+"""
+import logging
+from collections import OrderedDict
+from PyQt4.QtCore import pyqtSlot, Qt, QAbstractTableModel, QModelIndex, QCoreApplication
+from PyQt4.QtGui import QIcon, QPixmap, QImage, QSortFilterProxyModel
+
+from .Ui_mainwindow import _fromUtf8
+from steam_idle_qt.AppSnapshot import AppSnapshot
+
+class GamesTableModel(QAbstractTableModel):
+    ''' Table model of apps
+
+        Rows are kept in insertion order, appid to row lookups are O(1).
+        The model holds only the appid of each row, the data is read from the
+        current AppSnapshot. App instances are created for AppRole only.
+        Game icons are loaded via imageLoader when a row is displayed first,
+        the QIcons of the maxIcons most recently displayed rows are kept.
+    '''
+    COLUMN_STATE, COLUMN_GAME, COLUMN_DROPS, COLUMN_PLAYTIME = range(4)
+    COLUMNS = ('', 'Game', 'Remaining drops', 'Playtime')
+    AppRole = Qt.UserRole # App instance of a row (all columns)
+    maxIcons = 512
+
+    def __init__(self, imageLoader, parent=None):
+        super(GamesTableModel, self).__init__(parent)
+        self.logger = logging.getLogger('.'.join((__name__, self.__class__.__name__)))
+        self._snapshot = AppSnapshot()
+        self._appids = [] # appid of each row
+        self._rows = {} # {<appid>: <row>, ...}
+        self._activeAppIds = set()
+        self._icons = OrderedDict() # {<appid>: <QIcon>, ...}, least recently used first
+        self._pendingIcons = {} # {<icon path>: <appid>, ...}
+        self._placeholderIcon = None
+        self._activeIcon = QIcon.fromTheme(_fromUtf8('media-playback-start'))
+        self.imageLoader = imageLoader
+        self.imageLoader.imageLoaded.connect(self.on_imageLoader_imageLoaded)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._appids)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return QCoreApplication.translate('MainWindow', self.COLUMNS[section])
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        appid = self._appids[index.row()]
+        column = index.column()
+        if role == self.AppRole:
+            return self._snapshot[appid]
+        if role in (Qt.DisplayRole, Qt.EditRole):
+            # Numbers are returned as such to get numeric sorting
+            if column == self.COLUMN_GAME:
+                return self._snapshot.name(appid)
+            elif column == self.COLUMN_DROPS:
+                return self._snapshot.drops(appid)
+            elif column == self.COLUMN_PLAYTIME:
+                return self._snapshot.playTime(appid)
+        elif role == Qt.DecorationRole:
+            if column == self.COLUMN_STATE and appid in self._activeAppIds:
+                return self._activeIcon
+            elif column == self.COLUMN_GAME:
+                return self._icon(appid)
+        return None
+
+    def _icon(self, appid):
+        icon = self._icons.pop(appid, None)
+        if icon is None:
+            path = self._snapshot.iconPath(appid)
+            image = self.imageLoader.load(path)
+            if image is None:
+                # Not loaded yet, on_imageLoader_imageLoaded will update the row
+                self._pendingIcons[path] = appid
+                return self.placeholderIcon
+            icon = QIcon(QPixmap.fromImage(image)) if not image.isNull() else QIcon()
+        self._cacheIcon(appid, icon)
+        return icon
+
+    def _cacheIcon(self, appid, icon):
+        self._icons.pop(appid, None)
+        self._icons[appid] = icon
+        while len(self._icons) > self.maxIcons:
+            self._icons.popitem(last=False)
+
+    @property
+    def placeholderIcon(self):
+        if self._placeholderIcon is None:
+            placeholder = QPixmap(32, 32)
+            placeholder.fill(Qt.transparent)
+            self._placeholderIcon = QIcon(placeholder)
+        return self._placeholderIcon
+
+    @pyqtSlot(str, QImage)
+    def on_imageLoader_imageLoaded(self, path, image):
+        appid = self._pendingIcons.pop(path, None)
+        row = self._rows.get(appid, -1)
+        if row >= 0:
+            self._cacheIcon(appid, QIcon(QPixmap.fromImage(image)) if not image.isNull() else QIcon())
+            index = self.index(row, self.COLUMN_GAME)
+            self.dataChanged.emit(index, index)
+
+    def rowForAppId(self, appid):
+        ''' Returns the row of appid or -1 if it is not in the model '''
+        return self._rows.get(appid, -1)
+
+    def app(self, row):
+        return self._snapshot[self._appids[row]]
+
+    def appId(self, row):
+        return self._appids[row]
+
+    def record(self, row):
+        ''' Returns (<name>, <remainingDrops>, <playTime>) of row '''
+        return self._snapshot.record(self._appids[row])
+
+    def isActive(self, appid):
+        return appid in self._activeAppIds
+
+    def appIds(self):
+        ''' Returns a list of all appids in the model (in row order) '''
+        return list(self._appids)
+
+    def updateApps(self, snapshot, appids):
+        ''' Switch to snapshot and update the rows of appids that are in the
+            model already, append all others.
+            Rows not in appids must have the same data in snapshot as before.
+        '''
+        self._snapshot = snapshot
+        newAppIds = []
+        changedRows = []
+        for appid in appids:
+            row = self._rows.get(appid)
+            if row is None:
+                newAppIds.append(appid)
+            else:
+                changedRows.append(row)
+
+        # One signal per run of consecutive changed rows, not one per row
+        # (nor one for all rows between the first and the last changed one)
+        runs = [] # [[<first row>, <last row>], ...]
+        for row in sorted(changedRows):
+            if runs and row <= runs[-1][1] + 1:
+                runs[-1][1] = row
+            else:
+                runs.append([row, row])
+        for first, last in runs:
+            self.dataChanged.emit(self.index(first, 0), self.index(last, len(self.COLUMNS) - 1))
+
+        if newAppIds:
+            first = len(self._appids)
+            self.beginInsertRows(QModelIndex(), first, first + len(newAppIds) - 1)
+            for row, appid in enumerate(newAppIds, first):
+                self._appids.append(appid)
+                self._rows[appid] = row
+            self.endInsertRows()
+
+    def removeApps(self, appids):
+        ''' Remove the rows of appids '''
+        rows = sorted((self._rows[a] for a in appids if a in self._rows), reverse=True)
+        if not rows:
+            return
+        # Remove from the bottom up so the remaining row numbers stay valid
+        for row in rows:
+            self.beginRemoveRows(QModelIndex(), row, row)
+            appid = self._appids.pop(row)
+            self._icons.pop(appid, None)
+            self.endRemoveRows()
+        self._rows = dict((appid, row) for row, appid in enumerate(self._appids))
+
+    def setActiveAppIds(self, appids):
+        ''' Mark the rows of appids as ideling '''
+        appids = set(appids)
+        changed = appids.symmetric_difference(self._activeAppIds)
+        self._activeAppIds = appids
+        for appid in changed:
+            row = self._rows.get(appid)
+            if row is not None:
+                index = self.index(row, self.COLUMN_STATE)
+                self.dataChanged.emit(index, index)
+
+class GamesFilterProxyModel(QSortFilterProxyModel):
+    ''' Sorts and filters the rows of a GamesTableModel
+
+        Changing the filter re-evaluates all rows once (invalidateFilter) instead
+        of hiding rows one by one in the view.
+    '''
+    FILTER_DROPS, FILTER_ALL, FILTER_REFUND, FILTER_IDLING = range(4)
+    FILTERS = (
+        (FILTER_DROPS, 'Games with drops'),
+        (FILTER_ALL, 'All games'),
+        (FILTER_REFUND, 'In refund period'),
+        (FILTER_IDLING, 'Idling now'),
+    )
+    _filterMode = FILTER_DROPS
+
+    def __init__(self, parent=None):
+        super(GamesFilterProxyModel, self).__init__(parent)
+        self.setSortRole(Qt.EditRole) # Numeric sorting of drops and playtime
+        self.setDynamicSortFilter(True)
+
+    def filterMode(self):
+        return self._filterMode
+
+    def setFilterMode(self, mode):
+        if mode != self._filterMode:
+            self._filterMode = mode
+            self.invalidateFilter()
+
+    def filterAcceptsRow(self, sourceRow, sourceParent):
+        mode = self._filterMode
+        if mode == self.FILTER_ALL:
+            return True
+        model = self.sourceModel()
+        if mode == self.FILTER_IDLING:
+            return model.isActive(model.appId(sourceRow))
+        _, remainingDrops, playTime = model.record(sourceRow)
+        if mode == self.FILTER_DROPS:
+            return remainingDrops > 0
+        elif mode == self.FILTER_REFUND:
+            return remainingDrops > 0 and playTime < 2.0
+        return True
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+
+"""
+Module implementing ImageLoader.
+"""
+import logging
+from collections import OrderedDict
+from PyQt4.QtCore import pyqtSlot, pyqtSignal, QObject, QRunnable, QThreadPool
+from PyQt4.QtGui import QImage
+
+class _DecodeImage(QRunnable):
+    ''' Decodes one image file on a QThreadPool thread '''
+    def __init__(self, path, loader):
+        super(_DecodeImage, self).__init__()
+        self.path = path
+        self.loader = loader
+
+    def run(self):
+        # QImage (unlike QPixmap) may be used outside of the GUI thread.
+        # A missing file results in a null image.
+        self.loader._imageDecoded.emit(self.path, QImage(self.path))
+
+class ImageLoader(QObject):
+    ''' Loads images asynchronously into a LRU cache limited to maxBytes
+
+        load() returns cached images right away, otherwise decoding is started
+        on a worker thread and imageLoaded is emitted when it is done.
+        Files that could not be loaded are cached as null images.
+    '''
+    imageLoaded = pyqtSignal(str, QImage)
+    # Internal, emitted by workers and delivered to the GUI thread
+    _imageDecoded = pyqtSignal(str, QImage)
+
+    def __init__(self, maxBytes=32*1024*1024, maxThreads=2, parent=None):
+        super(ImageLoader, self).__init__(parent)
+        self.logger = logging.getLogger('.'.join((__name__, self.__class__.__name__)))
+        self.maxBytes = maxBytes
+        self._cache = OrderedDict() # {<path>: <QImage>}, least recently used first
+        self._cacheBytes = 0
+        self._pending = set()
+        self._pool = QThreadPool(self)
+        self._pool.setMaxThreadCount(maxThreads)
+        self._imageDecoded.connect(self.on_imageDecoded)
+
+    def load(self, path):
+        ''' Returns the QImage for path if it is cached, None otherwise
+            (imageLoaded will be emitted when it has been loaded).
+        '''
+        image = self._cache.get(path)
+        if image is not None:
+            # Mark as recently used
+            del self._cache[path]
+            self._cache[path] = image
+            return image
+        if path and path not in self._pending:
+            self._pending.add(path)
+            self._pool.start(_DecodeImage(path, self))
+        return None
+
+    def prefetch(self, paths):
+        ''' Start loading paths that are not cached yet '''
+        for path in paths:
+            if path not in self._cache:
+                self.load(path)
+
+    @pyqtSlot(str, QImage)
+    def on_imageDecoded(self, path, image):
+        self._pending.discard(path)
+        if path in self._cache:
+            self._cacheBytes -= self._cache.pop(path).byteCount()
+        self._cache[path] = image
+        self._cacheBytes += image.byteCount()
+        # Evict least recently used images, but always keep the new one
+        while self._cacheBytes > self.maxBytes and len(self._cache) > 1:
+            _, evicted = self._cache.popitem(last=False)
+            self._cacheBytes -= evicted.byteCount()
+        self.imageLoaded.emit(path, image)
@@ -6,35 +6,47 @@ Module implementing MainWindow.
 import os
 import logging
 from itertools import chain
-from datetime import timedelta
-from PyQt4.QtCore import pyqtSlot, Qt, QThread, QDir, pyqtSignal, QMetaObject, Q_ARG, QTimer, QSettings, QPoint, QSize, QUrl
-from PyQt4.QtGui import QMainWindow, QTableWidgetItem, QProgressBar, QPixmap, QIcon, QHeaderView, QLabel, QDialog, QMenu, QDesktopServices
+from datetime import datetime, timedelta
+from PyQt4.QtCore import pyqtSlot, Qt, QThread, QDir, pyqtSignal, QMetaObject, Q_ARG, QTimer, QPoint, QSize, QUrl
+from PyQt4.QtGui import QMainWindow, QComboBox, QProgressBar, QPixmap, QImage, QIcon, QHeaderView, QLabel, QDialog, QMenu, QDesktopServices
 
 from .Ui_mainwindow import Ui_MainWindow, _fromUtf8, _translate
-from .settingsdialog import SettingsDialog
-from steam_idle_qt.QIdle import Idle, MultiIdle
-from steam_idle.page_parser import App
-from steam_idle_qt.QSteamParser import QSteamParser
-from steam_idle import steam_api
+from .imageloader import ImageLoader
+from .gamestablemodel import GamesTableModel, GamesFilterProxyModel
+from steam_idle_qt.SteamDataDelta import SteamDataDelta
+from steam_idle_qt.AppSnapshot import AppSnapshot
+from steam_idle_qt import ProcessMemory
+from steam_idle_qt.SteamWatcher import SteamWatcher
+from steam_idle_qt.Metrics import metrics, MetricsExporter
+from steam_idle_qt.SettingsStore import settingsStore
+# The network, parser and idle modules (and the settings dialog) are imported
+# when first used, so they don't delay the first paint of the window.
 
 class MainWindow(QMainWindow, Ui_MainWindow):
     """
     Class documentation goes here.
     """
-    apps = {}
-    activeApps = [] # List of app instances currently ideling
+    apps = AppSnapshot() # Shared with the parser and idle threads, replaced by every update
+    activeApps = [] # List of app instances handed to Idle/MultiIdle (running or queued)
     totalGamesToIdle = 0
     gamesInRefundPeriod = 0
     totalRemainingDrops = 0
     _idleThread = None
     _multiIdleThread = None
+    _multiIdleInstance = None
     _SteamParserThread = None
+    _dropHistory = None
+    _dropHistoryThread = None
     _steamPassword = None
-    _checkSteamRunningTimer = None
+    _pausedIdle = None # (<multi idle?>, [<app>, ...]) paused because the Steam client went away
     _init_done = False # True if initialization is completed (loaded data from steam etc.)
     _startup = True # True on app start, set to false then init is done (and steam is running).
     _statusBarTimer = None
     _statusBarTimerDelta = None
+    _currentHeader = None # Path of the header image that should be displayed
+    _selectedAppId = None # appid of the selected row while the table is updated
+    _metricsExporter = None
+    headerPrefetchRows = 5 # Number of rows above and below the current one to prefetch headers for
     steamDataUpdated = pyqtSignal() # Emitted when tableView has been populated with fresh steam data
 
     def __init__(self, parent=None):
@@ -45,6 +57,7 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         """
         super(MainWindow, self).__init__(parent)
         self.logger = logging.getLogger('.'.join((__name__, self.__class__.__name__)))
+        self._runningAppIds = set() # appids with an idle child running (by the supervisor signals)
         self.logger.debug('Setting up UI')
         self.setupUi(self)
         self.logger.debug('Setting up UI DONE')
@@ -64,14 +77,45 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.statusBar.addPermanentWidget(self.labelStatusBar)
         self.statusBar.addPermanentWidget(self.progressBar)
 
+        # Icons and header images are loaded in background
+        self.imageLoader = ImageLoader(parent=self)
+        self.imageLoader.imageLoaded.connect(self.on_imageLoader_imageLoaded)
+        self._noImagePixmap = QPixmap('NoImage.png')
+
+        # The games table is backed by a model, sorting and filtering is done by a proxy
+        self.gamesModel = GamesTableModel(self.imageLoader, self)
+        self.gamesProxyModel = GamesFilterProxyModel(self)
+        self.gamesProxyModel.setSourceModel(self.gamesModel)
+        self.tableViewGames.setModel(self.gamesProxyModel)
+
+        # Filter selection, placed next to actionShowAll
+        self.comboBoxFilter = QComboBox(self)
+        for mode, text in GamesFilterProxyModel.FILTERS:
+            self.comboBoxFilter.addItem(self.tr(text), mode)
+        self.comboBoxFilter.setToolTip(self.tr('Show games'))
+        toolBarActions = self.toolBar.actions()
+        self.toolBar.insertWidget(
+            toolBarActions[toolBarActions.index(self.actionShowAll) + 1],
+            self.comboBoxFilter
+        )
+        self.comboBoxFilter.currentIndexChanged[int].connect(self.on_comboBoxFilter_currentIndexChanged)
+        # Rows have the height of the game icons, no need to resize them to contents
+        self.tableViewGames.verticalHeader().setDefaultSectionSize(34)
+
         # No resize and no sorting for status column
-        self.tableWidgetGames.horizontalHeader().setResizeMode(0, QHeaderView.ResizeToContents)
-        self.tableWidgetGames.selectionModel().currentRowChanged.connect(self.on_tableWidgetGamesSelectionModel_currentRowChanged)
+        self.tableViewGames.horizontalHeader().setResizeMode(0, QHeaderView.ResizeToContents)
+        self.tableViewGames.selectionModel().currentRowChanged.connect(self.on_tableViewGamesSelectionModel_currentRowChanged)
 
         # Restore settings
         self.readSettings()
 
-        self.checkSteamRunning()
+        # Watch the Steam client in background, checkSteamRunning is called on every change.
+        # The thread is started by slowInit, SteamWatcher imports steam_api on its first check.
+        self._steamWatcherThread = QThread(self)
+        self.steamWatcher = SteamWatcher()
+        self.steamWatcher.moveToThread(self._steamWatcherThread)
+        self._steamWatcherThread.started.connect(self.steamWatcher.start)
+        self.steamWatcher.steamRunningChanged.connect(self.on_steamWatcher_steamRunningChanged)
 
         if not os.path.exists(QDir.toNativeSeparators(self.settings.fileName())) or self.settings.value('steam/password', None) == None:
             # Init Settings and/or ask for password
@@ -93,23 +137,58 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             'SteamIdle'
         )
 
+        from steam_idle_qt.QSteamParser import QSteamParser
+        from steam_idle_qt.QIdle import Idle, MultiIdle
+        from steam_idle_qt.RequestGuard import requestGuard
+        from steam_idle_qt.DropHistory import DropHistory
+        from steam_idle_qt.DropPredictor import DropPredictor
+
+        if not self._steamWatcherThread.isRunning():
+            self._steamWatcherThread.start()
+
+        if self._metricsExporter is None:
+            self._metricsExporter = MetricsExporter.fromSettings(self.settings, data_path, parent=self)
+            if self._metricsExporter is not None:
+                self._metricsExporter.start()
+
         self._SteamParserThread = QThread()
         self._SteamParserInstance = QSteamParser(
             username=self.settings.value('steam/username'),
             password=self.steamPassword,
             data_path=data_path
         )
+        # Populate the table from the snapshot cache, the refresh at the end of
+        # slowInit reconciles it with the data from steam
+        cachedApps = self._SteamParserInstance.apps
+        if cachedApps:
+            self.logger.debug('Using %d apps from snapshot cache', len(cachedApps))
+            self.updateSteamData(cachedApps)
         self._SteamParserInstance.moveToThread(self._SteamParserThread)
+        # Record drops and play time in background (the data path exists now)
+        if self._dropHistory is None:
+            self._dropHistory = DropHistory.fromSettings(self.settings, data_path)
+            if self._dropHistory is not None:
+                self._dropHistoryThread = QThread(self)
+                self._dropHistory.moveToThread(self._dropHistoryThread)
+                self._dropHistoryThread.started.connect(self._dropHistory.start)
+                self._dropHistoryThread.start()
+        if self._dropHistory is not None:
+            self._SteamParserInstance.steamDataReady.connect(self._dropHistory.on_steamDataReady)
+            self._SteamParserInstance.steamDataDelta.connect(self._dropHistory.on_steamDataDelta)
         self._SteamParserInstance.steamDataReady.connect(self.updateSteamData)
+        self._SteamParserInstance.steamDataDelta.connect(self.on_steamDataDelta)
         self._SteamParserInstance.timerStart.connect(self.on_SteamParser_startTimer)
         self._SteamParserInstance.timerStop.connect(self.on_SteamParser_stopTimer)
-        # Restart the statusbar timer with every timeout
-        self._SteamParserInstance.timerTimeout.connect(self.on_SteamParser_startTimer)
+        self._SteamParserInstance.scheduleChanged.connect(self.on_SteamParser_scheduleChanged)
+        self._SteamParserInstance.steamDataError.connect(self.on_SteamParser_steamDataError)
+        requestGuard().circuitStateChanged.connect(self.on_requestGuard_circuitStateChanged)
         self._SteamParserThread.start()
 
         # Create worker and thread for ideling
         self._idleThread = QThread()
         self._idleInstance = Idle()
+        # Refresh when the next drop is expected instead of after a fixed delay (opt-in)
+        self._idleInstance.predictor = DropPredictor.fromSettings(self.settings, self._dropHistory)
         self._idleInstance.moveToThread(self._idleThread)
         # Connect signals
         # called when app has finished ideling
@@ -118,12 +197,15 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self._idleInstance.statusUpdate.connect(self.on_idleStatusUpdate)
         # Update steam data (apps) in idleInstance (called periodically by QStremParser)
         self._SteamParserInstance.steamDataReady.connect(self._idleInstance.on_steamDataReady)
-        # Update/Start SteamParserTimer with new interval
-        self._idleInstance.updateSteamParserTimer.connect(self._SteamParserInstance.startTimer)
+        self._SteamParserInstance.steamDataDelta.connect(self._idleInstance.on_steamDataDelta)
+        # Schedule refreshes of the app currently ideling
+        self._idleInstance.scheduleRefresh.connect(self._SteamParserInstance.scheduleRefresh)
+        self._idleInstance.unscheduleRefresh.connect(self._SteamParserInstance.unscheduleRefresh)
         # called on thread exit, update UI, stop SteamParser timer
         self._idleInstance.finished.connect(self._post_stopIdle)
         self._idleInstance.finished.connect(self._idleThread.quit)
         self._idleInstance.finished.connect(self._SteamParserInstance.stopTimer)
+        self._connectSupervisor(self._idleInstance.supervisor)
 
         # Create worker and thread for multi idle
         self._multiIdleThread = QThread()
@@ -138,20 +220,32 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self._multiIdleInstance.allDone.connect(self.on_multiIdleFinished)
         # Update steam data (apps) in multiIdleInstance (called periodically by QStremParser)
         self._SteamParserInstance.steamDataReady.connect(self._multiIdleInstance.on_steamDataReady)
-        # Update/Start SteamParserTimer with new interval
-        self._multiIdleInstance.updateSteamParserTimer.connect(self._SteamParserInstance.startTimer)
+        self._SteamParserInstance.steamDataDelta.connect(self._multiIdleInstance.on_steamDataDelta)
+        # Schedule refreshes of the apps currently ideling
+        self._multiIdleInstance.scheduleRefresh.connect(self._SteamParserInstance.scheduleRefresh)
+        self._multiIdleInstance.unscheduleRefresh.connect(self._SteamParserInstance.unscheduleRefresh)
         # called on thread exit, update UI etc.
         self._multiIdleInstance.finished.connect(self._post_stopIdle)
         self._multiIdleInstance.finished.connect(self._multiIdleThread.quit)
         self._multiIdleInstance.finished.connect(self._SteamParserInstance.stopTimer)
+        self._connectSupervisor(self._multiIdleInstance.supervisor)
 
-        # Update the tableWidgetGames
+        # Update the games table
         self.on_actionRefresh_triggered()
 
         self._init_done = True
 
+        if cachedApps:
+            # Data is there already, no need to wait for the next check to autostart
+            self.checkSteamRunning()
+
+    @pyqtSlot(bool)
+    def on_steamWatcher_steamRunningChanged(self, running):
+        self.checkSteamRunning()
+
     def checkSteamRunning(self):
-        if steam_api.IsSteamRunning():
+        ''' Update UI (and start, pause or resume idle) for the last known state of the Steam client '''
+        if self.steamWatcher.isRunning():
             if self.labelSteamNotRunning.isVisible():
                 self.logger.debug('Steam client is running')
             self.labelSteamNotRunning.hide()
@@ -160,6 +254,9 @@ class MainWindow(QMainWindow, Ui_MainWindow):
                 self.toggle_actionStartStopIdle()
                 self.toggle_actionStartStopMultiIdle()
 
+                if self._pausedIdle is not None:
+                    self.resumeIdle()
+
                 # Autostart
                 if self._init_done and self._startup:
                     self._startup = False
@@ -171,6 +268,10 @@ class MainWindow(QMainWindow, Ui_MainWindow):
                             # Number of games in refund is below threshold, start normal idle
                             self.logger.debug('Number of games in refund is below threshold, start normal idle')
                             autostartMode = 'Idle'
+                        elif self.multiIdleCapacity() < min(MIThreshold, self.gamesInRefundPeriod):
+                            # Memory budget does not allow enough games at once
+                            self.logger.debug('Memory budget too small for %d games, start normal idle', MIThreshold)
+                            autostartMode = 'Idle'
                         else:
                             self.logger.debug('Autostart MultiIdle')
                             self.on_actionStartStopMultiIdle_triggered()
@@ -182,22 +283,51 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         else:
             if not self.labelSteamNotRunning.isVisible():
                 self.logger.warning('Steam client is not running')
-            # Stop Idle processes
+            # Pause Idle processes
             self.labelSteamNotRunning.show()
-            self.cleanUp()
+            self.pauseIdle()
             self.actionStartStopIdle.setEnabled(False)
             self.actionNext.setEnabled(False)
             self.actionStartStopMultiIdle.setEnabled(False)
 
-        if not self._checkSteamRunningTimer:
-            self.logger.debug('Setting up timer')
-            self._checkSteamRunningTimer = QTimer()
-            self._checkSteamRunningTimer.timeout.connect(self.checkSteamRunning)
-            self._checkSteamRunningTimer.start(15*1000)
+    def pauseIdle(self):
+        ''' Stop idle (without waiting for it), resumeIdle starts it again '''
+        if len(self.activeApps) == 0:
+            return
+        self._pausedIdle = (len(self.activeApps) > 1, list(self.activeApps))
+        self.logger.info('Pausing idle of %d apps', len(self.activeApps))
+        if self._pausedIdle[0]:
+            self.stopMultiIdle()
+        else:
+            self.stopIdle()
+
+    def resumeIdle(self):
+        ''' Start idle paused by pauseIdle again '''
+        multi, apps = self._pausedIdle
+        self._pausedIdle = None
+        self.logger.info('Resuming idle of %d apps', len(apps))
+        if multi:
+            self.startMultiIdle()
+        else:
+            # Use the current data of the app
+            app = self.apps.get(apps[0].appid)
+            if app is not None and app.remainingDrops > 0:
+                self.startIdle(app)
+            else:
+                self.startIdle(self.nextAppWithDrops())
 
     @property
     def settings(self):
-        return QSettings(QSettings.IniFormat, QSettings.UserScope, 'jayme-github', 'SteamIdle')
+        return settingsStore()
+
+    def multiIdleCapacity(self):
+        ''' Number of games MultiIdle may run at once (by max. childs and memory budget) '''
+        settings = self.settings
+        capacity = settings.value('multiidlemaxchilds', 32, type=int)
+        budget = settings.value('multiidlememorybudget', 0, type=int) * 1024
+        if budget:
+            capacity = min(capacity, budget // ProcessMemory.DEFAULT_CHILD_KIB)
+        return capacity
 
     @property
     def steamPassword(self):
@@ -213,6 +343,7 @@ class MainWindow(QMainWindow, Ui_MainWindow):
 
     @pyqtSlot()
     def showSettings(self):
+        from .settingsdialog import SettingsDialog
         settingsDialog = SettingsDialog(parent=self)
         if settingsDialog.exec_() == QDialog.Accepted:
             self.logger.info('SettingsDialog accepted')
@@ -230,9 +361,9 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.move(pos)
 
     def writeSettings(self):
-        settings = self.settings
-        settings.setValue("pos", self.pos())
-        settings.setValue("size", self.size())
+        with self.settings.batch() as settings:
+            settings.setValue("pos", self.pos())
+            settings.setValue("size", self.size())
 
     @pyqtSlot(str)
     def on_idleStatusUpdate(self, msg):
@@ -262,6 +393,7 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self._idleThread.start()
         self.activeApps = [app]
         self.logger.debug('activeApps: "%s"', self.activeApps)
+        from steam_idle.page_parser import App # Loaded with QIdle in slowInit already
         QMetaObject.invokeMethod(self._idleInstance, 'doStartIdle', Qt.QueuedConnection,
                                     Q_ARG(App, app))
         # Enable nextAction (if more than one app to idle)
@@ -276,7 +408,7 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             self._multiIdleThread.quit()
             self._multiIdleThread.wait()
         self._multiIdleThread.start()
-        self.activeApps = [a for a in self.apps.values() if a.playTime < 2.0 and a.remainingDrops > 0]
+        self.activeApps = [self.apps[appid] for appid in self.apps.appidsWithDrops(refundOnly=True)]
         self.logger.debug('startMultiIdle for %d apps: %s', len(self.activeApps), self.activeApps)
         QMetaObject.invokeMethod(self._multiIdleInstance, 'doStartIdle', Qt.QueuedConnection,
                                     Q_ARG(list, self.activeApps))
@@ -300,10 +432,7 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             self.actionStartStopIdle.setIcon(QIcon.fromTheme(_fromUtf8('media-playback-stop')))
 
         # Update statusCell(s)
-        for app in self.activeApps:
-            self.tableWidgetGames.item(
-                self.rowIdForAppId(app.appid), 0
-            ).setIcon(QIcon.fromTheme(_fromUtf8('media-playback-start')))
+        self._updateActiveRows()
 
     def stopIdle(self):
         QMetaObject.invokeMethod(self._idleInstance, 'doStopIdle', Qt.QueuedConnection)
@@ -315,13 +444,10 @@ class MainWindow(QMainWindow, Ui_MainWindow):
     def _post_stopIdle(self):
         ''' Update UI stuff (icons, table etc.) after stopping idle '''
         self.logger.debug('activeApps: "%s"', self.activeApps)
-        # Update statusCells
-        for app in self.activeApps:
-            self.tableWidgetGames.item(
-                self.rowIdForAppId(app.appid), 0
-            ).setIcon(QIcon())
-        # remove active apps and stop progressbar
+        # remove active apps, update statusCells and stop progressbar
         self.activeApps = []
+        self._runningAppIds.clear()
+        self._updateActiveRows()
         self.stopProgressBar()
         # Disable nextAction
         self.actionNext.setEnabled(False)
@@ -335,128 +461,110 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.actionStartStopIdle.setToolTip(_translate("MainWindow", 'Start ideling', None))
         self.actionStartStopIdle.setIcon(QIcon.fromTheme(_fromUtf8('media-playback-start')))
 
+        if self._pausedIdle is not None and self.steamWatcher.isRunning():
+            # Steam came back before idle was stopped, checkSteamRunning skipped the resume
+            self.checkSteamRunning()
+
         # Update data
         self.on_actionRefresh_triggered()
 
+    def _updateActiveRows(self):
+        ''' Show the "running" icon for all apps with an idle child running
+            (apps MultiIdle has queued only are not shown as running)
+        '''
+        self.gamesModel.setActiveAppIds(self._runningAppIds)
+
     def rowIdForAppId(self, appid):
-        ''' Returns the rowId that contains appid or -1 if it was not found
+        ''' Returns the (view) rowId that contains appid or -1 if it was not found
         '''
-        matches = self.tableWidgetGames.model().match(
-            self.tableWidgetGames.model().index(0,0),
-            Qt.UserRole,
-            appid,
-            hits=1,
-        )
-        return matches[0].row() if matches else -1
+        row = self.gamesModel.rowForAppId(appid)
+        if row < 0:
+            return -1
+        return self.gamesProxyModel.mapFromSource(self.gamesModel.index(row, 0)).row()
 
     def nextAppWithDrops(self, startAt=0):
         ''' Return the next app with remaining drops or None
             Will go from at index startAt to startAt -1 (e.g. starts from the begining is end is reached)
         '''
-        for rowId in chain(range(startAt, self.tableWidgetGames.rowCount()), range(0, startAt)):
-            app = self.appInRow(rowId)
-            self.logger.debug('(%d, %d): %s', rowId, self.tableWidgetGames.visualRow(rowId), str(app))
-            if app.remainingDrops > 0:
+        dropsColumn = GamesTableModel.COLUMN_DROPS
+        for rowId in chain(range(startAt, self.gamesProxyModel.rowCount()), range(0, startAt)):
+            if self.gamesProxyModel.index(rowId, dropsColumn).data(Qt.EditRole) > 0:
+                app = self.appInRow(rowId)
+                self.logger.debug('nextAppWithDrops (%d): %s', rowId, str(app))
                 return app
+        # The filter may hide apps with drops (e.g. "Idling now")
+        activeAppIds = set(a.appid for a in self.activeApps)
+        for appid in self.apps.appidsWithDrops():
+            if appid not in activeAppIds:
+                return self.apps[appid]
         return None
 
-    def add_updateRow(self, app):
-        ''' Updates entries in the tableView with new data, adds new rows if needed
-        '''
-        rowId = self.rowIdForAppId(app.appid)
-        if rowId >= 0:
-            # Update existing row
-            # If this app is ideling atm, add a icon
-            if app in self.activeApps:
-                self.tableWidgetGames.item(rowId, 0).setIcon(QIcon.fromTheme(_fromUtf8('media-playback-start')))
-            # Update app instance in UserRole
-            self.tableWidgetGames.item(rowId, 1).setData(Qt.UserRole, app)
-            # Remaining drops
-            self.tableWidgetGames.item(rowId, 2).setData(Qt.EditRole, app.remainingDrops)
-            # Playtime
-            self.tableWidgetGames.item(rowId, 3).setData(Qt.EditRole, app.playTime)
-        else:
-            # Add a game row to the table
-            rowId = self.tableWidgetGames.rowCount()
-            self.tableWidgetGames.insertRow(rowId)
-
-            # Cells are: State, Game, Remaining drops, Playtime
-            stateCell = QTableWidgetItem()
-            # If this app is ideling atm, add a icon
-            if app in self.activeApps:
-                stateCell.setIcon(QIcon.fromTheme(_fromUtf8('media-playback-start')))
-            # Use appid as identifier to look up apps in table
-            stateCell.setData(Qt.UserRole, app.appid)
-
-            gameCell = QTableWidgetItem(app.name)
-            # Store app instance (can't be looked up via model.match() for some reason)
-            gameCell.setData(Qt.UserRole, app)
-            if os.path.exists(app.icon):
-                # Load pixmap and create an icon
-                gameIcon = QIcon(QPixmap(app.icon))
-                gameCell.setIcon(gameIcon)
-
-            remainingDropsCell = QTableWidgetItem()
-            remainingDropsCell.setData(Qt.EditRole, app.remainingDrops) # Use setData to have numeric instead of alpha-numeric sorting
-
-            playtimeCell = QTableWidgetItem()
-            playtimeCell.setData(Qt.EditRole, app.playTime)
-
-            # Add cells
-            self.tableWidgetGames.setItem(rowId, 0, stateCell)
-            self.tableWidgetGames.setItem(rowId, 1, gameCell)
-            self.tableWidgetGames.setItem(rowId, 2, remainingDropsCell)
-            self.tableWidgetGames.setItem(rowId, 3, playtimeCell)
-
-        # Hide row if there no drops remain and actionShowAll is not checked
-        if self.actionShowAll.isChecked() or app.remainingDrops > 0:
-            self.tableWidgetGames.setRowHidden(rowId, False)
-        else:
-            self.tableWidgetGames.setRowHidden(rowId, True)
-
-    @pyqtSlot(dict)
+    @pyqtSlot(AppSnapshot)
     def updateSteamData(self, apps=None):
         ''' Update UI with data from steam
-            will use the apps provided as parameter or self.apps
+            will use the apps (AppSnapshot) provided as parameter or self.apps
         '''
         self.logger.debug('updateSteamData with %d apps as parameter',
             len(apps) if apps is not None else 0
         )
 
-        if apps != None:
+        if apps is not None:
+            # No copy, snapshots are never modified
             self.apps = apps
 
-        if self.apps != None:
-            #TODO: get selected row and reselect after pouplation
-            self.totalGamesToIdle = 0
-            self.totalRemainingDrops = 0
-            self.gamesInRefundPeriod = 0
-
-            # Temporarily disable sorting, see http://doc.qt.io/qt-5/qtablewidget.html#setItem
-            self.tableWidgetGames.setSortingEnabled(False)
-            try:
-                self.tableWidgetGames.horizontalHeader().sortIndicatorChanged.disconnect(self.tableWidgetGames.resizeRowsToContents)
-            except TypeError:
-                # Raises TypeError if not connected:
-                # TypeError: disconnect() failed between 'sortIndicatorChanged' and 'resizeRowsToContents'
-                pass
-
-            for _, app in self.apps.items():
-                self.totalRemainingDrops += app.remainingDrops
-                if app.remainingDrops > 0:
-                    self.totalGamesToIdle += 1
-                    if app.playTime < 2.0:
-                        self.gamesInRefundPeriod += 1
-                self.add_updateRow(app)
-
-            # Re-Enable sorting
-            self.tableWidgetGames.setSortingEnabled(True)
-            self.tableWidgetGames.horizontalHeader().sortIndicatorChanged.connect(self.tableWidgetGames.resizeRowsToContents)
+        #TODO: get selected row and reselect after pouplation
+        with metrics().span('table_update'):
+            self._beginTableUpdate()
+            self._updateTotals()
+            self.gamesModel.removeApps(
+                [appid for appid in self.gamesModel.appIds() if appid not in self.apps]
+            )
+            self.gamesModel.updateApps(self.apps, list(self.apps))
+            self._endTableUpdate()
 
-            # Update cell and row sizes
-            self.tableWidgetGames.resizeColumnsToContents()
-            self.tableWidgetGames.resizeRowsToContents()
+        self._post_updateSteamData()
 
+    @pyqtSlot(SteamDataDelta)
+    def on_steamDataDelta(self, delta):
+        ''' Update UI with the changes of a steam data refresh
+            Only rows of apps that have been added, removed or changed are touched.
+        '''
+        self.logger.debug('on_steamDataDelta: %s', delta)
+        if len(delta) > 0:
+            with metrics().span('table_update'):
+                self._beginTableUpdate()
+                self.apps = delta.snapshot
+                self._updateTotals()
+                self.gamesModel.removeApps(delta.removed)
+                self.gamesModel.updateApps(self.apps, chain(delta.added, delta.changed))
+                self._endTableUpdate()
+
+        self._post_updateSteamData()
+
+    def _updateTotals(self):
+        ''' Take the totals from the snapshot (computed once per snapshot) '''
+        self.totalRemainingDrops = self.apps.totalRemainingDrops
+        self.totalGamesToIdle = self.apps.totalGamesToIdle
+        self.gamesInRefundPeriod = self.apps.gamesInRefundPeriod
+
+    def _beginTableUpdate(self):
+        # Keep the selected app selected, rows may move while sorting
+        self._selectedAppId = None
+        current = self.tableViewGames.currentIndex()
+        if current.isValid():
+            self._selectedAppId = self.appInRow(current.row()).appid
+
+    def _endTableUpdate(self):
+        if self._selectedAppId is not None:
+            rowId = self.rowIdForAppId(self._selectedAppId)
+            if rowId >= 0 and rowId != self.tableViewGames.currentIndex().row():
+                self.tableViewGames.selectRow(rowId)
+        # Update cell sizes
+        self.tableViewGames.resizeColumnsToContents()
+
+    def _post_updateSteamData(self):
+        ''' Update labels, actions etc. after the table has been updated '''
+        if self.apps is not None:
             # Update labels
             self.labelTotalGamesToIdle.setText(self.tr('{} games left to idle').format(self.totalGamesToIdle))
             self.labelTotalGamesToIdle.show()
@@ -521,10 +629,18 @@ class MainWindow(QMainWindow, Ui_MainWindow):
     def closeEvent(self, event):
         self.writeSettings()
         self.cleanUp()
+        self._steamWatcherThread.quit()
+        self._steamWatcherThread.wait()
+        if self._dropHistory is not None:
+            QMetaObject.invokeMethod(self._dropHistory, 'stop', Qt.BlockingQueuedConnection)
+            self._dropHistoryThread.quit()
+            self._dropHistoryThread.wait()
+        if self._metricsExporter is not None:
+            self._metricsExporter.stop()
         event.accept()
 
     def appInRow(self, rowId):
-        return self.tableWidgetGames.item(rowId, 1).data(Qt.UserRole)
+        return self.gamesProxyModel.index(rowId, 0).data(GamesTableModel.AppRole)
 
     @pyqtSlot()
     def on_actionQuit_triggered(self):
@@ -577,29 +693,49 @@ class MainWindow(QMainWindow, Ui_MainWindow):
                                  Qt.QueuedConnection)
 
     @pyqtSlot('QModelIndex', 'QModelIndex')
-    def on_tableWidgetGamesSelectionModel_currentRowChanged(self, current, previous):
+    def on_tableViewGamesSelectionModel_currentRowChanged(self, current, previous):
+        if not current.isValid():
+            return
         app = self.appInRow(current.row())
-        if os.path.exists(app.header):
-            headerPixmap = QPixmap(app.header)
+        self._currentHeader = app.header
+        self._setHeaderImage(self.imageLoader.load(app.header))
+
+        # Load the headers of the surrounding rows, they are likely to be selected next
+        rows = range(
+            max(0, current.row() - self.headerPrefetchRows),
+            min(self.gamesProxyModel.rowCount(), current.row() + self.headerPrefetchRows + 1)
+        )
+        self.imageLoader.prefetch([self.appInRow(r).header for r in rows])
+
+    def _setHeaderImage(self, image):
+        ''' Show image as header, NoImage.png if it is None or null '''
+        if image is None or image.isNull():
+            self.labelHeaderImage.setPixmap(self._noImagePixmap)
         else:
-            headerPixmap = QPixmap('NoImage.png')
-        self.labelHeaderImage.setPixmap(headerPixmap)
+            self.labelHeaderImage.setPixmap(QPixmap.fromImage(image))
+
+    @pyqtSlot(str, QImage)
+    def on_imageLoader_imageLoaded(self, path, image):
+        if path == self._currentHeader:
+            self._setHeaderImage(image)
 
     @pyqtSlot(bool)
     def on_actionShowAll_triggered(self, checked):
-        if checked:
-            # Re-populate table with all apps
-            self.updateSteamData()
-        else:
-            # Hide all rows with apps that have no drops remaining
-            matches = self.tableWidgetGames.model().match(
-                self.tableWidgetGames.model().index(0,2),
-                Qt.EditRole,
-                0,
-                hits=-1,
-            )
-            for m in matches:
-                self.tableWidgetGames.setRowHidden(m.row(), True)
+        # Toggle between all games and games with drops remaining
+        self.setFilterMode(
+            GamesFilterProxyModel.FILTER_ALL if checked else GamesFilterProxyModel.FILTER_DROPS
+        )
+
+    def on_comboBoxFilter_currentIndexChanged(self, index):
+        mode = self.comboBoxFilter.itemData(index)
+        if mode is not None:
+            self.setFilterMode(mode)
+
+    def setFilterMode(self, mode):
+        ''' Filter the games table, keeps actionShowAll and comboBoxFilter in sync '''
+        self.gamesProxyModel.setFilterMode(mode)
+        self.actionShowAll.setChecked(mode == GamesFilterProxyModel.FILTER_ALL)
+        self.comboBoxFilter.setCurrentIndex(self.comboBoxFilter.findData(mode))
 
     @pyqtSlot()
     def on_actionNext_triggered(self):
@@ -608,7 +744,7 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.on_actionRefresh_triggered()
         self.on_idleAppDone()
 
-    @pyqtSlot(App)
+    @pyqtSlot(object) # App
     def on_idleAppDone(self, app=None):
         self.logger.debug('activeApps: "%s"', self.activeApps)
         nextApp = None
@@ -617,12 +753,9 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             nextApp = self.nextAppWithDrops(startAt=rowId+1)
             self.logger.debug('nextApp: "%s"', nextApp)
             if nextApp:
-                # Update icon of old statusCell
-                self.tableWidgetGames.item(rowId, 0).setIcon(QIcon())
-
-                # Load the next app into idle thread
+                # Load the next app into idle thread (updates the statusCells)
                 self.startIdle(nextApp)
-                if rowId + 1 == self.tableWidgetGames.rowCount() - 1:
+                if rowId + 1 == self.gamesProxyModel.rowCount() - 1:
                     # This was the last app(/row), disable next button
                     self.actionNext.setEnabled(False)
 
@@ -632,26 +765,24 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             self.stopIdle()
             self.updateSteamData() # This will update the table and enable/disable buttons as needed
 
-    @pyqtSlot(App)
+    @pyqtSlot(object) # App
     def on_multiIdleAppDone(self, app):
         self.logger.debug('activeApps: "%s"', self.activeApps)
-        self.activeApps.remove(app)
+        # app may be a newer instance than the one handed to MultiIdle
+        self.activeApps = [a for a in self.activeApps if a.appid != app.appid]
         self.logger.debug('activeApps: "%s"', self.activeApps)
-        rowId = self.rowIdForAppId(app.appid)
-        self.logger.debug('on_multiIdleAppDone, removing icon from row: %d', rowId)
-        self.tableWidgetGames.item(rowId, 0).setIcon(QIcon()) # Remove "running" icon from app
-        self.on_actionRefresh_triggered()
+        # Its child is stopped already (childStopped), the data was refreshed by the parser
 
-    @pyqtSlot(int, int)
-    def on_tableWidgetGames_cellDoubleClicked(self, row, column):
-        # FIXME: cellDoubleClicked left click only
+    @pyqtSlot('QModelIndex')
+    def on_tableViewGames_doubleClicked(self, index):
+        # Rows may move until idle has stopped, remember the app now
+        app = self.appInRow(index.row())
         def _startClickedApp():
             try:
                 self._idleThread.finished.disconnect(_startClickedApp)
                 self._multiIdleThread.finished.disconnect(_startClickedApp)
             except (TypeError, AttributeError):
                 pass
-            app = self.appInRow(row)
             self.logger.debug('startign idle on cell click request: %s', str(app))
             self.startIdle(app)
 
@@ -690,9 +821,11 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             self.startMultiIdle()
 
     @pyqtSlot('QPoint')
-    def on_tableWidgetGames_customContextMenuRequested(self, pos):
-        idx = self.tableWidgetGames.indexAt(pos)
+    def on_tableViewGames_customContextMenuRequested(self, pos):
+        idx = self.tableViewGames.indexAt(pos)
         self.logger.debug('%s %s', idx.row(), idx.column())
+        if not idx.isValid():
+            return
         app = self.appInRow(idx.row())
         self.logger.debug(str(app))
 
@@ -725,7 +858,7 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         # TODO: Add to blacklist option
         p = QPoint(pos)
         p.setY(p.y() + menu.height())
-        where = self.tableWidgetGames.mapToGlobal(p)
+        where = self.tableViewGames.mapToGlobal(p)
         menu.exec_(where)
 
     @pyqtSlot()
@@ -747,6 +880,76 @@ class MainWindow(QMainWindow, Ui_MainWindow):
     @pyqtSlot()
     def on_SteamParser_stopTimer(self):
         self.logger.debug('Stopping timer and hiding labelStatusBarTimer')
-        self._statusBarTimer.stop()
-        self._statusBarTimer = None
+        if self._statusBarTimer:
+            self._statusBarTimer.stop()
+            self._statusBarTimer = None
         self.labelStatusBarTimer.clear()
+
+    @pyqtSlot(str)
+    def on_SteamParser_steamDataError(self, msg):
+        self.logger.debug('steamDataError: %s', msg)
+        # Stop the "Loading data" progress, the update is retried later
+        if self.labelStatusBar.text() == 'Loading data from Steam...':
+            self.stopProgressBar()
+        self.statusBar.showMessage(self.tr('Updating data from Steam failed, retrying later'), 10*1000)
+
+    @pyqtSlot(str)
+    def on_requestGuard_circuitStateChanged(self, state):
+        from steam_idle_qt.CircuitBreaker import CircuitBreaker
+        if state == CircuitBreaker.OPEN:
+            self.statusBar.showMessage(self.tr('Steam is not responding, pausing requests'))
+        else:
+            self.statusBar.clearMessage()
+
+    def _connectSupervisor(self, supervisor):
+        supervisor.childStarted.connect(self.on_idleSupervisor_childStarted)
+        supervisor.childStopped.connect(self.on_idleSupervisor_childStopped)
+        supervisor.childExited.connect(self.on_idleSupervisor_childExited)
+        supervisor.childRestarted.connect(self.on_idleSupervisor_childRestarted)
+        supervisor.appFailing.connect(self.on_idleSupervisor_appFailing)
+
+    def _appName(self, appid):
+        app = self.apps.get(appid)
+        return app.name if app and app.name else str(appid)
+
+    @pyqtSlot(int)
+    def on_idleSupervisor_childStarted(self, appid):
+        self._runningAppIds.add(appid)
+        self._updateActiveRows()
+
+    @pyqtSlot(int)
+    def on_idleSupervisor_childStopped(self, appid):
+        self._runningAppIds.discard(appid)
+        self._updateActiveRows()
+
+    @pyqtSlot(int, int, str, float)
+    def on_idleSupervisor_childExited(self, appid, exitcode, reason, uptime):
+        self._runningAppIds.discard(appid)
+        self._updateActiveRows()
+        self.statusBar.showMessage(self.tr('Idle child of "{}" {} after {}, restarting').format(
+            self._appName(appid), reason, timedelta(seconds=int(uptime))
+        ))
+
+    @pyqtSlot(int, int)
+    def on_idleSupervisor_childRestarted(self, appid, restarts):
+        self.statusBar.showMessage(self.tr('Restarted idle child of "{}" ({} restarts)').format(
+            self._appName(appid), restarts
+        ), 10*1000)
+
+    @pyqtSlot(int, str)
+    def on_idleSupervisor_appFailing(self, appid, reason):
+        self.statusBar.showMessage(self.tr('Giving up on "{}", idle child keeps crashing ({})').format(
+            self._appName(appid), reason
+        ))
+
+    @pyqtSlot(list)
+    def on_SteamParser_scheduleChanged(self, schedule):
+        ''' Show the upcoming refreshes as tooltip of the statusbar timer '''
+        lines = []
+        for appid, deadline in schedule:
+            app = self.apps.get(appid)
+            lines.append('{}: {}'.format(
+                app.name if app else (appid or self.tr('All games')),
+                datetime.fromtimestamp(deadline).strftime('%X'),
+            ))
+        self.labelStatusBarTimer.setToolTip('<br/>'.join(lines))
@@ -4,11 +4,12 @@
 Module implementing SettingsDialog.
 """
 import logging
-from PyQt4.QtCore import pyqtSlot, QSettings
+from PyQt4.QtCore import pyqtSlot
 from PyQt4.QtGui import QDialog, QDialogButtonBox
 
 from .Ui_settings import Ui_Dialog, _translate
 from steam_idle_qt.QSteamWebBrowser import QSteamWebBrowser
+from steam_idle_qt.SettingsStore import settingsStore
 from steamweb.steamwebbrowser import IncorrectLoginError
 
 class SettingsDialog(QDialog, Ui_Dialog):
@@ -30,7 +31,7 @@ class SettingsDialog(QDialog, Ui_Dialog):
 
     @property
     def settings(self):
-        return QSettings(QSettings.IniFormat, QSettings.UserScope, 'jayme-github', 'SteamIdle')
+        return settingsStore()
 
     def readSettings(self):
         settings = self.settings
@@ -42,23 +43,27 @@ class SettingsDialog(QDialog, Ui_Dialog):
         )
         self.spinBoxMultiIdleThreshold.setValue(settings.value('multiidlethreshold', 2, type=int))
         self.spinBoxMaxRefreshTime.setValue(settings.value('maxrefreshtime', 15, type=int))
+        self.spinBoxMultiIdleMaxChilds.setValue(settings.value('multiidlemaxchilds', 32, type=int))
+        self.spinBoxMultiIdleMemoryBudget.setValue(settings.value('multiidlememorybudget', 0, type=int))
         # Check credentials if we know username and password
         self.checkSteamCredentials(lazy=True)
 
     def writeSettings(self):
-        settings = self.settings
-        settings.setValue('steam/username', self.lineEditUsername.text())
-        if self.checkBoxStorePassword.isChecked():
-            # Store password in config
-            # FIXME: use keystore
-            settings.setValue('steam/password', self.lineEditPassword.text())
-        else:
-            # Store password in mainwindow variable
-            self.parent._steamPassword = self.lineEditPassword.text()
-        settings.setValue('steam/storepassword', self.checkBoxStorePassword.isChecked())
-        settings.setValue('autostart', self.comboBoxAutostart.currentText())
-        settings.setValue('multiidlethreshold', self.spinBoxMultiIdleThreshold.value())
-        settings.setValue('maxrefreshtime', self.spinBoxMaxRefreshTime.value())
+        with self.settings.batch() as settings:
+            settings.setValue('steam/username', self.lineEditUsername.text())
+            if self.checkBoxStorePassword.isChecked():
+                # Store password in config
+                # FIXME: use keystore
+                settings.setValue('steam/password', self.lineEditPassword.text())
+            else:
+                # Store password in mainwindow variable
+                self.parent._steamPassword = self.lineEditPassword.text()
+            settings.setValue('steam/storepassword', self.checkBoxStorePassword.isChecked())
+            settings.setValue('autostart', self.comboBoxAutostart.currentText())
+            settings.setValue('multiidlethreshold', self.spinBoxMultiIdleThreshold.value())
+            settings.setValue('maxrefreshtime', self.spinBoxMaxRefreshTime.value())
+            settings.setValue('multiidlemaxchilds', self.spinBoxMultiIdleMaxChilds.value())
+            settings.setValue('multiidlememorybudget', self.spinBoxMultiIdleMemoryBudget.value())
 
     def setGreenMsg(self, msg):
         self.labelStatus_2.setStyleSheet('color: green')
@@ -0,0 +1,69 @@
+import unittest
+
+from steam_idle.page_parser import App
+from steam_idle_qt.AppSnapshot import AppSnapshot
+
+ROWS = [
+    (10, 'Ten', 2, 1.0),
+    (20, 'Twenty', 0, 0.5),
+    (30, 'Thirty', 3, 5.0),
+]
+
+def app(appid, name, remainingDrops, playTime):
+    a = App('/images')
+    a.appid = appid
+    a.name = name
+    a.remainingDrops = remainingDrops
+    a.playTime = playTime
+    return a
+
+class AppSnapshotTest(unittest.TestCase):
+    def setUp(self):
+        self.snapshot = AppSnapshot(1, ROWS, '/images')
+
+    def test_totals(self):
+        self.assertEqual(self.snapshot.totalRemainingDrops, 5)
+        self.assertEqual(self.snapshot.totalGamesToIdle, 2)
+        self.assertEqual(self.snapshot.gamesInRefundPeriod, 1)
+
+    def test_mapping(self):
+        self.assertEqual(list(self.snapshot), [10, 20, 30])
+        self.assertIn(20, self.snapshot)
+        self.assertNotIn(40, self.snapshot)
+        a = self.snapshot[30]
+        self.assertEqual((a.appid, a.name, a.remainingDrops, a.playTime), (30, 'Thirty', 3, 5.0))
+        self.assertIsNone(self.snapshot.get(40))
+
+    def test_icon_path_matches_app(self):
+        self.assertEqual(self.snapshot.iconPath(10), self.snapshot[10].icon)
+
+    def test_apps_with_drops(self):
+        self.assertEqual(self.snapshot.appidsWithDrops(), [10, 30])
+        self.assertEqual(self.snapshot.appidsWithDrops(refundOnly=True), [10])
+
+    def test_replace_changes_and_adds(self):
+        new = self.snapshot.replace(2, {10: app(10, 'Ten', 1, 1.5), 40: app(40, 'Forty', 1, 0.0)})
+        self.assertEqual(new.version, 2)
+        self.assertEqual(list(new), [10, 20, 30, 40])
+        self.assertEqual(new.record(10), ('Ten', 1, 1.5))
+        self.assertEqual(new.record(40), ('Forty', 1, 0.0))
+        self.assertEqual(new.totalRemainingDrops, 5)
+        self.assertEqual(new.gamesInRefundPeriod, 2)
+        self.assertEqual(new.image_path, '/images')
+
+    def test_replace_leaves_the_old_snapshot_alone(self):
+        self.snapshot.replace(2, {10: app(10, 'Ten', 0, 2.5)})
+        self.assertEqual(self.snapshot.version, 1)
+        self.assertEqual(self.snapshot.record(10), ('Ten', 2, 1.0))
+        self.assertEqual(self.snapshot.totalRemainingDrops, 5)
+
+    def test_without(self):
+        new = self.snapshot.without(2, [10, 40])
+        self.assertEqual(list(new), [20, 30])
+        self.assertEqual(new.totalRemainingDrops, 3)
+        self.assertEqual(new.totalGamesToIdle, 1)
+        self.assertEqual(new.gamesInRefundPeriod, 0)
+        self.assertEqual(len(self.snapshot), 3)
+
+if __name__ == '__main__':
+    unittest.main()
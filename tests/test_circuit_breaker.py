@@ -0,0 +1,141 @@
+import unittest
+try:
+    from unittest import mock
+except ImportError: # Python 2
+    import mock
+
+from steam_idle_qt.CircuitBreaker import CircuitBreaker, CircuitOpenError, TokenBucket
+
+class Clock(object):
+    ''' Replaces time() and sleep() of steam_idle_qt.CircuitBreaker '''
+    def __init__(self, now=1000.0):
+        self.now = now
+        self.slept = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+class ClockTestCase(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock()
+        for name in ('time', 'sleep'):
+            patcher = mock.patch('steam_idle_qt.CircuitBreaker.' + name, getattr(self.clock, name))
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+class TokenBucketTest(ClockTestCase):
+    def test_burst_without_waiting(self):
+        bucket = TokenBucket(rate=2, capacity=3)
+        self.assertEqual([bucket.acquire() for _ in range(3)], [0.0, 0.0, 0.0])
+        self.assertEqual(self.clock.slept, [])
+
+    def test_waits_for_the_next_token(self):
+        bucket = TokenBucket(rate=2, capacity=1)
+        bucket.acquire()
+        self.assertAlmostEqual(bucket.acquire(), 0.5)
+        self.assertEqual(len(self.clock.slept), 1)
+
+    def test_refills_up_to_capacity(self):
+        bucket = TokenBucket(rate=1, capacity=2)
+        bucket.acquire()
+        bucket.acquire()
+        self.clock.now += 60
+        self.assertEqual([bucket.acquire() for _ in range(2)], [0.0, 0.0])
+        self.assertAlmostEqual(bucket.acquire(), 1.0)
+
+class CircuitBreakerTest(ClockTestCase):
+    def setUp(self):
+        super(CircuitBreakerTest, self).setUp()
+        self.states = []
+        self.breaker = CircuitBreaker(failureThreshold=3, resetTimeout=60, onStateChange=self.states.append)
+
+    def open(self):
+        for _ in range(self.breaker.failureThreshold):
+            self.breaker.before()
+            self.breaker.failure()
+
+    def test_opens_after_threshold(self):
+        self.breaker.failure()
+        self.breaker.failure()
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.breaker.failure()
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.assertRaises(CircuitOpenError, self.breaker.before)
+        self.assertEqual(self.states, [CircuitBreaker.OPEN])
+
+    def test_success_resets_failures(self):
+        self.breaker.failure()
+        self.breaker.failure()
+        self.breaker.success()
+        self.breaker.failure()
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_single_trial_after_timeout(self):
+        self.open()
+        self.clock.now += 60
+        self.breaker.before()
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+        # Only one trial at a time
+        self.assertRaises(CircuitOpenError, self.breaker.before)
+
+    def test_trial_success_closes(self):
+        self.open()
+        self.clock.now += 60
+        self.breaker.before()
+        self.breaker.success()
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.breaker.before()
+        self.assertEqual(self.states, [CircuitBreaker.OPEN, CircuitBreaker.HALF_OPEN, CircuitBreaker.CLOSED])
+
+    def test_trial_failure_opens_again(self):
+        self.open()
+        self.clock.now += 60
+        self.breaker.before()
+        self.breaker.failure()
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.assertRaises(CircuitOpenError, self.breaker.before)
+        self.clock.now += 60
+        self.breaker.before()
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+
+    def test_cancelled_trial_frees_the_next_one(self):
+        self.open()
+        self.clock.now += 60
+        self.breaker.before()
+        self.breaker.cancel()
+        self.breaker.before()
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+
+    def test_cancel_after_result_is_a_noop(self):
+        self.open()
+        self.clock.now += 60
+        self.breaker.before()
+        self.breaker.failure()
+        self.breaker.cancel()
+        self.assertRaises(CircuitOpenError, self.breaker.before)
+
+    def test_state_change_callback_runs_without_the_lock(self):
+        # A callback using the breaker must not deadlock
+        unlocked = []
+        def onStateChange(state):
+            free = self.breaker._lock.acquire(False)
+            if free:
+                self.breaker._lock.release()
+            unlocked.append((state, free))
+        self.breaker.onStateChange = onStateChange
+        self.open()
+        self.clock.now += 60
+        self.breaker.before()
+        self.breaker.success()
+        self.assertEqual(unlocked, [
+            (CircuitBreaker.OPEN, True),
+            (CircuitBreaker.HALF_OPEN, True),
+            (CircuitBreaker.CLOSED, True),
+        ])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import unittest
+
+from steam_idle_qt.DeadlineQueue import DeadlineQueue
+
+class DeadlineQueueTest(unittest.TestCase):
+    def setUp(self):
+        self.queue = DeadlineQueue()
+
+    def test_empty(self):
+        self.assertIsNone(self.queue.next())
+        self.assertIsNone(self.queue.delay(0, 900))
+        self.assertEqual(self.queue.popDue(1e12), [])
+
+    def test_earliest_first(self):
+        for appid, deadline in ((10, 300), (20, 100), (30, 200)):
+            self.queue.schedule(appid, deadline)
+        self.assertEqual(self.queue.next(), 100)
+        self.assertEqual(self.queue.upcoming(), [(20, 100), (30, 200), (10, 300)])
+
+    def test_reschedule_replaces_the_deadline(self):
+        self.queue.schedule(10, 100)
+        self.queue.schedule(20, 200)
+        self.queue.schedule(10, 300)
+        self.assertEqual(self.queue.next(), 200)
+        self.assertEqual(len(self.queue), 2)
+        self.assertEqual(self.queue.popDue(1000), [20, 10])
+
+    def test_unschedule(self):
+        self.queue.schedule(10, 100)
+        self.queue.schedule(20, 200)
+        self.assertTrue(self.queue.unschedule(10))
+        self.assertFalse(self.queue.unschedule(10))
+        self.assertEqual(self.queue.next(), 200)
+        self.assertEqual(self.queue.popDue(1000), [20])
+
+    def test_pop_due_merges_up_to_limit(self):
+        for appid, deadline in ((10, 100), (20, 150), (30, 161), (40, 1000)):
+            self.queue.schedule(appid, deadline)
+        # A refresh at 100 with a merge window of 60s handles all up to 160
+        self.assertEqual(self.queue.popDue(160), [10, 20])
+        self.assertEqual(self.queue.next(), 161)
+        self.assertEqual(len(self.queue), 2)
+
+    def test_delay_is_capped_by_max_interval(self):
+        self.queue.schedule(10, 5000)
+        self.assertEqual(self.queue.delay(1000, 900), 900)
+        self.assertEqual(self.queue.delay(4500, 900), 500)
+
+    def test_delay_of_passed_deadline_is_zero(self):
+        self.queue.schedule(10, 100)
+        self.assertEqual(self.queue.delay(200, 900), 0)
+
+    def test_clear(self):
+        self.queue.schedule(10, 100)
+        self.queue.clear()
+        self.assertIsNone(self.queue.next())
+        self.assertEqual(self.queue.upcoming(), [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+import sqlite3
+import unittest
+
+from steam_idle.idle import calc_delay
+from steam_idle_qt.DropPredictor import DropPredictor
+
+HOUR = 3600.0
+
+def drops(appid, start, intervals, playTime=0.0, idled=True):
+    ''' Drop events of appid, one card after every interval (seconds) '''
+    events = [(appid, start, 1, len(intervals), playTime)]
+    ts = start
+    for remaining, interval in enumerate(intervals, 1):
+        ts += interval
+        if idled:
+            playTime += interval / HOUR
+        events.append((appid, ts, 1, len(intervals) - remaining, playTime))
+    return events
+
+class Settings(object):
+    ''' The part of SettingsStore DropPredictor.fromSettings uses '''
+    def __init__(self, **values):
+        self.values = values
+
+    def value(self, key, defaultValue=None, type=None):
+        return self.values.get(key, defaultValue)
+
+class BrokenHistory(object):
+    def drops(self):
+        raise sqlite3.OperationalError('database is locked')
+
+class DropPredictorTest(unittest.TestCase):
+    def assertFallback(self, predictor, appid=10):
+        for remainingDrops in (3, 2):
+            self.assertEqual(predictor.refreshDelay(appid, remainingDrops, since=0, now=100),
+                             calc_delay(remainingDrops))
+
+    def test_untrained_uses_calc_delay(self):
+        predictor = DropPredictor()
+        self.assertIsNone(predictor.predict(10))
+        self.assertFallback(predictor)
+
+    def test_too_few_intervals_use_calc_delay(self):
+        predictor = DropPredictor()
+        predictor.train(drops(10, 0, [1800] * (DropPredictor.minSamples - 1)))
+        self.assertIsNone(predictor.predict(10))
+        self.assertFallback(predictor)
+
+    def test_intervals_not_idled_through_are_ignored(self):
+        predictor = DropPredictor()
+        predictor.train(drops(10, 0, [1800] * 10, idled=False))
+        self.assertIsNone(predictor.predict(10))
+
+    def test_broken_history_uses_calc_delay(self):
+        predictor = DropPredictor(BrokenHistory())
+        self.assertIsNone(predictor.predict(10))
+        self.assertFallback(predictor)
+
+    def test_unknown_app_gets_the_pooled_estimate(self):
+        predictor = DropPredictor()
+        predictor.train(drops(10, 0, [1800] * 6) + drops(20, 20000, [1800] * 6))
+        prediction = predictor.predict(30)
+        self.assertIsNotNone(prediction)
+        self.assertAlmostEqual(prediction.expected, 1800, delta=1)
+        self.assertLessEqual(prediction.low, prediction.expected)
+        self.assertGreaterEqual(prediction.high, prediction.expected)
+
+    def test_app_estimate_is_shrunk_towards_the_pooled_one(self):
+        predictor = DropPredictor()
+        predictor.train(drops(10, 0, [1200] * 6) + drops(20, 20000, [3600] * 6))
+        self.assertLess(predictor.predict(10).expected, predictor.predict(30).expected)
+        self.assertGreater(predictor.predict(20).expected, predictor.predict(30).expected)
+
+    def test_never_earlier_than_calc_delay_with_drops_left(self):
+        predictor = DropPredictor()
+        predictor.train(drops(10, 0, [1700, 1900] * 5))
+        for now in (0, 1000, 5000, 20000):
+            self.assertGreaterEqual(predictor.refreshDelay(10, 3, since=0, now=now), calc_delay(3))
+
+    def test_imprecise_last_drop_uses_calc_delay(self):
+        predictor = DropPredictor()
+        predictor.train(drops(10, 0, [600, 3600] * 5))
+        prediction = predictor.predict(10)
+        self.assertGreater(prediction.high, DropPredictor.preciseSpread * prediction.low)
+        calc_delay(2) # Reset the countdown of calc_delay
+        delay = predictor.refreshDelay(10, 1, since=0, now=prediction.low + 1)
+        calc_delay(2)
+        self.assertEqual(delay, calc_delay(1))
+
+    def test_precise_last_drop_polls_between_the_bounds(self):
+        predictor = DropPredictor()
+        predictor.train(drops(10, 0, [1700, 1900] * 5))
+        prediction = predictor.predict(10)
+        self.assertLess(prediction.low, prediction.high)
+        calc_delay(2)
+        self.assertEqual(predictor.refreshDelay(10, 1, since=0, now=prediction.low + 1),
+                         DropPredictor.lastDropPoll)
+        calc_delay(2)
+        delay = predictor.refreshDelay(10, 1, since=0, now=prediction.high + 1)
+        calc_delay(2)
+        self.assertEqual(delay, calc_delay(1))
+
+    def test_refresh_skipped_until_the_last_drop_can_happen(self):
+        predictor = DropPredictor()
+        predictor.train(drops(10, 0, [1800] * 10))
+        low = predictor.predict(10).low
+        self.assertEqual(predictor.refreshDelay(10, 1, since=0, now=0), int(low))
+
+    def test_from_settings(self):
+        history = object()
+        self.assertIsNone(DropPredictor.fromSettings(Settings(), history))
+        self.assertIsNone(DropPredictor.fromSettings(Settings(**{'predictor/enabled': True}), None))
+        predictor = DropPredictor.fromSettings(Settings(**{'predictor/enabled': True}), history)
+        self.assertIs(predictor.history, history)
+
+if __name__ == '__main__':
+    unittest.main()
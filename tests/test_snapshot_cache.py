@@ -0,0 +1,42 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from steam_idle_qt.AppSnapshot import AppSnapshot
+from steam_idle_qt.SnapshotCache import SnapshotCache
+
+class SnapshotCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.path = os.path.join(self.tmpdir, 'snapshot.json')
+        self.cache = SnapshotCache(self.path, '/images')
+
+    def test_missing_file(self):
+        self.assertEqual(self.cache.load(), (0, None))
+
+    def test_round_trip(self):
+        self.cache.save(AppSnapshot(7, [(10, 'Ten', 2, 1.0), (20, u'Zw\xf6lf', 0, 3.5)]))
+        version, apps = self.cache.load()
+        self.assertEqual(version, 7)
+        self.assertEqual(apps.version, 7)
+        self.assertEqual(list(apps.rows()), [(10, 'Ten', 2, 1.0), (20, u'Zw\xf6lf', 0, 3.5)])
+        self.assertEqual(apps.image_path, '/images')
+        self.assertFalse(os.path.exists(self.path + '.tmp'))
+
+    def test_save_replaces_the_old_file(self):
+        self.cache.save(AppSnapshot(1, [(10, 'Ten', 2, 1.0)]))
+        self.cache.save(AppSnapshot(2, [(20, 'Twenty', 1, 0.0)]))
+        version, apps = self.cache.load()
+        self.assertEqual(version, 2)
+        self.assertEqual(list(apps), [20])
+
+    def test_broken_file(self):
+        for content in ('{"version": 1, "apps": [[10, "Ten"', '{"apps": []}', '{"version": 1, "apps": [[10]]}'):
+            with open(self.path, 'w') as f:
+                f.write(content)
+            self.assertEqual(self.cache.load(), (0, None))
+
+if __name__ == '__main__':
+    unittest.main()